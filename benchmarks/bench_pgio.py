@@ -0,0 +1,237 @@
+'''
+@author  : Antoine HERMAN
+
+Mesure des débits des exports (PgExport) et imports (PgImport) sur une table synthétique
+générée dans une base PostgreSQL locale, ainsi que du surcoût d'appel des méthodes décorées.
+
+    python benchmarks/bench_pgio.py --lignes 100000 --largeur 10 --sortie resultats.json
+
+Pour chaque opération sont mesurés : durée (meilleure des répétitions), lignes/s, Mo/s (taille du fichier
+produit ou lu), pic de mémoire Python (tracemalloc, mesuré lors d'une exécution distincte pour ne pas
+fausser les durées) et pic de mémoire du processus (ru_maxrss, non disponible sous Windows).
+Le résultat est écrit au format JSON afin de comparer les exécutions (la progression est affichée sur la sortie d'erreur).
+'''
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import psycopg2
+from pg.pgbasics import PgOutils, PgConn, CacheCatalogue, RegistreSql
+from pg.pgio import PgExport, PgImport
+
+SCHEMA = 'bench'
+
+OPERATIONS = ['exporter_table_vers_csv',
+              'exporter_table_vers_csv_via_copy',
+              'exporter_table_vers_sqlite',
+              'exporter_table_vers_html',
+              'importer_table_depuis_csv',
+              'importer_table_depuis_sqlite',
+              'surcout_decorateurs']
+
+# types des champs de la table synthétique, attribués cycliquement : (type, expression en fonction de i)
+TYPES_CHAMPS = [('integer', 'i * {0}'),
+                ('text', "md5((i + {0})::text)"),
+                ('numeric(12,2)', '(i * {0}) / 7.0'),
+                ('timestamp', "timestamp '2000-01-01' + (i + {0}) * interval '1 minute'"),
+                ('boolean', '(i + {0}) % 2 = 0')]
+
+
+def generer_table(pgoutils, table, nb_lignes, largeur):
+    '''
+    Crée (ou recrée) la table synthétique SCHEMA.table de nb_lignes lignes et largeur champs (en plus de id)
+    '''
+    champs = ['id integer']
+    expressions = ['i']
+    for j in range(largeur):
+        type_champ, expression = TYPES_CHAMPS[j % len(TYPES_CHAMPS)]
+        champs.append('c{0} {1}'.format(j, type_champ))
+        expressions.append(expression.format(j + 1))
+    pgoutils.creer_schema_si_inexistant(SCHEMA)
+    pgoutils.effacer_table(SCHEMA, table)
+    pgoutils.execution('CREATE TABLE {0}.{1} ({2});'.format(SCHEMA, table, ', '.join(champs)))
+    pgoutils.execution('INSERT INTO {0}.{1} SELECT {2} FROM generate_series(1, {3}) i;'.format(SCHEMA, table, ', '.join(expressions), nb_lignes))
+    pgoutils.execution('ANALYZE {0}.{1};'.format(SCHEMA, table))
+
+
+def mesurer(nom, fonction, nb_lignes, repetitions, taille = None):
+    '''
+    Exécute fonction() repetitions fois puis une fois sous tracemalloc ;
+    taille est une fonction renvoyant le nombre d'octets traités (fichier produit ou lu).
+    '''
+    durees = []
+    for i in range(repetitions):
+        debut = time.perf_counter()
+        fonction()
+        durees.append(time.perf_counter() - debut)
+    tracemalloc.start()
+    try:
+        fonction()
+        pic_python = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    duree = min(durees)
+    octets = taille() if taille is not None else None
+    resultat = {'operation': nom,
+                'lignes': nb_lignes,
+                'repetitions': repetitions,
+                'durees': durees,
+                'duree': duree,
+                'lignes_par_seconde': nb_lignes / duree if duree else None,
+                'octets': octets,
+                'mo_par_seconde': octets / duree / 1e6 if octets and duree else None,
+                'pic_memoire_python_mo': pic_python / 1e6,
+                'rss_max_mo': rss_max_mo()}
+    print('{0:35} {1:10.3f} s {2:12.0f} lignes/s {3:>10} Mo/s {4:8.1f} Mo'.format(
+        nom, duree, resultat['lignes_par_seconde'] or 0,
+        '{0:.1f}'.format(resultat['mo_par_seconde']) if resultat['mo_par_seconde'] else '-',
+        resultat['pic_memoire_python_mo']), file = sys.stderr)
+    return resultat
+
+
+def rss_max_mo():
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ko sous Linux, octets sous macOS
+    return rss / 1e6 if sys.platform == 'darwin' else rss / 1e3
+
+
+def mesurer_surcout_decorateurs(nb_appels):
+    '''
+    Mesure le coût (en microsecondes par appel) de la mécanique des décorateurs (liaison du gabarit,
+    traitement du résultat, cache catalogue), la requête elle-même étant remplacée par une réponse immédiate.
+    '''
+    pgoutils = PgOutils.__new__(PgOutils)
+    pgoutils.pool = None
+    pgoutils.script = None
+    pgoutils.requete_sql = RegistreSql.requetes_de_la_classe(PgOutils)
+    pgoutils._pgconn = PgConn(connection_directe = False)
+    pgoutils._pgconn.cache_catalogue.duree_vie = 60
+    reponse = [('table', 1)]
+    pgoutils.execution_et_recuperation = lambda sql, max_tentative = None, parametres = None, politique = None: reponse
+    pgoutils.execution_et_ecriture_script = lambda sql, max_tentative = None, parametres = None, politique = None: (True, -1)
+    appels = {'compter (select_sql_valeur_unique)': lambda: pgoutils.compter('public', 'table'),
+              'lister_valeurs (select_sql_champ_unique)': lambda: pgoutils.lister_valeurs('champ', 'public', 'table'),
+              'lister_tables (catalogue, en cache)': lambda: pgoutils.lister_tables('public'),
+              'search_path (requete_sql)': lambda: pgoutils.search_path('public'),
+              'reference (appel direct)': lambda: pgoutils.execution_et_recuperation('SELECT 1;')}
+    resultats = {}
+    for nom, appel in appels.items():
+        debut = time.perf_counter()
+        for i in range(nb_appels):
+            appel()
+        resultats[nom] = (time.perf_counter() - debut) / nb_appels * 1e6
+        print('{0:45} {1:8.2f} µs/appel'.format(nom, resultats[nom]), file = sys.stderr)
+    return {'operation': 'surcout_decorateurs', 'appels': nb_appels, 'microsecondes_par_appel': resultats}
+
+
+def executer(parametres):
+    connexion = (parametres.hote, parametres.base, parametres.port, parametres.utilisateur, parametres.motdepasse)
+    table = 'synthetique_{0}x{1}'.format(parametres.lignes, parametres.largeur)
+    repertoire = tempfile.mkdtemp(prefix = 'bench_pg_')
+    fichier_csv = os.path.join(repertoire, table + '.csv')
+    fichier_sqlite = os.path.join(repertoire, table + '.sqlite3')
+    fichier_html = os.path.join(repertoire, table + '.html')
+    taille = lambda fichier: (lambda: os.path.getsize(fichier))
+
+    resultats = []
+    operations = parametres.operations or OPERATIONS
+    if 'surcout_decorateurs' in operations:
+        resultats.append(mesurer_surcout_decorateurs(parametres.appels))
+    operations = [operation for operation in operations if operation != 'surcout_decorateurs']
+    version_serveur = None
+
+    if operations:
+        pgexport = PgExport(*connexion)
+        pgimport = PgImport(*connexion)
+        if not pgexport.pgconn.conn_actif:
+            sys.exit('Connexion impossible à la base {1} ({0}:{2})'.format(*connexion))
+        version_serveur = pgexport.execution_et_recuperation('SHOW server_version;')[0][0]
+        generer_table(pgexport, table, parametres.lignes, parametres.largeur)
+        n = parametres.lignes
+        nb_html = min(n, parametres.lignes_html)
+        mesures = {'exporter_table_vers_csv':
+                       (lambda: pgexport.exporter_table_vers_csv(SCHEMA, table, fichier_csv, iterateur = True), n, taille(fichier_csv)),
+                   'exporter_table_vers_csv_via_copy':
+                       (lambda: pgexport.exporter_table_vers_csv_via_copy(SCHEMA, table, fichier_csv), n, taille(fichier_csv)),
+                   'exporter_table_vers_sqlite':
+                       (lambda: pgexport.exporter_table_vers_sqlite(SCHEMA, table, fichier_sqlite, table), n, taille(fichier_sqlite)),
+                   'exporter_table_vers_html':
+                       (lambda: pgexport.exporter_table_vers_html(SCHEMA, table, fichier_html, limit = nb_html), nb_html, taille(fichier_html)),
+                   'importer_table_depuis_csv':
+                       (lambda: pgimport.importer_table_depuis_csv(fichier_csv, SCHEMA, table + '_csv', '|'), n, taille(fichier_csv)),
+                   'importer_table_depuis_sqlite':
+                       (lambda: pgimport.importer_table_depuis_sqlite(fichier_sqlite, table, SCHEMA, table + '_sqlite'), n, taille(fichier_sqlite))}
+        # les imports lisent les fichiers produits par les exports
+        if 'importer_table_depuis_csv' in operations and not os.path.exists(fichier_csv):
+            pgexport.exporter_table_vers_csv(SCHEMA, table, fichier_csv, iterateur = True)
+        if 'importer_table_depuis_sqlite' in operations and 'exporter_table_vers_sqlite' not in operations:
+            pgexport.exporter_table_vers_sqlite(SCHEMA, table, fichier_sqlite, table)
+        for operation in operations:
+            fonction, nb_lignes, taille_fichier = mesures[operation]
+            resultats.append(mesurer(operation, fonction, nb_lignes, parametres.repetitions, taille_fichier))
+        if not parametres.conserver:
+            pgexport.effacer_schema(SCHEMA)
+        pgexport.deconnecter()
+        pgimport.deconnecter()
+
+    for fichier in [fichier_csv, fichier_sqlite, fichier_html]:
+        if os.path.exists(fichier):
+            os.remove(fichier)
+    os.rmdir(repertoire)
+
+    return {'date': datetime.now().isoformat(),
+            'parametres': {'lignes': parametres.lignes,
+                           'largeur': parametres.largeur,
+                           'repetitions': parametres.repetitions,
+                           'lignes_html': parametres.lignes_html},
+            'environnement': {'python': platform.python_version(),
+                              'psycopg2': psycopg2.__version__,
+                              'plateforme': platform.platform(),
+                              'postgresql': version_serveur},
+            'resultats': resultats}
+
+
+def analyser_arguments(arguments = None):
+    parser = argparse.ArgumentParser(description = 'Mesure des débits des exports et imports du module pg')
+    parser.add_argument('--hote', default = 'localhost')
+    parser.add_argument('--base', default = 'postgres')
+    parser.add_argument('--port', default = '5432')
+    parser.add_argument('--utilisateur', default = 'postgres')
+    parser.add_argument('--motdepasse', default = 'postgres')
+    parser.add_argument('--lignes', type = int, default = 100000, help = 'nombre de lignes de la table synthétique')
+    parser.add_argument('--largeur', type = int, default = 10, help = 'nombre de champs de la table synthétique (en plus de id)')
+    parser.add_argument('--repetitions', type = int, default = 3)
+    parser.add_argument('--lignes-html', dest = 'lignes_html', type = int, default = 10000, help = "nombre maximal de lignes de l'export html")
+    parser.add_argument('--appels', type = int, default = 100000, help = 'nombre d\'appels pour la mesure du surcoût des décorateurs')
+    parser.add_argument('--operations', nargs = '*', choices = OPERATIONS, help = 'opérations à mesurer (toutes par défaut)')
+    parser.add_argument('--sortie', help = 'fichier json de résultats (sortie standard par défaut)')
+    parser.add_argument('--conserver', action = 'store_true', help = 'conserver le schéma ' + SCHEMA + ' en fin de mesure')
+    return parser.parse_args(arguments)
+
+
+if __name__ == '__main__':
+    parametres = analyser_arguments()
+    resultat = executer(parametres)
+    if parametres.sortie:
+        with open(parametres.sortie, 'w', encoding = 'utf-8') as f:
+            json.dump(resultat, f, indent = 2, ensure_ascii = False)
+    else:
+        print(json.dumps(resultat, indent = 2, ensure_ascii = False))
+
+#eof
@@ -0,0 +1,1031 @@
+'''
+@author  : Antoine HERMAN
+
+Pendants asynchrones (asyncio) de PgConn, PgPool, PgOutils, PgExport et PgImport.
+
+Les requêtes passent par le mode asynchrone de psycopg2 (connexion async_, attente de la socket
+par la boucle d'évènements) : les méthodes définies par les gabarits des fichiers .sql sont les mêmes
+que pour PgOutils mais renvoient des coroutines.
+Les COPY, non disponibles sur une connexion asynchrone, sont exécutés dans un thread
+(run_in_executor) sur une connexion synchrone associée.
+'''
+
+import asyncio
+import copy
+import csv
+import inspect
+import re
+import uuid
+from collections import deque
+from contextlib import asynccontextmanager
+from functools import partial
+from random import randint
+
+import logging
+import time
+
+import psycopg2
+import psycopg2.extensions
+
+from pg.pgbasics import *
+from pg.pgbasics import _enregistrer_operation, _lier, _operation_courante, _premiers_champs
+from pg.pgio import PgExport
+from pg.pgsqlite import SqliteConn
+
+logger = logging.getLogger(__name__)
+
+
+def _executer_ou_annuler(fonction, pgconn, *args):
+    '''
+    Exécute fonction(pgconn, *args) et annule la transaction de pgconn en cas d'erreur
+    '''
+    try:
+        return fonction(pgconn, *args)
+    except Exception:
+        pgconn.annuler()
+        raise
+
+def _premiers_champs_asynchrones(lignes):
+    '''
+    Renvoie un itérateur asynchrone sur le premier champ de chaque ligne (voir _premiers_champs)
+    '''
+    if lignes is None:
+        return None
+    return (r[0] async for r in lignes)
+
+
+class AsyncPgConn():
+    '''
+    Connexion asynchrone à une base PostgreSQL.
+
+    Une connexion asynchrone n'exécute qu'une requête à la fois et fonctionne en autocommit :
+    chaque requête est validée dès son exécution.
+    '''
+
+    # voir PgConn.instrumentation
+    instrumentation = None
+
+    def __init__(self, hote=None, base=None, port=None, utilisateur=None, motdepasse=None):
+        '''
+        Constructeur : la connexion est établie par connection_postgres() (à attendre)
+        '''
+        self.connection = None
+        self.conn_actif = False
+        self.cache_catalogue = CacheCatalogue()
+        self._pgconn_synchrone = None
+        self._verrou_synchrone = asyncio.Lock()
+
+        self.hote = hote
+        self.base = base
+        self.utilisateur = utilisateur
+        self.motdepasse = motdepasse
+        self.port = port
+
+    async def connection_postgres(self, client_encoding = 'UTF-8'):
+        '''
+        Connexion à la base PostgreSQL via les paramètres définis lors de la création de l'instance de la classe.
+        
+        En cas d'échec, la connexion (à moitié ouverte) est fermée et l'erreur est levée.
+        '''
+        try:
+            self.connection = psycopg2.connect(host=self.hote, dbname=self.base, user=self.utilisateur, password=self.motdepasse,
+                                               port=self.port, client_encoding=client_encoding, async_=1)
+            await self._attendre()
+            self.conn_actif = True
+        except BaseException as e:
+            logger.error('Connexion impossible : %s', e)
+            self.conn_actif = False
+            if self.connection is not None:
+                self.connection.close()
+                self.connection = None
+            raise
+
+    def deconnection_postgres(self):
+        '''
+        Deconnexion de la base PostgreSQL (et de la connexion synchrone associée) si la connexion était établie
+        '''
+        try:
+            if self.connection is not None:
+                self.connection.close()
+            self.conn_actif = False
+        except Exception as e:
+            logger.error('Problème de déconnexion : %s', e)
+        if self._pgconn_synchrone is not None:
+            self._pgconn_synchrone.deconnection_postgres()
+            self._pgconn_synchrone = None
+
+    async def execute_commit(self, sql, parametres = None):
+        '''
+        Execute la requete sql et renvoie le nombre de lignes modifiées en fonction du type de requete.
+
+        Si parametres est spécifié, la requête est au format psycopg2 (%s) et les valeurs sont transmises comme paramètres.
+        '''
+        if not self.conn_actif:
+            await self.connection_postgres()
+        instrumentation = self.instrumentation
+        debut = time.perf_counter() if instrumentation is not None else None
+        with self.connection.cursor() as curseur:
+            await self._executer(curseur, sql, parametres)
+            nb_lignes = curseur.rowcount
+        if instrumentation is not None:
+            instrumentation.enregistrer('execute_commit', debut, sql, nb_lignes)
+        return nb_lignes
+
+    async def execute_recupere(self, sql, parametres = None):
+        '''
+        Execute la requete sql (SELECT) et renvoie le resultat dans une liste de tuple
+        '''
+        if not self.conn_actif:
+            await self.connection_postgres()
+        instrumentation = self.instrumentation
+        debut = time.perf_counter() if instrumentation is not None else None
+        with self.connection.cursor() as curseur:
+            await self._executer(curseur, sql, parametres)
+            resultat = curseur.fetchall()
+        if instrumentation is not None:
+            instrumentation.enregistrer('execute_recupere', debut, sql, len(resultat))
+        return resultat
+
+    async def execute_recupere_iterateur(self, sql, itersize = 2000, parametres = None):
+        '''
+        Générateur asynchrone sur les tuples du résultat de la requete sql (SELECT),
+        rapatriés par paquets de itersize lignes via un curseur déclaré côté serveur (DECLARE / FETCH).
+
+        La transaction ouverte pour le curseur est validée une fois le résultat entièrement parcouru,
+        annulée si le parcours est interrompu. La mesure (instrumentation) est enregistrée à la fin du parcours.
+        '''
+        if not self.conn_actif:
+            await self.connection_postgres()
+        instrumentation = self.instrumentation
+        debut = time.perf_counter() if instrumentation is not None else None
+        operation = _operation_courante.get()
+        nb_lignes = 0
+        nom_curseur = 'curseur_' + uuid.uuid4().hex
+        reussite = False
+        with self.connection.cursor() as curseur:
+            await self._executer(curseur, 'BEGIN;')
+            try:
+                await self._executer(curseur, 'DECLARE {0} NO SCROLL CURSOR FOR {1}'.format(nom_curseur, sql.strip().rstrip(';')), parametres)
+                while True:
+                    await self._executer(curseur, 'FETCH {0} FROM {1};'.format(int(itersize), nom_curseur))
+                    lignes = curseur.fetchall()
+                    if not lignes:
+                        break
+                    nb_lignes += len(lignes)
+                    for ligne in lignes:
+                        yield ligne
+                reussite = True
+            finally:
+                if not self.connection.closed:
+                    await self._executer(curseur, 'COMMIT;' if reussite else 'ROLLBACK;')
+        if instrumentation is not None:
+            _enregistrer_operation(instrumentation, operation, 'execute_recupere_iterateur', debut, sql, nb_lignes)
+
+    def mogrifier(self, sql, parametres = None):
+        '''
+        Renvoie le texte de la requête avec les paramètres insérés (pour affichage et écriture des scripts)
+        '''
+        if not parametres:
+            return sql
+        try:
+            with self.connection.cursor() as curseur:
+                return curseur.mogrify(sql, parametres).decode(psycopg2.extensions.encodings[self.connection.encoding])
+        except Exception:
+            return sql + ' -- ' + repr(parametres)
+
+    async def synchrone(self, fonction, *args):
+        '''
+        Exécute fonction(pgconn, *args) dans un thread, pgconn étant une connexion synchrone (PgConn)
+        ouverte sur la même base, et renvoie son résultat.
+
+        Les appels simultanés sont exécutés l'un après l'autre sur cette connexion. 
+        En cas d'erreur, la transaction en cours de la connexion synchrone est annulée.
+        '''
+        async with self._verrou_synchrone:
+            if self._pgconn_synchrone is None:
+                self._pgconn_synchrone = PgConn(self.hote, self.base, self.port, self.utilisateur, self.motdepasse, connection_directe = False)
+            boucle = asyncio.get_running_loop()
+            execution = boucle.run_in_executor(None, partial(_executer_ou_annuler, fonction, self._pgconn_synchrone, *args))
+            try:
+                return await asyncio.shield(execution)
+            except asyncio.CancelledError:
+                # le thread ne peut être interrompu : la connexion n'est libérée qu'une fois la fonction terminée
+                await asyncio.wait([execution])
+                raise
+
+    async def copy_from_csv(self, fichier_csv, separateur, table, entete = True):
+        '''
+        Voir PgConn.copy_from_csv (exécuté dans un thread)
+        '''
+        return await self.synchrone(PgConn.copy_from_csv, fichier_csv, separateur, table, entete)
+
+    async def copy_from_lignes(self, lignes, table):
+        '''
+        Voir PgConn.copy_from_lignes (exécuté dans un thread, lignes étant un itérable synchrone)
+        '''
+        return await self.synchrone(PgConn.copy_from_lignes, lignes, table)
+
+    async def execute_values(self, sql, lignes, taille_lot = 1000):
+        '''
+        Voir PgConn.execute_values (exécuté dans un thread, lignes étant un itérable synchrone)
+        '''
+        return await self.synchrone(PgConn.execute_values, sql, lignes, taille_lot)
+
+    async def copy_to_csv(self, sql, fichier_csv, separateur, entete = True, fin_de_ligne = '\n'):
+        '''
+        Voir PgConn.copy_to_csv (exécuté dans un thread)
+        '''
+        return await self.synchrone(PgConn.copy_to_csv, sql, fichier_csv, separateur, entete, fin_de_ligne)
+
+    async def execute_recupere_colonnes(self, sql, parametres = None):
+        '''
+        Voir PgConn.execute_recupere_colonnes (exécuté dans un thread)
+        '''
+        return await self.synchrone(PgConn.execute_recupere_colonnes, sql, parametres)
+
+    async def _executer(self, curseur, sql, parametres = None):
+        try:
+            curseur.execute(sql, parametres or None)
+            await self._attendre()
+        except asyncio.CancelledError:
+            # la requête en cours ne peut être abandonnée proprement : la connexion est fermée
+            self.deconnection_postgres()
+            raise
+        except Exception:
+            if self.connection.closed:
+                # connexion perdue : elle sera rétablie à la prochaine requête
+                self.conn_actif = False
+            raise
+
+    async def _attendre(self):
+        '''
+        Attend, sans bloquer la boucle d'évènements, que la connexion soit prête (psycopg2 poll)
+        '''
+        boucle = asyncio.get_running_loop()
+        while True:
+            etat = self.connection.poll()
+            if etat == psycopg2.extensions.POLL_OK:
+                return
+            descripteur = self.connection.fileno()
+            pret = boucle.create_future()
+            signaler = lambda: pret.done() or pret.set_result(None)
+            if etat == psycopg2.extensions.POLL_READ:
+                boucle.add_reader(descripteur, signaler)
+                try:
+                    await pret
+                finally:
+                    boucle.remove_reader(descripteur)
+            elif etat == psycopg2.extensions.POLL_WRITE:
+                boucle.add_writer(descripteur, signaler)
+                try:
+                    await pret
+                finally:
+                    boucle.remove_writer(descripteur)
+            else:
+                raise psycopg2.OperationalError('Etat de connexion inattendu : ' + str(etat))
+
+
+class AsyncPgPool():
+    '''
+    Pool borné de connexions asynchrones (AsyncPgConn) à une même base.
+
+    Au plus max_connexions connexions sont empruntées simultanément : au-delà, emprunter() attend qu'une connexion soit rendue.
+    Le cache catalogue est commun aux connexions du pool.
+    Rendre une connexion qui n'est pas empruntée (rendue deux fois, ou issue d'un autre pool) lève une exception.
+    '''
+
+    def __init__(self, hote=None, base=None, port=None, utilisateur=None, motdepasse=None, max_connexions = 10):
+        self.hote = hote
+        self.base = base
+        self.port = port
+        self.utilisateur = utilisateur
+        self.motdepasse = motdepasse
+        self.max_connexions = max_connexions
+        self.cache_catalogue = CacheCatalogue()
+        self._libres = deque()
+        self._empruntees = set()
+        self._places = asyncio.Semaphore(max_connexions)
+
+    @asynccontextmanager
+    async def connexion(self):
+        '''
+        Emprunte une connexion le temps du bloc async with puis la rend au pool
+        '''
+        pgconn = await self.emprunter()
+        try:
+            yield pgconn
+        finally:
+            self.rendre(pgconn)
+
+    async def emprunter(self):
+        '''
+        Renvoie une connexion libre du pool, ou en ouvre une nouvelle si le nombre maximal n'est pas atteint.
+        Lève une exception si la connexion ne peut être établie.
+        '''
+        await self._places.acquire()
+        try:
+            while self._libres:
+                pgconn = self._libres.pop()
+                if pgconn.conn_actif and not pgconn.connection.closed:
+                    self._empruntees.add(pgconn)
+                    return pgconn
+            pgconn = AsyncPgConn(self.hote, self.base, self.port, self.utilisateur, self.motdepasse)
+            pgconn.cache_catalogue = self.cache_catalogue
+            await pgconn.connection_postgres()
+            self._empruntees.add(pgconn)
+            return pgconn
+        except BaseException:
+            self._places.release()
+            raise
+
+    def rendre(self, pgconn, fermer = False):
+        '''
+        Rend la connexion au pool ; elle est fermée si fermer est à True ou si elle n'est plus active
+        '''
+        if pgconn not in self._empruntees:
+            raise Exception("La connexion rendue n'est pas empruntée au pool.")
+        self._empruntees.remove(pgconn)
+        if fermer or not pgconn.conn_actif or pgconn.connection.closed:
+            pgconn.deconnection_postgres()
+        else:
+            self._libres.append(pgconn)
+        self._places.release()
+
+    def fermer(self):
+        '''
+        Ferme les connexions libres du pool
+        '''
+        while self._libres:
+            self._libres.pop().deconnection_postgres()
+
+
+class AsyncPgOutils(PgOutils):
+    '''
+    Pendant asynchrone de PgOutils : mêmes gabarits sql et mêmes méthodes, qui renvoient des coroutines.
+
+    Sans pool, les requêtes de l'objet sont exécutées l'une après l'autre sur sa connexion.
+    Avec un pool (AsyncPgPool), chaque requête emprunte une connexion : des opérations indépendantes
+    lancées simultanément (executer_simultanement, asyncio.gather) s'exécutent alors en parallèle,
+    dans la limite de la taille du pool.
+
+        async with AsyncPgOutils(hote, base, port, utilisateur, motdepasse, pool = pool) as pgoutils:
+            tables = await pgoutils.lister_tables('public')
+    '''
+
+    # traitements des résultats des gabarits à remplacer lorsque le résultat est un itérateur asynchrone
+    _TRAITEMENTS_ASYNCHRONES = {_premiers_champs: _premiers_champs_asynchrones}
+
+    def __init__(self, hote=None, base=None, port=None, utilisateur=None, motdepasse=None, script=None, pool=None):
+        '''
+        Constructeur : la connexion est établie par connecter() (à attendre) ou en entrée de bloc async with,
+        à défaut à la première requête.
+        '''
+        self.pool = pool
+        self._pgconn = AsyncPgConn(hote, base, port, utilisateur, motdepasse) if pool is None else None
+        self._verrou = asyncio.Lock()
+        self.script = script
+        self.politique_tentatives = self.POLITIQUE_TENTATIVES or PolitiqueTentatives()
+        self.requete_sql = RegistreSql.requetes_de_la_classe(self.__class__)
+
+    async def _executer_gabarit(self, clef, args, execution, traitement):
+        '''
+        Voir PgOutils._executer_gabarit : les arguments (méthodes *_avec_modification_args) comme le résultat
+        de l'exécution sont à attendre.
+        '''
+        if inspect.isawaitable(args):
+            args = await args
+        requete, parametres = _lier(self.requete_sql[clef], args)
+        traitement = self._TRAITEMENTS_ASYNCHRONES.get(traitement, traitement)
+        jeton = _operation_courante.set(clef.lower())
+        try:
+            return traitement(await execution(requete, parametres = parametres))
+        finally:
+            _operation_courante.reset(jeton)
+
+    def _apres(self, resultat, traitement):
+        '''
+        Voir PgOutils._apres : renvoie une coroutine qui attend le résultat si nécessaire avant de le traiter.
+        '''
+        async def attendre(resultat):
+            if inspect.isawaitable(resultat):
+                resultat = await resultat
+            return traitement(resultat)
+        return attendre(resultat)
+
+    async def __aenter__(self):
+        await self.connecter()
+        return self
+
+    async def __aexit__(self, type_exception, exception, trace):
+        self.deconnecter()
+
+    @property
+    def pgconn(self):
+        '''
+        Connexion (AsyncPgConn) propre à l'objet, None s'il utilise un pool
+        '''
+        return self._pgconn
+
+    @pgconn.setter
+    def pgconn(self, pgconn):
+        self._pgconn = pgconn
+
+    @property
+    def cache_catalogue(self):
+        return self.pool.cache_catalogue if self.pool is not None else self._pgconn.cache_catalogue
+
+    async def connecter(self):
+        '''
+        Connection de l'objet à la base (sans effet avec un pool)
+        '''
+        if self.pool is None and not self._pgconn.conn_actif:
+            await self._pgconn.connection_postgres()
+
+    def deconnecter(self, fermer = False):
+        '''
+        Déconnexion de l'objet à la base de données (sans effet avec un pool)
+        '''
+        self._vider_journal()
+        if self.pool is None:
+            self._pgconn.deconnection_postgres()
+
+    @asynccontextmanager
+    async def connexion(self):
+        '''
+        Fournit, le temps du bloc async with, la connexion de l'objet (accès exclusif)
+        ou une connexion empruntée au pool.
+        '''
+        if self.pool is not None:
+            async with self.pool.connexion() as pgconn:
+                yield pgconn
+        else:
+            async with self._verrou:
+                if not self._pgconn.conn_actif:
+                    await self._pgconn.connection_postgres()
+                yield self._pgconn
+
+    @asynccontextmanager
+    async def connexion_supplementaire(self):
+        '''
+        Fournit une connexion (AsyncPgConn) distincte de celle de l'objet, empruntée au pool le cas échéant.
+        '''
+        if self.pool is not None:
+            async with self.pool.connexion() as pgconn:
+                yield pgconn
+        else:
+            pgconn = AsyncPgConn(self._pgconn.hote, self._pgconn.base, self._pgconn.port, self._pgconn.utilisateur, self._pgconn.motdepasse)
+            await pgconn.connection_postgres()
+            try:
+                yield pgconn
+            finally:
+                pgconn.deconnection_postgres()
+
+    async def executer_simultanement(self, *operations):
+        '''
+        Attend simultanément les opérations (coroutines) et renvoie la liste de leurs résultats, dans l'ordre.
+
+            tables = await pgoutils.executer_simultanement(*[pgoutils.lister_tables(s) for s in schemas])
+        '''
+        return list(await asyncio.gather(*operations))
+
+    async def lister_tables_des_schemas(self, schemas):
+        '''
+        Renvoie le dictionnaire {schema: tables} des schémas spécifiés, interrogés simultanément
+        '''
+        tables = await self.executer_simultanement(*[self.lister_tables(schema) for schema in schemas])
+        return dict(zip(schemas, tables))
+
+    async def execution(self, sql, max_tentative = None, parametres = None, politique = None):
+        '''
+        Voir PgOutils.execution
+        '''
+        return await self._execution_commit(sql, max_tentative, parametres, politique, ecriture_script = False)
+
+    async def execution_et_ecriture_script(self, sql, max_tentative = None, parametres = None, politique = None):
+        '''
+        Voir PgOutils.execution_et_ecriture_script
+        '''
+        return await self._execution_commit(sql, max_tentative, parametres, politique, ecriture_script = True)
+
+    async def execution_multiple(self, sql, donnees, max_tentative = None, politique = None):
+        '''
+        Voir PgOutils.execution_multiple : la requête est exécutée pour chaque tuple de données,
+        dans une transaction unique.
+        '''
+        if iter(donnees) is donnees:
+            max_tentative = 1
+        async def executer():
+            async with self.connexion() as pgconn:
+                nb_lignes_modifiees = await self._execution_multiple(pgconn, sql, donnees)
+            self._invalider_catalogue_si_ddl(sql, None)
+            logger.debug('%s', sql)
+            return nb_lignes_modifiees
+        reussite, nb_lignes_modifiees = await self._avec_tentatives(executer, sql, None, max_tentative, politique, ecriture_script = False)
+        return reussite, nb_lignes_modifiees if reussite else -1
+
+    async def execution_copy(self, lignes, table, max_tentative = None, politique = None):
+        '''
+        Voir PgOutils.execution_copy : la copie est réalisée dans un thread (voir AsyncPgConn.synchrone), 
+        lignes étant un itérable synchrone.
+        '''
+        if iter(lignes) is lignes:
+            max_tentative = 1
+        sql = 'COPY {0} FROM STDIN'.format(table)
+        async def executer():
+            async with self.connexion() as pgconn:
+                nb_lignes = await pgconn.copy_from_lignes(lignes, table)
+            logger.debug('%s', sql)
+            return nb_lignes
+        reussite, nb_lignes = await self._avec_tentatives(executer, sql, None, max_tentative, politique, ecriture_script = True)
+        return reussite, nb_lignes if reussite else -1
+
+    async def execution_valeurs(self, sql, lignes, taille_lot = 1000, max_tentative = None, politique = None):
+        '''
+        Voir PgOutils.execution_valeurs : la requête est exécutée dans un thread (voir AsyncPgConn.synchrone), 
+        lignes étant un itérable synchrone.
+        '''
+        if iter(lignes) is lignes:
+            max_tentative = 1
+        async def executer():
+            async with self.connexion() as pgconn:
+                nb_lignes_modifiees = await pgconn.execute_values(sql, lignes, taille_lot)
+            logger.debug('%s', sql)
+            return nb_lignes_modifiees
+        reussite, nb_lignes_modifiees = await self._avec_tentatives(executer, sql, None, max_tentative, politique, ecriture_script = True)
+        return reussite, nb_lignes_modifiees if reussite else -1
+
+    async def execution_et_recuperation(self, sql, max_tentative = None, parametres = None, politique = None):
+        '''
+        Voir PgOutils.execution_et_recuperation
+        '''
+        async def executer():
+            async with self.connexion() as pgconn:
+                resultat = await pgconn.execute_recupere(sql, parametres)
+                self._tracer(pgconn, sql, parametres)
+            return resultat
+        reussite, resultat = await self._avec_tentatives(executer, sql, parametres, max_tentative, politique, ecriture_script = True)
+        return resultat
+
+    async def execution_et_recuperation_colonnes(self, sql, max_tentative = None, parametres = None, politique = None):
+        '''
+        Voir PgOutils.execution_et_recuperation_colonnes
+        '''
+        async def executer():
+            async with self.connexion() as pgconn:
+                resultat = await pgconn.execute_recupere_colonnes(sql, parametres)
+                self._tracer(pgconn, sql, parametres)
+            return resultat
+        reussite, resultat = await self._avec_tentatives(executer, sql, parametres, max_tentative, politique, ecriture_script = True)
+        return resultat
+
+    async def execution_et_recuperation_iterateur(self, sql, itersize = None, max_tentative = None, parametres = None, politique = None):
+        '''
+        Voir PgOutils.execution_et_recuperation_iterateur : renvoie un itérateur asynchrone (async for)
+        ou None en cas d'échec.
+        Le parcours utilise une connexion dédiée (empruntée au pool ou ouverte pour l'occasion), réservée
+        jusqu'à sa fin : les autres requêtes de l'objet restent possibles pendant le parcours.
+        '''
+        itersize = itersize or self.ITERSIZE
+        async def executer():
+            lignes = self._parcourir(sql, itersize, parametres)
+            try:
+                premiere = await lignes.__anext__()
+            except StopAsyncIteration:
+                return self._parcourir_liste([])
+            except BaseException:
+                await lignes.aclose()
+                raise
+            return self._enchainer(premiere, lignes)
+        reussite, resultat = await self._avec_tentatives(executer, sql, parametres, max_tentative, politique, ecriture_script = True)
+        return resultat
+
+    async def _execution_commit(self, sql, max_tentative, parametres, politique, ecriture_script):
+        async def executer():
+            async with self.connexion() as pgconn:
+                nb_lignes_modifiees = await pgconn.execute_commit(sql, parametres)
+                self._tracer(pgconn, sql, parametres, ecriture_script)
+            self._invalider_catalogue_si_ddl(sql, parametres)
+            return nb_lignes_modifiees
+        reussite, nb_lignes_modifiees = await self._avec_tentatives(executer, sql, parametres, max_tentative, politique, ecriture_script)
+        return reussite, nb_lignes_modifiees if reussite else -1
+
+    async def _avec_tentatives(self, executer, sql, parametres, max_tentative, politique, ecriture_script):
+        '''
+        Voir PgOutils._avec_tentatives : une connexion perdue est marquée inactive par AsyncPgConn 
+        (et écartée du pool), la tentative suivante en utilise donc une nouvelle.
+        '''
+        politique = politique or self.politique_tentatives
+        max_tentative = politique.max_tentative if max_tentative is None else max_tentative
+        tentative = 1
+        while True:
+            try:
+                return True, await executer()
+            except Exception as e:
+                logger.warning('Tentative %s échouée : %s', tentative, e)
+                if tentative >= max_tentative or not politique.est_transitoire(e):
+                    texte = sql + ' -- ' + repr(parametres) if parametres else sql
+                    logger.error('REQUETE EN ECHEC : %s', texte)
+                    if ecriture_script:
+                        self.journaliser('REQUETE EN ECHEC : ')
+                        self.journaliser(texte)
+                    return False, None
+                await asyncio.sleep(politique.delai(tentative))
+                tentative += 1
+
+    async def _execution_multiple(self, pgconn, sql, donnees):
+        nb_lignes_modifiees = 0
+        try:
+            await pgconn.execute_commit('BEGIN;')
+            for ligne in donnees:
+                nb_lignes_modifiees += await pgconn.execute_commit(sql, tuple(ligne))
+            await pgconn.execute_commit('COMMIT;')
+        except BaseException:
+            if pgconn.conn_actif and not pgconn.connection.closed:
+                await pgconn.execute_commit('ROLLBACK;')
+            raise
+        return nb_lignes_modifiees
+
+    async def _parcourir(self, sql, itersize, parametres):
+        # connexion distincte : sans pool, connexion() réserverait la connexion de l'objet pour tout le parcours
+        async with self.connexion_supplementaire() as pgconn:
+            lignes = pgconn.execute_recupere_iterateur(sql, itersize, parametres)
+            ecrite = False
+            try:
+                async for ligne in lignes:
+                    if not ecrite:
+                        self._tracer(pgconn, sql, parametres)
+                        ecrite = True
+                    yield ligne
+            finally:
+                await lignes.aclose()
+            if not ecrite:
+                self._tracer(pgconn, sql, parametres)
+
+    async def _enchainer(self, premiere, lignes):
+        try:
+            yield premiere
+            async for ligne in lignes:
+                yield ligne
+        finally:
+            await lignes.aclose()
+
+    async def _parcourir_liste(self, lignes):
+        for ligne in lignes:
+            yield ligne
+
+    '''
+
+    METHODES COMPOSEES
+
+    '''
+
+    async def effacer_schemas(self, schemas, detail = False):
+        '''
+        Voir PgOutils.effacer_schemas
+        '''
+        return await self._traiter_par_lots(schemas, self.effacer_lot_de_schemas, self.effacer_schema, detail)
+
+    async def effacer_schemas_commencant_par(self, prefixe, detail = False):
+        '''
+        Supprime les schemas commencant par le préfixe spécifié de la base de données en CASCADE.
+        '''
+        schemas = await self.lister_schemas_commencant_par(prefixe)
+        return await self.effacer_schemas(schemas, detail)
+
+    async def effacer_et_creer_schema(self, schema):
+        '''
+        Supprime le schéma s'il existe et le recrée.
+        '''
+        reussite, nb = await self.effacer_schema(schema)
+        if reussite:
+            return await self.creer_schema(schema)
+
+    async def effacer_et_creer_schemas(self, schemas, detail = False):
+        '''
+        Voir PgOutils.effacer_et_creer_schemas
+        '''
+        return await self._traiter_par_lots(schemas, self.effacer_et_creer_lot_de_schemas, self.effacer_et_creer_schema, detail)
+
+    async def effacer_tables(self, schema, tables, detail = False):
+        '''
+        Voir PgOutils.effacer_tables
+        '''
+        return await self._traiter_par_lots(tables,
+                                            lambda lot: self.effacer_lot_de_tables(schema, lot),
+                                            lambda table: self.effacer_table(schema, table),
+                                            detail)
+
+    async def effacer_tables_commencant_par(self, schema, prefixe, detail = False):
+        '''
+        Supprime les tables du schéma commençant par le prefixe specifié.
+        '''
+        tables = await self.lister_tables_commencant_par(schema, prefixe)
+        return await self.effacer_tables(schema, tables, detail)
+
+    async def _traiter_par_lots(self, objets, traitement_lot, traitement_unitaire, detail):
+        objets = list(objets or [])
+        resultats = {}
+        for debut in range(0, len(objets), self.TAILLE_LOT_DDL):
+            lot = list(dict.fromkeys(objets[debut:debut + self.TAILLE_LOT_DDL]))
+            reussite, nb = await traitement_lot(lot)
+            if reussite:
+                resultats.update(dict.fromkeys(lot, True))
+                continue
+            for objet in lot:
+                resultat = await traitement_unitaire(objet)
+                resultats[objet] = bool(resultat and resultat[0])
+        return self._bilan_des_lots(objets, resultats, detail)
+
+    async def mettre_en_place_serveur_distant_fdw(self, hote_distant, base_distante, port, utilisateur, motdepasse, nom_serveur_distant):
+        '''
+        Prépare un serveur distant fdw et crée un user mapping associé.
+        '''
+        valid, nb = await self.creer_extension_fdw()
+        valid2, nb = await self.effacer_serveur_distant_fdw(nom_serveur_distant)
+        valid3, nb = await self.creer_serveur_distant_fdw(hote_distant, base_distante, port, nom_serveur_distant)
+        valid4, nb = await self.effacer_user_mapping_pour_serveur_distant_fdw(utilisateur, nom_serveur_distant)
+        valid5, nb = await self.creer_user_mapping_pour_serveur_distant_fdw(utilisateur, nom_serveur_distant, motdepasse)
+        return (True, 1,) if valid and valid2 and valid3 and valid4 and valid5 else (False, -1,)
+
+    @invalide_catalogue(0)
+    @requete_sql_avec_modification_args
+    async def creer_table_etrangere(self, schema, table, schema_distant, table_distante, champs, nom_serveur):
+        '''
+        Efface puis crée une table étrangère à partir de la table distante
+        la variable champ doit avoir le formalisme prévue par le renvoi de la méthode lister_champs()
+        '''
+        await self.effacer_table_etrangere(schema, table)
+        champs_format = ',\n'.join([c[1] + ' ' + c[2] for c in champs])
+        return schema, table, schema_distant, table_distante, champs_format, nom_serveur
+
+    async def copier_table_distante(self, hote_distant, base_distante, port, utilisateur, motdepasse, schema_initial, table_initiale, schema_final, table_finale):
+        '''
+        Copie une table d'une base de données distante dans la base locale
+        '''
+        nom_serveur_temporaire = 'serveur_tmp' + str(randint(1,100000))
+        valid, nb = await self.mettre_en_place_serveur_distant_fdw(hote_distant, base_distante, port, utilisateur, motdepasse, nom_serveur_temporaire)
+        async with AsyncPgOutils(hote_distant, base_distante, port, utilisateur, motdepasse, self.script) as pgoutils_distant:
+            champs = await pgoutils_distant.lister_champs(schema_initial, table_initiale)
+        valid2, nb = await self.creer_table_etrangere(schema_final, table_finale + '_fdw', schema_initial, table_initiale, champs, nom_serveur_temporaire)
+        valid3, nb = await self.copier_table(schema_final, table_finale + '_fdw', schema_final, table_finale)
+        valid4, nb = await self.effacer_table_etrangere(schema_final, table_finale + '_fdw')
+        valid5, nb = await self.effacer_user_mapping_pour_serveur_distant_fdw(utilisateur, nom_serveur_temporaire)
+        valid6, nb = await self.effacer_serveur_distant_fdw(nom_serveur_temporaire)
+        if self.pool is None:
+            self.deconnecter() # permettre d'effacer la connexion postgres_fdw qui sinon restera en attente inutilement
+            await self.connecter()
+        return (True, 1,) if valid and valid2 and valid3 and valid4 and valid5 and valid6 else (False, -1,)
+
+    async def copier_schema_distant(self, hote_distant, base_distante, port, utilisateur, motdepasse, schema_initial, schema_final, tables = None, nb_connexions = 4):
+        '''
+        Voir PgOutils.copier_schema_distant : les tables sont copiées simultanément par nb_connexions tâches, 
+        chacune sur sa connexion supplémentaire.
+        '''
+        if tables is not None and len(tables) == 0:
+            return True, 0, {}
+        suffixe = str(randint(1,100000))
+        nom_serveur_temporaire = 'serveur_tmp' + suffixe
+        schema_temporaire = 'fdw_tmp' + suffixe
+        resultats = {}
+        valid, nb = await self.mettre_en_place_serveur_distant_fdw(hote_distant, base_distante, port, utilisateur, motdepasse, nom_serveur_temporaire)
+        try:
+            valid2, nb = await self.creer_schema(schema_temporaire)
+            valid3, nb = await self.creer_schema_si_inexistant(schema_final)
+            valid4, nb = await self.importer_schema_etranger(schema_initial, nom_serveur_temporaire, schema_temporaire, tables)
+            valid = valid and valid2 and valid3 and valid4
+            if valid:
+                tables_etrangeres = await self.lister_tables_etrangeres(schema_temporaire) or []
+                a_copier = deque(tables_etrangeres)
+
+                async def copier_tables():
+                    async with self._outils_supplementaires() as pgoutils:
+                        while a_copier:
+                            table = a_copier.popleft()
+                            reussite, nb = await pgoutils.copier_table(schema_temporaire, table, schema_final, table)
+                            resultats[table] = reussite
+
+                await asyncio.gather(*[copier_tables() for i in range(max(1, min(nb_connexions, len(a_copier))))], return_exceptions = True)
+                resultats = {table: resultats.get(table, False) for table in tables_etrangeres}
+        finally:
+            valid5, nb = await self.effacer_schema(schema_temporaire)
+            valid6, nb = await self.effacer_user_mapping_pour_serveur_distant_fdw(utilisateur, nom_serveur_temporaire)
+            valid7, nb = await self.effacer_serveur_distant_fdw(nom_serveur_temporaire)
+            self.vider_cache_catalogue(schema_final)
+            if self.pool is None:
+                self.deconnecter() # permettre d'effacer la connexion postgres_fdw qui sinon restera en attente inutilement
+                await self.connecter()
+        reussite = valid and valid5 and valid6 and valid7 and all(resultats.values())
+        return reussite, sum(resultats.values()), resultats
+
+    async def copier_table_distante_via_copy(self, hote_distant, base_distante, port, utilisateur, motdepasse, schema_initial, table_initiale, schema_final, table_finale, format_copy = 'text'):
+        '''
+        Voir PgOutils.copier_table_distante_via_copy : la copie (PgConn.copier_vers) est réalisée dans un thread, 
+        sur une connexion synchrone à la base distante.
+        '''
+        async with AsyncPgOutils(hote_distant, base_distante, port, utilisateur, motdepasse, self.script) as pgoutils_distant:
+            champs = await pgoutils_distant.lister_champs(schema_initial, table_initiale)
+        if not champs:
+            return False, -1
+        valid, nb = await self.effacer_table(schema_final, table_finale)
+        valid2, nb = await self.creer_table(schema_final, table_finale, champs)
+        if not (valid and valid2):
+            return False, -1
+        noms = ', '.join([c[1] for c in champs])
+        select = 'SELECT {0} FROM {1}.{2}'.format(noms, schema_initial, table_initiale)
+        table = '{0}.{1} ({2})'.format(schema_final, table_finale, noms)
+
+        def copier(destination):
+            source = PgConn(hote_distant, base_distante, port, utilisateur, motdepasse)
+            try:
+                return source.copier_vers(destination, select, table, format_copy)
+            finally:
+                source.deconnection_postgres()
+
+        try:
+            async with self.connexion() as pgconn:
+                return True, await pgconn.synchrone(copier)
+        except Exception as e:
+            logger.error('Echec de la copie de %s.%s vers %s.%s : %s', schema_initial, table_initiale, schema_final, table_finale, e)
+            return False, -1
+
+    @asynccontextmanager
+    async def _outils_supplementaires(self):
+        '''
+        Fournit une copie de l'objet travaillant sur une connexion supplémentaire (voir connexion_supplementaire)
+        '''
+        async with self.connexion_supplementaire() as pgconn:
+            pgoutils = copy.copy(self)
+            pgoutils.pool = None
+            pgoutils.pgconn = pgconn
+            pgoutils._verrou = asyncio.Lock()
+            yield pgoutils
+
+
+class AsyncPgExport(AsyncPgOutils):
+    '''
+    Pendant asynchrone de PgExport (export sqlite et csv)
+
+    Les lignes sont lues de façon asynchrone par paquets ; l'écriture locale (fichier csv, base sqlite)
+    se fait au fil de l'eau, paquet par paquet. Les exports csv via_copy sont réalisés dans un thread.
+    '''
+
+    VUE_TEMPORAIRE = PgExport.VUE_TEMPORAIRE
+    TYPES_NON_EXPORTABLES_VIA_COPY = PgExport.TYPES_NON_EXPORTABLES_VIA_COPY
+
+    _requete_select_table = PgExport._requete_select_table
+    _requete_select_csv = PgExport._requete_select_csv
+    _expression_csv = PgExport._expression_csv
+    _expression_csv_reel = PgExport._expression_csv_reel
+    _creer_table_sqlite = PgExport._creer_table_sqlite
+    _inserer_donnees_dans_sqlite = PgExport._inserer_donnees_dans_sqlite
+
+    async def _creer_vue_temporaire(self, select_sql):
+        '''
+        Crée une vue temporaire avec la requête SELECT spécifiée
+        '''
+        requete_vue = '''DROP VIEW IF EXISTS {1};
+        CREATE VIEW {1} AS {0}'''.format(select_sql, self.VUE_TEMPORAIRE)
+        return await self.execution(requete_vue)
+
+    async def exporter_table_vers_sqlite(self, schema, table, nom_bdd_sqlite, nom_table_sqlite, recreer_table = True, limit = None):
+        '''
+        Voir PgExport.exporter_table_vers_sqlite
+        Renvoie le nombre de lignes exportées.
+        '''
+        champs = await self.lister_champs(schema, table)
+        donnees = await self.execution_et_recuperation_iterateur(self._requete_select_table(schema, table, limit))
+        sqlite = SqliteConn(nom_bdd_sqlite)
+        nb = 0
+        try:
+            with sqlite.chargement_massif():
+                if recreer_table:
+                    self._creer_table_sqlite(sqlite, nom_table_sqlite, champs)
+                async for lot in self._lots(donnees):
+                    self._inserer_donnees_dans_sqlite(lot, sqlite, nom_table_sqlite, len(champs))
+                    nb += len(lot)
+        finally:
+            sqlite.deconnection_sqlite()
+        return nb
+
+    async def exporter_requete_vers_sqlite(self, sql, nom_bdd_sqlite, nom_table_sqlite, recreer_table = True, limit = None):
+        '''
+        Voir PgExport.exporter_requete_vers_sqlite
+        '''
+        schema, table = self.VUE_TEMPORAIRE.split('.')
+        reussite, nb = await self._creer_vue_temporaire(sql)
+        if reussite:
+            return await self.exporter_table_vers_sqlite(schema, table, nom_bdd_sqlite, nom_table_sqlite, recreer_table, limit)
+
+    async def exporter_table_vers_csv(self, schema, table, fichier_csv, delimiteur = '|', limit = None):
+        '''
+        Voir PgExport.exporter_table_vers_csv
+        '''
+        champs = [nom for position, nom, type in await self.lister_champs(schema, table)]
+        donnees = await self.execution_et_recuperation_iterateur(self._requete_select_table(schema, table, limit))
+        with open(fichier_csv, 'w', encoding = 'utf-8', newline = '\n') as fichier:
+            csv_writer = csv.writer(fichier, delimiter = delimiteur)
+            csv_writer.writerow(champs)
+            async for lot in self._lots(donnees):
+                csv_writer.writerows(lot)
+
+    async def exporter_requete_vers_csv(self, sql, fichier_csv, delimiteur = '|', limit = None):
+        '''
+        Voir PgExport.exporter_requete_vers_csv
+        '''
+        schema, table = self.VUE_TEMPORAIRE.split('.')
+        reussite, nb = await self._creer_vue_temporaire(sql)
+        if reussite:
+            return await self.exporter_table_vers_csv(schema, table, fichier_csv, delimiteur, limit = limit)
+
+    async def exporter_table_vers_csv_via_copy(self, schema, table, fichier_csv, delimiteur = '|', limit = None):
+        '''
+        Voir PgExport.exporter_table_vers_csv_via_copy (exécuté dans un thread)
+        '''
+        select = self._requete_select_csv(schema, table, await self.lister_champs(schema, table), limit)
+        async with self.connexion() as pgconn:
+            return await pgconn.copy_to_csv(select, fichier_csv, delimiteur, entete = True, fin_de_ligne = '\r\n')
+
+    async def exporter_requete_vers_csv_via_copy(self, sql, fichier_csv, delimiteur = '|', limit = None):
+        '''
+        Voir PgExport.exporter_requete_vers_csv_via_copy
+        '''
+        schema, table = self.VUE_TEMPORAIRE.split('.')
+        reussite, nb = await self._creer_vue_temporaire(sql)
+        if reussite:
+            return await self.exporter_table_vers_csv_via_copy(schema, table, fichier_csv, delimiteur, limit = limit)
+
+    async def _lots(self, donnees):
+        '''
+        Regroupe les lignes de l'itérateur asynchrone par paquets de ITERSIZE
+        '''
+        if donnees is None:
+            return
+        lot = []
+        async for ligne in donnees:
+            lot.append(ligne)
+            if len(lot) >= self.ITERSIZE:
+                yield lot
+                lot = []
+        if lot:
+            yield lot
+
+
+class AsyncPgImport(AsyncPgOutils):
+    '''
+    Pendant asynchrone de PgImport (import sqlite et csv)
+
+    La création des tables est asynchrone ; le transfert des données (lecture sqlite ou csv, COPY)
+    est réalisé dans un thread sur une connexion synchrone.
+    '''
+
+    async def importer_table_depuis_sqlite(self, fichier_sqlite, table_sqlite, schema, table, methode = 'copy'):
+        '''
+        Voir PgImport.importer_table_depuis_sqlite
+        '''
+        s = SqliteConn(fichier_sqlite)
+        try:
+            create_table = s.recuperer_requete_creation_table(table_sqlite)
+        finally:
+            s.deconnection_sqlite()
+        await self.creer_schema_si_inexistant(schema)
+        # nom qualifié plutôt que search_path : avec un pool, les requêtes suivantes n'utilisent pas forcément la même connexion
+        create_table = re.sub(r'^\s*CREATE TABLE\s+(["`\[]?)' + re.escape(table_sqlite) + r'["`\]]?', 
+                              'CREATE TABLE ' + schema + '.' + table, create_table, count = 1, flags = re.IGNORECASE)
+        create_table = create_table.replace('AUTOINCREMENT', '')
+        await self.effacer_table(schema, table)
+        await self.execution_et_ecriture_script(create_table)
+        async def executer():
+            async with self.connexion() as pgconn:
+                return await pgconn.synchrone(self._transferer_depuis_sqlite, fichier_sqlite, table_sqlite, schema + '.' + table, methode)
+        sql = 'COPY {0}.{1} FROM STDIN'.format(schema, table)
+        # les lignes sqlite ne sont lues qu'une fois : une seule tentative
+        reussite, nb = await self._avec_tentatives(executer, sql, None, 1, None, ecriture_script = True)
+        return reussite, nb if reussite else -1
+
+    async def importer_table_depuis_csv(self, fichier_csv, schema, table, separateur):
+        '''
+        Voir PgImport.importer_table_depuis_csv
+        '''
+        with open(fichier_csv, 'r', encoding = 'utf-8') as f:
+            entete = [elt.strip() for elt in f.readline().split(separateur)]
+        await self.effacer_table(schema, table)
+        champs = ' TEXT, '.join(entete) + ' TEXT'
+        create_table = '''CREATE TABLE {0}.{1} ({2});'''.format(schema, table, champs)
+        await self.execution_et_ecriture_script(create_table)
+        async with self.connexion() as pgconn:
+            return await pgconn.copy_from_csv(fichier_csv, separateur, schema + '.' + table, entete = True)
+
+    def _transferer_depuis_sqlite(self, pgconn, fichier_sqlite, table_sqlite, table, methode):
+        '''
+        Transfère, depuis le thread d'exécution, les lignes de la table sqlite dans la table PostgreSQL
+        '''
+        s = SqliteConn(fichier_sqlite)
+        try:
+            donnees = s.execute_recupere_iterateur('''SELECT * FROM {0};'''.format(table_sqlite), self.ITERSIZE)
+            if methode == 'values':
+                return pgconn.execute_values('INSERT INTO {0} VALUES %s;'.format(table), donnees, self.ITERSIZE)
+            return pgconn.copy_from_lignes(donnees, table)
+        finally:
+            s.deconnection_sqlite()
+
+#eof
@@ -3,12 +3,38 @@
 '''
 
 import psycopg2
+import psycopg2.extras
+import atexit
+import contextvars
+import copy
 import csv
+import gzip
 import os
+import queue
+import shutil
 import sys
 import inspect
+import logging
+import re
+import string
+import uuid
+import threading
+import time
+from bisect import bisect_left
+from collections import deque, OrderedDict
+from contextlib import contextmanager
+from functools import wraps
+from itertools import chain, islice
 from datetime import datetime
-from random import randint
+from random import randint, random
+
+from pg.pgcolonnes import DecodeurCopyBinaire, ResultatColonnaire
+
+
+logger = logging.getLogger(__name__)
+
+# nom de la méthode décorée (gabarit) en cours d'exécution, pour l'instrumentation
+_operation_courante = contextvars.ContextVar('operation_courante', default = None)
 
 
 '''
@@ -18,57 +44,156 @@ DECORATEURS
 '''
 
 def requete_sql(fonction):    
+    clef = fonction.__name__.upper()
+    @wraps(fonction)
     def interne(objet, *args, **kwargs):        
-        requete = objet.requete_sql[fonction.__name__.upper()].format(*args)
-        reussite, nb = objet.execution_et_ecriture_script(requete)
-        return reussite, nb
+        return objet._executer_gabarit(clef, args, objet.execution_et_ecriture_script, _tel_quel)
     return interne
 
 def requete_sql_avec_modification_args(fonction):    
+    clef = fonction.__name__.upper()
+    @wraps(fonction)
     def interne(objet, *args, **kwargs):
         args = fonction(objet, *args, **kwargs)        
-        requete = objet.requete_sql[fonction.__name__.upper()].format(*args)
-        reussite, nb = objet.execution_et_ecriture_script(requete)
-        return reussite, nb
+        return objet._executer_gabarit(clef, args, objet.execution_et_ecriture_script, _tel_quel)
     return interne
 
 def select_sql(fonction):    
-    def interne(objet, *args, **kwargs):
-        requete = objet.requete_sql[fonction.__name__.upper()].format(*args)
-        resultat = objet.execution_et_recuperation(requete)
-        if resultat is not None:
-            return resultat if len(resultat) > 0 else []
-        return None
+    clef = fonction.__name__.upper()
+    @wraps(fonction)
+    def interne(objet, *args, iterateur = False, **kwargs):
+        if iterateur:
+            return objet._executer_gabarit(clef, args, objet.execution_et_recuperation_iterateur, _tel_quel)
+        return objet._executer_gabarit(clef, args, objet.execution_et_recuperation, _liste)
     return interne
 
 def select_sql_avec_modification_args(fonction):    
-    def interne(objet, *args, **kwargs):
+    clef = fonction.__name__.upper()
+    @wraps(fonction)
+    def interne(objet, *args, iterateur = False, **kwargs):
         args = fonction(objet, *args, **kwargs)        
-        requete = objet.requete_sql[fonction.__name__.upper()].format(*args)
-        resultat = objet.execution_et_recuperation(requete)
-        if resultat is not None:
-            return resultat if len(resultat) > 0 else []
-        return None
+        if iterateur:
+            return objet._executer_gabarit(clef, args, objet.execution_et_recuperation_iterateur, _tel_quel)
+        return objet._executer_gabarit(clef, args, objet.execution_et_recuperation, _liste)
     return interne
 
 def select_sql_champ_unique(fonction):    
-    def interne(objet, *args, **kwargs):
-        requete = objet.requete_sql[fonction.__name__.upper()].format(*args)
-        resultat = objet.execution_et_recuperation(requete)
-        if resultat is not None:   
-            return [r[0] for r in resultat] if len(resultat) > 0 else []
-        return None
+    clef = fonction.__name__.upper()
+    @wraps(fonction)
+    def interne(objet, *args, iterateur = False, **kwargs):
+        if iterateur:
+            return objet._executer_gabarit(clef, args, objet.execution_et_recuperation_iterateur, _premiers_champs)
+        return objet._executer_gabarit(clef, args, objet.execution_et_recuperation, _liste_premiers_champs)
     return interne
 
 def select_sql_valeur_unique(fonction):    
+    clef = fonction.__name__.upper()
+    @wraps(fonction)
     def interne(objet, *args, **kwargs):
-        requete = objet.requete_sql[fonction.__name__.upper()].format(*args)
-        resultat = objet.execution_et_recuperation(requete)
-        if resultat is not None:
-            return resultat[0][0] if len(resultat) > 0 else []
-        return None 
+        return objet._executer_gabarit(clef, args, objet.execution_et_recuperation, _valeur_unique)
     return interne
 
+def catalogue(position_schema):
+    '''
+    Met en cache, sur la connexion, le résultat d'une méthode d'introspection du catalogue (lister_*).
+    position_schema est la position de l'argument désignant le schéma concerné (None si la méthode porte sur les schémas).
+    Les appels avec iterateur=True ne sont pas mis en cache.
+    '''
+    def decorateur(fonction):
+        nom = fonction.__name__
+        @wraps(fonction)
+        def interne(objet, *args, **kwargs):
+            if kwargs.get('iterateur'):
+                return fonction(objet, *args, **kwargs)
+            cache = objet.cache_catalogue
+            trouve, resultat = cache.lire((nom, args))
+            if trouve:
+                return objet._apres(resultat, list)
+            def memoriser(resultat):
+                if resultat is None:
+                    return None
+                schema = args[position_schema] if position_schema is not None else None
+                cache.ecrire((nom, args), resultat, schema)
+                return list(resultat)
+            return objet._apres(fonction(objet, *args, **kwargs), memoriser)
+        return interne
+    return decorateur
+
+def invalide_catalogue(*positions_schemas):
+    '''
+    Après l'appel d'une méthode modifiant la structure de la base, invalide dans le cache catalogue 
+    les entrées des schémas passés aux positions indiquées ainsi que les listes de schémas.
+    Sans position, l'ensemble du cache est vidé.
+    '''
+    def decorateur(fonction):
+        @wraps(fonction)
+        def interne(objet, *args, **kwargs):
+            def invalider(resultat):
+                if positions_schemas:
+                    objet.cache_catalogue.invalider(_schemas_des_arguments(args, positions_schemas))
+                else:
+                    objet.cache_catalogue.vider()
+                return resultat
+            return objet._apres(fonction(objet, *args, **kwargs), invalider)
+        return interne
+    return decorateur
+
+def _schemas_des_arguments(args, positions):
+    '''
+    Renvoie les schémas des arguments aux positions indiquées (un argument pouvant être une liste de schémas)
+    '''
+    schemas = []
+    for position in positions:
+        if position < len(args):
+            valeur = args[position]
+            schemas.extend(valeur if isinstance(valeur, (list, tuple)) else [valeur])
+    return schemas
+
+def _enregistrer_operation(instrumentation, operation, methode, debut, sql, lignes):
+    '''
+    Enregistre une mesure au nom de l'opération (gabarit) active au début d'un parcours, 
+    le parcours se terminant en dehors de l'appel de la méthode décorée
+    '''
+    jeton = _operation_courante.set(operation)
+    try:
+        instrumentation.enregistrer(methode, debut, sql, lignes)
+    finally:
+        _operation_courante.reset(jeton)
+
+def _tel_quel(resultat):
+    return resultat
+
+def _liste(resultat):
+    if resultat is not None:
+        return resultat if len(resultat) > 0 else []
+    return None
+
+def _liste_premiers_champs(resultat):
+    if resultat is not None:   
+        return [r[0] for r in resultat] if len(resultat) > 0 else []
+    return None
+
+def _valeur_unique(resultat):
+    if resultat is not None:
+        return resultat[0][0] if len(resultat) > 0 else []
+    return None 
+
+def _premiers_champs(lignes):
+    '''
+    Renvoie un itérateur sur le premier champ de chaque ligne
+    '''
+    if lignes is None:
+        return None
+    return (r[0] for r in lignes)
+
+def _lier(gabarit, args):
+    '''
+    Renvoie la requête et les paramètres correspondant au gabarit appliqué aux arguments
+    '''
+    if isinstance(gabarit, GabaritSql):
+        return gabarit.lier(args)
+    return gabarit.format(*args), ()
+
 '''
 
 CLASSES
@@ -76,6 +201,461 @@ CLASSES
 '''
 
 
+class GabaritSql(str):
+    '''
+    Requête d'un fichier .sql, analysée une seule fois.
+    
+    Dans le gabarit, {n} est remplacé par le texte du n-ième argument (identifiants, fragments sql) 
+    alors que {n!v} désigne une valeur : elle n'est pas insérée dans le texte de la requête 
+    mais transmise au serveur comme paramètre.
+    '''
+    
+    def __new__(cls, texte):
+        gabarit = super().__new__(cls, texte)
+        gabarit._champs = list(string.Formatter().parse(texte))
+        gabarit.avec_valeurs = any(conversion == 'v' for litteral, champ, spec, conversion in gabarit._champs)
+        return gabarit
+    
+    def lier(self, args):
+        '''
+        Renvoie le texte de la requête (au format psycopg2 si le gabarit contient des valeurs) 
+        et le tuple des valeurs à transmettre comme paramètres
+        '''
+        if not self.avec_valeurs:
+            return self.format(*args), ()
+        formateur = string.Formatter()
+        morceaux = []
+        parametres = []
+        position = 0
+        for litteral, champ, spec, conversion in self._champs:
+            morceaux.append(litteral.replace('%', '%%'))
+            if champ is None:
+                continue
+            if champ == '':
+                champ, position = str(position), position + 1
+            valeur = formateur.get_field(champ, args, {})[0]
+            if conversion == 'v':
+                morceaux.append('%s')
+                parametres.append(valeur)
+            else:
+                valeur = formateur.format_field(formateur.convert_field(valeur, conversion), spec)
+                morceaux.append(valeur.replace('%', '%%'))
+        return ''.join(morceaux), tuple(parametres)
+
+
+
+class Instrumentation():
+    '''
+    Mesures des requêtes exécutées par les connexions (PgConn.instrumentation) : nombre d'appels, durées, 
+    lignes et octets, et histogramme des durées, par opération. L'opération est le nom de la méthode décorée 
+    (gabarit sql) à l'origine de la requête, à défaut la méthode de PgConn (execute_commit, copy_from_csv...).
+    
+    Les requêtes durant plus de seuil_requete_lente secondes sont signalées (niveau WARNING) 
+    sur le logger pg.requetes_lentes.
+    
+    Sans instrumentation (None, par défaut), aucune mesure n'est faite.
+    '''
+    
+    BORNES_HISTOGRAMME = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, float('inf'))
+    
+    def __init__(self, seuil_requete_lente = 1.0, longueur_max_requete = 1000):
+        self.seuil_requete_lente = seuil_requete_lente
+        self.longueur_max_requete = longueur_max_requete
+        self.logger_requetes_lentes = logging.getLogger('pg.requetes_lentes')
+        self._verrou = threading.Lock()
+        self._mesures = {}
+    
+    def enregistrer(self, methode, debut, sql = None, lignes = 0, octets = 0):
+        '''
+        Enregistre l'exécution par la méthode de PgConn spécifiée, commencée à debut (time.perf_counter())
+        '''
+        duree = time.perf_counter() - debut
+        operation = _operation_courante.get() or methode
+        lignes = max(lignes or 0, 0)
+        with self._verrou:
+            mesure = self._mesures.get(operation)
+            if mesure is None:
+                mesure = self._mesures[operation] = {'nb': 0, 'duree_totale': 0.0, 'duree_max': 0.0, 'lignes': 0, 'octets': 0, 
+                                                     'histogramme': [0] * len(self.BORNES_HISTOGRAMME)}
+            mesure['nb'] += 1
+            mesure['duree_totale'] += duree
+            mesure['duree_max'] = max(mesure['duree_max'], duree)
+            mesure['lignes'] += lignes
+            mesure['octets'] += octets or 0
+            mesure['histogramme'][min(bisect_left(self.BORNES_HISTOGRAMME, duree), len(self.BORNES_HISTOGRAMME) - 1)] += 1
+        if self.seuil_requete_lente is not None and duree >= self.seuil_requete_lente:
+            texte = sql if isinstance(sql, str) else repr(sql)
+            self.logger_requetes_lentes.warning('%s (%s) : %.3f s, %s lignes : %s', operation, methode, duree, lignes, 
+                                                texte[:self.longueur_max_requete])
+    
+    def statistiques(self):
+        '''
+        Renvoie le dictionnaire {operation: mesures} des opérations enregistrées, 
+        mesures étant un dictionnaire (nb, duree_totale, duree_moyenne, duree_max, lignes, octets, histogramme), 
+        l'histogramme étant la liste des couples (borne supérieure en secondes, nombre d'exécutions)
+        '''
+        with self._verrou:
+            statistiques = {}
+            for operation, mesure in self._mesures.items():
+                statistiques[operation] = dict(mesure, 
+                                               duree_moyenne = mesure['duree_totale'] / mesure['nb'],
+                                               histogramme = list(zip(self.BORNES_HISTOGRAMME, mesure['histogramme'])))
+            return statistiques
+    
+    def remettre_a_zero(self):
+        with self._verrou:
+            self._mesures.clear()
+
+
+class PolitiqueTentatives():
+    '''
+    Politique de nouvelles tentatives des méthodes execution* de PgOutils.
+    
+    Seules les erreurs transitoires sont retentées (max_tentative tentatives au total) : perte de connexion (classe 08, 
+    arrêt du serveur, erreur sans code SQLSTATE), conflits de sérialisation et interblocages (40001, 40P01), 
+    ressources insuffisantes (classe 53) et verrou indisponible (55P03). 
+    Les erreurs permanentes (syntaxe, contraintes, droits...) échouent dès la première tentative.
+    
+    Le délai avant la tentative n est tiré entre (1 - gigue) et 1 fois min(delai_max, delai_initial * facteur ** (n - 1)) secondes.
+    '''
+    
+    CLASSES_TRANSITOIRES = ('08', '53')
+    CODES_TRANSITOIRES = ('40001', '40P01', '55P03', '57P01', '57P02', '57P03')
+    CODES_PERTE_DE_CONNEXION = ('57P01', '57P02', '57P03')
+    
+    def __init__(self, max_tentative = 3, delai_initial = 0.1, delai_max = 5.0, facteur = 2.0, gigue = 0.5):
+        self.max_tentative = max_tentative
+        self.delai_initial = delai_initial
+        self.delai_max = delai_max
+        self.facteur = facteur
+        self.gigue = gigue
+    
+    def est_transitoire(self, erreur):
+        '''
+        Renvoie True si une nouvelle tentative peut réussir après l'erreur spécifiée
+        '''
+        code = getattr(erreur, 'pgcode', None)
+        if code is None:
+            return isinstance(erreur, (psycopg2.OperationalError, psycopg2.InterfaceError))
+        return code[:2] in self.CLASSES_TRANSITOIRES or code in self.CODES_TRANSITOIRES
+    
+    def est_perte_de_connexion(self, erreur, connection = None):
+        '''
+        Renvoie True si l'erreur traduit la perte de la connexion (qui doit alors être rétablie)
+        '''
+        if connection is None or connection.closed:
+            return True
+        code = getattr(erreur, 'pgcode', None)
+        if code is None:
+            return isinstance(erreur, (psycopg2.OperationalError, psycopg2.InterfaceError))
+        return code[:2] == '08' or code in self.CODES_PERTE_DE_CONNEXION
+    
+    def delai(self, tentative):
+        '''
+        Délai (en secondes) à observer après l'échec de la tentative spécifiée
+        '''
+        delai = min(self.delai_max, self.delai_initial * self.facteur ** (tentative - 1))
+        return delai * (1 - self.gigue * random())
+    
+    def attendre(self, tentative):
+        time.sleep(self.delai(tentative))
+
+
+class JournalScript():
+    '''
+    Journal des requêtes écrites dans un fichier script, partagé par tous les objets (et threads) 
+    utilisant le même chemin : voir JournalScript.pour().
+    
+    Le fichier reste ouvert et les écritures sont regroupées : le tampon est écrit sur disque dès qu'il dépasse 
+    taille_tampon caractères ou que delai_ecriture secondes se sont écoulées depuis la dernière écriture sur disque, 
+    et en tout état de cause par vider(), fermer() et à la fin du programme.
+    
+    Si taille_max (en octets) est spécifiée, le fichier est archivé au-delà de cette taille (fichier.1, fichier.2, ... 
+    jusqu'à nb_archives, compressés en .gz si compression est à True) et un nouveau fichier est commencé.
+    '''
+    
+    _verrou_journaux = threading.Lock()
+    _journaux = {}
+    
+    def __init__(self, chemin, taille_tampon = 65536, delai_ecriture = 1.0, taille_max = None, nb_archives = 5, compression = False):
+        self.chemin = chemin
+        self.taille_tampon = taille_tampon
+        self.delai_ecriture = delai_ecriture
+        self.taille_max = taille_max
+        self.nb_archives = nb_archives
+        self.compression = compression
+        self._verrou = threading.RLock()
+        self._tampon = []
+        self._taille_tampon = 0
+        self._fichier = None
+        self._taille_fichier = 0
+        self._date_ecriture = time.monotonic()
+    
+    @classmethod
+    def pour(cls, chemin, **options):
+        '''
+        Renvoie le journal associé au chemin, créé au premier appel ; 
+        les options (voir constructeur) éventuellement spécifiées lui sont appliquées.
+        '''
+        clef = os.path.abspath(chemin)
+        with cls._verrou_journaux:
+            journal = cls._journaux.get(clef)
+            if journal is None:
+                journal = cls._journaux[clef] = cls(chemin, **options)
+            else:
+                for option, valeur in options.items():
+                    setattr(journal, option, valeur)
+            return journal
+    
+    @classmethod
+    def vider_tous(cls):
+        with cls._verrou_journaux:
+            journaux = list(cls._journaux.values())
+        for journal in journaux:
+            journal.vider()
+    
+    @classmethod
+    def fermer_tous(cls):
+        with cls._verrou_journaux:
+            journaux = list(cls._journaux.values())
+            cls._journaux.clear()
+        for journal in journaux:
+            journal.fermer()
+    
+    def ecrire(self, texte, immediat = False):
+        '''
+        Ajoute le texte au journal ; il est écrit sur disque immédiatement si immediat est à True, 
+        sinon selon la politique de mise en tampon.
+        '''
+        with self._verrou:
+            self._tampon.append(texte)
+            self._taille_tampon += len(texte)
+            if immediat or self._taille_tampon >= self.taille_tampon or time.monotonic() - self._date_ecriture >= self.delai_ecriture:
+                self.vider()
+    
+    def effacer(self, texte = ''):
+        '''
+        Efface le contenu du fichier (et le tampon) puis y écrit le texte
+        '''
+        with self._verrou:
+            self._tampon = []
+            self._taille_tampon = 0
+            self._fermer_fichier()
+            self._ouvrir_fichier('w')
+            self.ecrire(texte, immediat = True)
+    
+    def vider(self):
+        '''
+        Ecrit le tampon sur disque
+        '''
+        with self._verrou:
+            self._date_ecriture = time.monotonic()
+            if not self._tampon:
+                return
+            texte = ''.join(self._tampon)
+            self._tampon = []
+            self._taille_tampon = 0
+            if self._fichier is None:
+                self._ouvrir_fichier('a')
+            self._fichier.write(texte)
+            self._fichier.flush()
+            self._taille_fichier += len(texte.encode('utf-8'))
+            if self.taille_max and self._taille_fichier >= self.taille_max:
+                self._archiver()
+    
+    def fermer(self):
+        with self._verrou:
+            self.vider()
+            self._fermer_fichier()
+    
+    def _ouvrir_fichier(self, mode):
+        self._fichier = open(self.chemin, mode, encoding = 'utf-8')
+        self._taille_fichier = os.path.getsize(self.chemin)
+    
+    def _fermer_fichier(self):
+        if self._fichier is not None:
+            self._fichier.close()
+            self._fichier = None
+    
+    def _archiver(self):
+        '''
+        Décale les archives existantes (fichier.1 -> fichier.2, ...) et archive le fichier courant en fichier.1
+        '''
+        self._fermer_fichier()
+        extension = '.gz' if self.compression else ''
+        archives = [self.chemin + '.' + str(i) + extension for i in range(1, self.nb_archives + 1)]
+        if os.path.exists(archives[-1]):
+            os.remove(archives[-1])
+        for ancienne, nouvelle in reversed(list(zip(archives, archives[1:]))):
+            if os.path.exists(ancienne):
+                os.replace(ancienne, nouvelle)
+        if self.compression:
+            with open(self.chemin, 'rb') as source, gzip.open(archives[0], 'wb') as destination:
+                shutil.copyfileobj(source, destination)
+            os.remove(self.chemin)
+        else:
+            os.replace(self.chemin, archives[0])
+        self._ouvrir_fichier('a')
+
+atexit.register(JournalScript.fermer_tous)
+
+
+class CacheCatalogue():
+    '''
+    Cache des résultats d'introspection du catalogue, attaché à une connexion (PgConn.cache_catalogue).
+    
+    Les entrées expirent après duree_vie secondes ; au-delà de taille_max entrées, 
+    les moins récemment utilisées sont évincées.
+    
+    Le cache est désactivé par défaut (duree_vie à 0) : les modifications de structure faites par une autre connexion 
+    (psql, PgLoad...) ne sont pas détectées. Il est à activer lorsque la structure de la base ne change pas 
+    pendant le traitement, ou ne change que par l'objet lui-même : 
+    
+        pgoutils.cache_catalogue.duree_vie = 60
+    '''
+    
+    def __init__(self, duree_vie = 0, taille_max = 1000):
+        self.duree_vie = duree_vie
+        self.taille_max = taille_max
+        self._entrees = OrderedDict()
+        self._verrou = threading.Lock()
+    
+    def lire(self, clef):
+        '''
+        Renvoie (True, valeur) si la clef est présente et non expirée, (False, None) sinon
+        '''
+        with self._verrou:
+            entree = self._entrees.get(clef)
+            if entree is None:
+                return False, None
+            expiration, valeur, schema = entree
+            if expiration < time.monotonic():
+                del self._entrees[clef]
+                return False, None
+            self._entrees.move_to_end(clef)
+            return True, valeur
+    
+    def ecrire(self, clef, valeur, schema = None):
+        if not self.duree_vie or not self.taille_max:
+            return
+        with self._verrou:
+            self._entrees[clef] = (time.monotonic() + self.duree_vie, valeur, schema)
+            self._entrees.move_to_end(clef)
+            while len(self._entrees) > self.taille_max:
+                self._entrees.popitem(last = False)
+    
+    def invalider(self, schemas):
+        '''
+        Supprime les entrées relatives aux schémas listés ainsi que celles portant sur les schémas eux-mêmes
+        '''
+        schemas = set(schemas)
+        with self._verrou:
+            for clef in [clef for clef, (expiration, valeur, schema) in self._entrees.items() if schema is None or schema in schemas]:
+                del self._entrees[clef]
+    
+    def vider(self):
+        with self._verrou:
+            self._entrees.clear()
+    
+    def __len__(self):
+        return len(self._entrees)
+
+
+class RegistreSql():
+    '''
+    Registre, commun au processus, des requêtes sql définies dans les fichiers <classe>.sql.
+    
+    Chaque fichier n'est lu et analysé qu'une fois tant que sa date de modification ne change pas, 
+    et les requêtes d'une classe (fusion des fichiers de sa hiérarchie) sont partagées par toutes ses instances.
+    '''
+    
+    _verrou = threading.RLock()
+    _fichiers = {}
+    _classes = {}
+    _chemins = {}
+    
+    @classmethod
+    def requetes_de_la_classe(cls, classe):
+        '''
+        Renvoie le dictionnaire {clef: requete} de la classe et de ses classes parentes.
+        En cas de clef présente à plusieurs niveaux, la requête de la classe la plus haute dans la hiérarchie l'emporte.
+        '''
+        chemins = cls._chemins_de_la_classe(classe)
+        signature = tuple(cls._date_modification(chemin) for chemin in chemins)
+        en_cache = cls._classes.get(classe)
+        if en_cache is not None and en_cache[0] == signature:
+            return en_cache[1]
+        with cls._verrou:
+            requetes = {}
+            for chemin, date_modification in zip(chemins, signature):
+                if date_modification is not None:
+                    requetes.update(cls.requetes_du_fichier(chemin))
+            cls._classes[classe] = (signature, requetes)
+            return requetes
+    
+    @classmethod
+    def requetes_du_fichier(cls, fichier):
+        '''
+        Renvoie le dictionnaire {clef: requete} défini dans le fichier sql.
+        '''
+        chemin = os.path.abspath(fichier)
+        date_modification = os.stat(chemin).st_mtime_ns
+        en_cache = cls._fichiers.get(chemin)
+        if en_cache is not None and en_cache[0] == date_modification:
+            return en_cache[1]
+        with cls._verrou:
+            with open(chemin, 'rt', encoding = 'UTF-8') as f:
+                requetes = cls.analyser(f)
+            cls._fichiers[chemin] = (date_modification, requetes)
+            return requetes
+    
+    @classmethod
+    def vider(cls):
+        '''
+        Vide le registre : les fichiers sql seront relus à la prochaine instanciation.
+        '''
+        with cls._verrou:
+            cls._fichiers.clear()
+            cls._classes.clear()
+            cls._chemins.clear()
+    
+    @staticmethod
+    def analyser(lignes):
+        '''
+        Renvoie le dictionnaire {clef: requete} à partir des lignes d'un fichier sql, 
+        chaque requête étant précédée d'une ligne ## CLEF
+        '''
+        requetes = {}
+        clef = None
+        for ligne in lignes:
+            if ligne.strip().startswith('##'):
+                clef = ligne.strip()[2:].strip()
+                requetes[clef] = []
+                continue
+            if clef is not None:
+                requetes[clef].append(ligne)
+        return {clef: GabaritSql(''.join(morceaux)) for clef, morceaux in requetes.items()}
+    
+    @classmethod
+    def _chemins_de_la_classe(cls, classe):
+        chemins = cls._chemins.get(classe)
+        if chemins is None:
+            chemins = []
+            for parent in inspect.getmro(classe):
+                if parent != type(object()):
+                    repertoire_module = os.path.dirname(os.path.abspath(inspect.getfile(parent)))
+                    chemins.append(os.path.join(repertoire_module, parent.__name__.lower() + '.sql'))
+            cls._chemins[classe] = chemins
+        return chemins
+    
+    @classmethod
+    def _date_modification(cls, chemin):
+        try:
+            return os.stat(chemin).st_mtime_ns
+        except (OSError, IOError):
+            return None
+
+
 class PgOutils():
     '''
     Classe permettant de réaliser des opérations simples sous une base de données PostgreSQL
@@ -95,158 +675,323 @@ class PgOutils():
 
 '''
 
+    ITERSIZE = 2000
+    
+    TAILLE_LOT_DDL = 500
+    
+    POLITIQUE_TENTATIVES = None
 
-    def __init__(self, hote=None, base=None, port=None, utilisateur=None, motdepasse=None, script=None):
+
+    def __init__(self, hote=None, base=None, port=None, utilisateur=None, motdepasse=None, script=None, pool=None):
         '''
         Constructeur
         Se connecte directement à la base de données
         Les requêtes exécutées à partir de l'objet instancié sont écrites dans le fichier script.
+        
+        Si un pool (PgPool) est spécifié, la connexion est empruntée au pool plutôt qu'ouverte 
+        spécifiquement, et lui est rendue par deconnecter().
         '''
-        self.pgconn = PgConn(hote, base, port, utilisateur, motdepasse)
+        self.pool = pool
+        self._pgconn = pool.emprunter() if pool is not None else PgConn(hote, base, port, utilisateur, motdepasse)
         self.script = script
+        self.politique_tentatives = self.POLITIQUE_TENTATIVES or PolitiqueTentatives()
         
-        self.requete_sql = {}
-        for classe in inspect.getmro(self.__class__):
-            if classe != type(object()):
-                try:
-                    repertoire_module = os.path.dirname(os.path.abspath(inspect.getfile(classe)))
-                    self.charger_requete_sql_depuis(os.path.join(repertoire_module, classe.__name__.lower() + '.sql'))
-                except (OSError, IOError) as e:
-                    print(e)
+        # dictionnaire partagé par toutes les instances de la classe : à ne pas modifier directement
+        self.requete_sql = RegistreSql.requetes_de_la_classe(self.__class__)
             
+    def _executer_gabarit(self, clef, args, execution, traitement):
+        '''
+        Lie le gabarit clef aux arguments, l'exécute par la méthode execution et applique traitement au résultat.
+        Utilisée par les décorateurs (requete_sql, select_sql...) ; redéfinie par AsyncPgOutils.
+        '''
+        requete, parametres = _lier(self.requete_sql[clef], args)
+        jeton = _operation_courante.set(clef.lower())
+        try:
+            return traitement(execution(requete, parametres = parametres))
+        finally:
+            _operation_courante.reset(jeton)
+
+    def _apres(self, resultat, traitement):
+        '''
+        Applique traitement au résultat d'une méthode décorée (catalogue, invalide_catalogue) ; redéfinie par AsyncPgOutils.
+        '''
+        return traitement(resultat)
+
     def charger_requete_sql_depuis(self, fichier):
-        with open(fichier, 'rt', encoding = 'UTF-8') as f:
-            lignes = f.readlines()
-            clef = None
-            for ligne in lignes:
-                if ligne.strip().startswith('##'):
-                    clef = ligne.strip()[2:].strip()
-                    self.requete_sql[clef] = ''
-                    continue
-                self.requete_sql[clef] = self.requete_sql[clef] + ligne
+        '''
+        Ajoute à l'objet les requêtes du fichier sql spécifié
+        '''
+        requetes = dict(self.requete_sql)
+        requetes.update(RegistreSql.requetes_du_fichier(fichier))
+        self.requete_sql = requetes
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, type_exception, exception, trace):
+        self.deconnecter()
+    
+    def __del__(self):
+        '''
+        Rend au pool la connexion d'un objet supprimé sans avoir été déconnecté.
+        '''
+        pool, pgconn = getattr(self, 'pool', None), getattr(self, '_pgconn', None)
+        if pool is not None and pgconn is not None:
+            try:
+                pool.rendre(pgconn)
+            except Exception:
+                pass
+    
+    @property
+    def pgconn(self):
+        '''
+        Connexion (PgConn) utilisée par l'objet. 
+        Avec un pool, une connexion est empruntée si l'objet a été déconnecté.
+        '''
+        if self._pgconn is None:
+            self.connecter()
+        return self._pgconn
+    
+    @pgconn.setter
+    def pgconn(self, pgconn):
+        self._pgconn = pgconn
+    
+    @property
+    def cache_catalogue(self):
+        '''
+        Cache (CacheCatalogue) des méthodes d'introspection, porté par la connexion
+        '''
+        return self.pgconn.cache_catalogue
     
     def connecter(self):
         '''
         Connection de l'objet à la base
         '''
-        self.pgconn.connection_postgres()
+        if self.pool is None:
+            self._pgconn.connection_postgres()
+        elif self._pgconn is None:
+            self._pgconn = self.pool.emprunter()
     
-    def deconnecter(self):
+    def deconnecter(self, fermer = False):
         '''
         Déconnexion de l'objet à la base de données        
+        
+        Avec un pool, la connexion est rendue au pool ; elle est fermée si fermer est à True.
+        '''
+        self._vider_journal()
+        if self.pool is None:
+            self._pgconn.deconnection_postgres()
+        elif self._pgconn is not None:
+            self.pool.rendre(self._pgconn, fermer = fermer)
+            self._pgconn = None
+        
+    @contextmanager
+    def connexion_supplementaire(self):
         '''
-        self.pgconn.deconnection_postgres()
+        Fournit une connexion (PgConn) distincte de celle de l'objet, empruntée au pool le cas échéant, 
+        pour mener des traitements concurrents. La connexion est fermée (ou rendue) en sortie.
+        '''
+        if self.pool is not None:
+            with self.pool.connexion() as pgconn:
+                yield pgconn
+        else:
+            pgconn = PgConn(self.pgconn.hote, self.pgconn.base, self.pgconn.port, self.pgconn.utilisateur, self.pgconn.motdepasse)
+            try:
+                yield pgconn
+            finally:
+                pgconn.deconnection_postgres()
         
-    def execution(self, sql, max_tentative = 3):
+    def execution(self, sql, max_tentative = None, parametres = None, politique = None):
         '''
-        Se connecte
-        Tente l'execution d'une requete sql (3 fois par défaut)
-        Se déconnecte
+        Tente l'execution d'une requete sql selon la politique de tentatives (voir PolitiqueTentatives)
         Renvoie True si la requete a réussi ainsi que le nombre de lignes modifiées ou renvoyées en fonction du type de requête
         La requete sql n'est pas écrite dans le fichier script défini.
-        '''
-        reussite = False
-        nb_lignes_modifiees = -1 
-        tentative = 1
-        while(tentative <= max_tentative and not reussite):
-            try:
-                nb_lignes_modifiees = self.pgconn.execute_commit(sql)                
-                print(sql)                
-                reussite = True                
-            except Exception as e:
-                print(e)
-                print('Tentative ' + str(tentative) + ' échouée...')                
-                if tentative == max_tentative:
-                    print('REQUETE EN ECHEC : ')
-                    print(sql)
-                    #sys.exit('FIN PREMATUREE - TRAITEMENT NON ABOUTI')
-                tentative += 1
-        return reussite, nb_lignes_modifiees
+        
+        max_tentative (par défaut celui de la politique) borne le nombre de tentatives de cet appel ; 
+        politique remplace, pour cet appel, la politique de l'objet (politique_tentatives).
+        '''
+        def executer():
+            nb_lignes_modifiees = self.pgconn.execute_commit(sql, parametres)
+            self._invalider_catalogue_si_ddl(sql, parametres)
+            self._tracer(self.pgconn, sql, parametres, ecriture_script = False)
+            return nb_lignes_modifiees
+        reussite, nb_lignes_modifiees = self._avec_tentatives(executer, sql, parametres, max_tentative, politique, ecriture_script = False)
+        return reussite, nb_lignes_modifiees if reussite else -1
     
-    def execution_multiple(self, sql, donnees, max_tentative = 3):
+    def execution_multiple(self, sql, donnees, max_tentative = None, politique = None):
         '''
-        Se connecte
-        Tente l'execution d'une requete multiple sql (3 fois par défaut)
-        Se déconnecte
+        Tente l'execution d'une requete multiple sql selon la politique de tentatives
         Renvoie True si la requete a réussi ainsi que le nombre de lignes modifiées ou renvoyées en fonction du type de requête
         La requete sql n'est pas écrite dans le fichier script défini.
+        
+        Si donnees est un itérateur, il ne peut être parcouru qu'une fois : aucune nouvelle tentative n'est alors faite.
+        '''
+        if iter(donnees) is donnees:
+            max_tentative = 1
+        def executer():
+            nb_lignes_modifiees = self.pgconn.execute_many(sql, donnees)
+            self._invalider_catalogue_si_ddl(sql, None)
+            logger.debug('%s', sql)
+            return nb_lignes_modifiees
+        reussite, nb_lignes_modifiees = self._avec_tentatives(executer, sql, None, max_tentative, politique, ecriture_script = False)
+        return reussite, nb_lignes_modifiees if reussite else -1
+    
+    def execution_copy(self, lignes, table, max_tentative = None, politique = None):
         '''
-        reussite = False
-        nb_lignes_modifiees = -1 
-        tentative = 1
-        while(tentative <= max_tentative and not reussite):
-            try:
-                nb_lignes_modifiees = self.pgconn.execute_many(sql, donnees)                
-                print(sql)                
-                reussite = True                
-            except Exception as e:
-                print(e)
-                print('Tentative ' + str(tentative) + ' échouée...')                
-                if tentative == max_tentative:
-                    print('REQUETE EN ECHEC : ')
-                    print(sql)
-                    #sys.exit('FIN PREMATUREE - TRAITEMENT NON ABOUTI')
-                tentative += 1
-        return reussite, nb_lignes_modifiees
+        Tente la copie des tuples de l'itérable lignes dans la table (voir PgConn.copy_from_lignes) selon la politique de tentatives
+        Renvoie True si la copie a réussi ainsi que le nombre de lignes copiées
+        Un échec est écrit dans le fichier script défini.
+        
+        Si lignes est un itérateur, il ne peut être parcouru qu'une fois : aucune nouvelle tentative n'est alors faite.
+        '''
+        if iter(lignes) is lignes:
+            max_tentative = 1
+        sql = 'COPY {0} FROM STDIN'.format(table)
+        def executer():
+            nb_lignes = self.pgconn.copy_from_lignes(lignes, table)
+            logger.debug('%s', sql)
+            return nb_lignes
+        reussite, nb_lignes = self._avec_tentatives(executer, sql, None, max_tentative, politique, ecriture_script = True)
+        return reussite, nb_lignes if reussite else -1
+    
+    def execution_valeurs(self, sql, lignes, taille_lot = 1000, max_tentative = None, politique = None):
+        '''
+        Tente l'execution de la requete sql (ex: INSERT INTO table VALUES %s, voir PgConn.execute_values) 
+        pour les tuples de l'itérable lignes selon la politique de tentatives
+        Renvoie True si la requete a réussi ainsi que le nombre de lignes modifiées
+        Un échec est écrit dans le fichier script défini.
+        
+        Si lignes est un itérateur, il ne peut être parcouru qu'une fois : aucune nouvelle tentative n'est alors faite.
+        '''
+        if iter(lignes) is lignes:
+            max_tentative = 1
+        def executer():
+            nb_lignes_modifiees = self.pgconn.execute_values(sql, lignes, taille_lot)
+            logger.debug('%s', sql)
+            return nb_lignes_modifiees
+        reussite, nb_lignes_modifiees = self._avec_tentatives(executer, sql, None, max_tentative, politique, ecriture_script = True)
+        return reussite, nb_lignes_modifiees if reussite else -1
     
-    def execution_et_recuperation(self, sql, max_tentative = 3):
+    def execution_et_recuperation(self, sql, max_tentative = None, parametres = None, politique = None):
         '''
-        Se connecte
-        Tente l'execution d'une requete sql (3 fois par défaut)
-        Se déconnecte
+        Tente l'execution d'une requete sql selon la politique de tentatives
         Ecrit la requete correspondante dans le fichier script défini
         Renvoie le résultat de la requete sous forme d'une liste de tuple ou None en cas d'échec
         '''
-        resultat = None
-        reussite = False
-        tentative = 1
-        while(tentative <= max_tentative and not reussite):
-            try:
-                resultat = self.pgconn.execute_recupere(sql)
-                self.redaction_script(self.script, sql, False)                
-                print(sql)
-                reussite = True                                
-            except Exception as e:
-                print(e)                
-                print('Tentative ' + str(tentative) + ' échouée...')
-                if tentative == max_tentative:
-                    print('REQUETE EN ECHEC : ')
-                    print(sql)
-                    self.redaction_script(self.script, 'REQUETE EN ECHEC : ', False)
-                    self.redaction_script(self.script, sql, False)
-                    #sys.exit('FIN PREMATUREE - TRAITEMENT NON ABOUTI')
-                tentative += 1
+        def executer():
+            resultat = self.pgconn.execute_recupere(sql, parametres)
+            self._tracer(self.pgconn, sql, parametres)
+            return resultat
+        reussite, resultat = self._avec_tentatives(executer, sql, parametres, max_tentative, politique, ecriture_script = True)
         return resultat
+    
+    def execution_et_recuperation_iterateur(self, sql, itersize = None, max_tentative = None, parametres = None, politique = None):
+        '''
+        Tente l'execution d'une requete sql via un curseur côté serveur, selon la politique de tentatives
+        Ecrit la requete correspondante dans le fichier script défini
+        Renvoie un itérateur sur les lignes (tuples) du résultat ou None en cas d'échec
         
-    def execution_et_ecriture_script(self, sql, max_tentative = 3):
+        Les lignes sont rapatriées par paquets de itersize (ITERSIZE par défaut) : la mémoire 
+        cliente reste bornée quelle que soit la taille du résultat.
+        Seule l'ouverture du curseur et la lecture du premier paquet font l'objet de tentatives, 
+        une erreur survenant pendant le parcours est levée.
+        '''
+        itersize = itersize or self.ITERSIZE
+        def executer():
+            lignes = self.pgconn.execute_recupere_iterateur(sql, itersize, parametres)
+            premiere = next(lignes, None)
+            resultat = chain([premiere], lignes) if premiere is not None else iter([])
+            self._tracer(self.pgconn, sql, parametres)
+            return resultat
+        reussite, resultat = self._avec_tentatives(executer, sql, parametres, max_tentative, politique, ecriture_script = True)
+        return resultat
+
+    def execution_et_recuperation_colonnes(self, sql, max_tentative = None, parametres = None, politique = None):
         '''
-        Se connecte
-        Tente l'execution d'une requete sql (3 fois par défaut)
-        Se déconnecte
+        Tente l'execution d'une requete sql (SELECT) en COPY binaire selon la politique de tentatives
+        Ecrit la requete correspondante dans le fichier script défini
+        Renvoie le résultat rangé par colonnes (ResultatColonnaire, voir pg.pgcolonnes) ou None en cas d'échec
+        '''
+        def executer():
+            resultat = self.pgconn.execute_recupere_colonnes(sql, parametres)
+            self._tracer(self.pgconn, sql, parametres)
+            return resultat
+        reussite, resultat = self._avec_tentatives(executer, sql, parametres, max_tentative, politique, ecriture_script = True)
+        return resultat
+
+    def execution_et_ecriture_script(self, sql, max_tentative = None, parametres = None, politique = None):
+        '''
+        Tente l'execution d'une requete sql selon la politique de tentatives
         Ecrit la requete correspondante dans le fichier script défini
         Renvoie True si la requete a réussi ainsi que le nombre de lignes modifiées 
         ou renvoyées en fonction du type de requête
         '''
-        reussite = False
-        nb_lignes_modifiees = -1 
+        def executer():
+            nb_lignes_modifiees = self.pgconn.execute_commit(sql, parametres)
+            self._invalider_catalogue_si_ddl(sql, parametres)
+            self._tracer(self.pgconn, sql, parametres)
+            return nb_lignes_modifiees
+        reussite, nb_lignes_modifiees = self._avec_tentatives(executer, sql, parametres, max_tentative, politique, ecriture_script = True)
+        return reussite, nb_lignes_modifiees if reussite else -1
+    
+    def _tracer(self, pgconn, sql, parametres, ecriture_script = True):
+        '''
+        Ecrit la requête exécutée dans le fichier script (si ecriture_script) et dans le log (niveau DEBUG) ; 
+        le texte de la requête n'est produit que s'il est utilisé.
+        '''
+        ecriture_script = ecriture_script and self.script
+        if ecriture_script or logger.isEnabledFor(logging.DEBUG):
+            texte = pgconn.mogrifier(sql, parametres)
+            if ecriture_script:
+                self.journaliser(texte)
+            logger.debug('%s', texte)
+    
+    def _avec_tentatives(self, executer, sql, parametres, max_tentative, politique, ecriture_script):
+        '''
+        Appelle executer() jusqu'à réussite, erreur permanente ou épuisement des tentatives.
+        Après chaque échec, la transaction est annulée ; une erreur transitoire donne lieu, après un délai 
+        croissant, à une nouvelle tentative, précédée d'une reconnexion si la connexion a été perdue.
+        Renvoie (True, résultat) ou (False, None).
+        '''
+        politique = politique or self.politique_tentatives
+        max_tentative = politique.max_tentative if max_tentative is None else max_tentative
         tentative = 1
-        while(tentative <= max_tentative and not reussite):
+        while True:
             try:
-                nb_lignes_modifiees = self.pgconn.execute_commit(sql)
-                self.redaction_script(self.script, sql, False)
-                print(sql)                
-                reussite = True                
+                return True, executer()
             except Exception as e:
-                print(e)
-                print('Tentative ' + str(tentative) + ' échouée...')
-                if tentative == max_tentative:
-                    print('REQUETE EN ECHEC : ')
-                    print(sql)
-                    self.redaction_script(self.script, 'REQUETE EN ECHEC : ', False)
-                    self.redaction_script(self.script, sql, False)  
-                    #sys.exit('FIN PREMATUREE - TRAITEMENT NON ABOUTI')
+                logger.warning('Tentative %s échouée : %s', tentative, e)
+                pgconn = self.pgconn
+                pgconn.annuler()
+                if tentative >= max_tentative or not politique.est_transitoire(e):
+                    texte = pgconn.mogrifier(sql, parametres)
+                    logger.error('REQUETE EN ECHEC : %s', texte)
+                    if ecriture_script:
+                        self.journaliser('REQUETE EN ECHEC : ')
+                        self.journaliser(texte)
+                    return False, None
+                if politique.est_perte_de_connexion(e, pgconn.connection):
+                    pgconn.reconnecter()
+                politique.attendre(tentative)
                 tentative += 1
-        return reussite, nb_lignes_modifiees
+    
+    def vider_cache_catalogue(self, schema = None):
+        '''
+        Vide le cache des méthodes d'introspection (lister_*) de la connexion, 
+        ou seulement les entrées relatives au schéma s'il est spécifié.
+        '''
+        if schema is None:
+            self.cache_catalogue.vider()
+        else:
+            self.cache_catalogue.invalider([schema])
+    
+    def _invalider_catalogue_si_ddl(self, sql, parametres):
+        '''
+        Une requête libre (hors gabarit) modifiant la structure de la base vide le cache catalogue : 
+        les gabarits concernés invalident eux-mêmes leurs entrées (décorateur invalide_catalogue).
+        '''
+        if parametres is None and _REQUETE_DDL.search(sql):
+            self.cache_catalogue.vider()
     
     def redaction_script(self, file, sql, effacement):
         '''
@@ -254,10 +999,30 @@ class PgOutils():
         Efface le contenu du fichier si effacement est à True
         '''
         if file:
-            mode = 'w' if effacement else 'a'
             try:
-                with open(file, mode, encoding = 'utf-8') as f:
-                    f.write(sql)
+                journal = JournalScript.pour(file)
+                if effacement:
+                    journal.effacer(sql)
+                else:
+                    journal.ecrire(sql, immediat = True)
+            except (IOError, OSError) as e:
+                pass
+    
+    def journaliser(self, sql):
+        '''
+        Ajoute la requête sql au fichier script défini, l'écriture sur disque étant différée 
+        (voir JournalScript) : elle a lieu au plus tard à end_script() ou deconnecter().
+        '''
+        if self.script:
+            try:
+                JournalScript.pour(self.script).ecrire(sql)
+            except (IOError, OSError) as e:
+                pass
+    
+    def _vider_journal(self):
+        if self.script:
+            try:
+                JournalScript.pour(self.script).vider()
             except (IOError, OSError) as e:
                 pass
     
@@ -280,6 +1045,7 @@ class PgOutils():
         '''
         pass
     
+    @invalide_catalogue(0)
     @requete_sql    
     def effacer_schema(self, schema):
         '''
@@ -287,23 +1053,33 @@ class PgOutils():
         '''
         pass
     
-    def effacer_schemas(self, schemas):        
+    def effacer_schemas(self, schemas, detail = False):        
         '''
         Supprime les schemas de la base de données en CASCADE.             
+        
+        Les schémas sont supprimés par lots de TAILLE_LOT_DDL, chaque lot faisant l'objet d'une seule requête 
+        (DROP SCHEMA a, b, ... CASCADE) validée en une transaction ; un lot en échec est repris schéma par schéma.
+        Renvoie (reussite, nb) ou, si detail est à True, (reussite, nb, resultats), 
+        resultats étant le dictionnaire {schema: reussite}.
         '''        
-        for schema in schemas:
-            reussite, nb = self.effacer_schema(schema)
-            if not reussite:
-                return False, -1
-        return True, len(schemas)
+        return self._traiter_par_lots(schemas, self.effacer_lot_de_schemas, self.effacer_schema, detail)
     
-    def effacer_schemas_commencant_par(self, prefixe):
+    def effacer_schemas_commencant_par(self, prefixe, detail = False):
         '''
         Supprime les schemas commencant par le préfixe spécifié de la base de données en CASCADE.
         '''
         schemas = self.lister_schemas_commencant_par(prefixe)
-        return self.effacer_schemas(schemas)
+        return self.effacer_schemas(schemas, detail)
+    
+    @invalide_catalogue(0)
+    @requete_sql_avec_modification_args
+    def effacer_lot_de_schemas(self, schemas):
+        '''
+        Supprime les schémas listés en CASCADE par une requête unique
+        '''
+        return (', '.join(schemas),)
     
+    @invalide_catalogue(0)
     @requete_sql
     def creer_schema(self, schema):
         '''
@@ -311,6 +1087,7 @@ class PgOutils():
         '''
         pass
     
+    @invalide_catalogue(0)
     @requete_sql
     def creer_schema_si_inexistant(self, schema):
         '''
@@ -326,15 +1103,19 @@ class PgOutils():
         if reussite:
             return self.creer_schema(schema)
     
-    def effacer_et_creer_schemas(self, schemas):
+    def effacer_et_creer_schemas(self, schemas, detail = False):
         '''
-        Supprime et recrée les schémas.
+        Supprime et recrée les schémas, par lots de TAILLE_LOT_DDL traités en une requête et une transaction (voir effacer_schemas).
         '''
-        for schema in schemas:
-            reussite, nb = self.effacer_et_creer_schema(schema)
-            if not reussite:
-                return False, -1
-        return True, len(schemas)
+        return self._traiter_par_lots(schemas, self.effacer_et_creer_lot_de_schemas, self.effacer_et_creer_schema, detail)
+    
+    @invalide_catalogue(0)
+    @requete_sql_avec_modification_args
+    def effacer_et_creer_lot_de_schemas(self, schemas):
+        '''
+        Supprime puis recrée les schémas listés par une requête unique
+        '''
+        return ', '.join(schemas), '\n'.join('CREATE SCHEMA {0};'.format(schema) for schema in schemas)
     
     @requete_sql
     def effacer_et_creer_sequence(self, schema, sequence):
@@ -343,6 +1124,7 @@ class PgOutils():
         '''
         pass
     
+    @invalide_catalogue(0)
     @requete_sql
     def effacer_table(self, schema, table):
         '''
@@ -350,27 +1132,71 @@ class PgOutils():
         '''
         pass    
     
-    def effacer_tables(self, schema, tables):
+    @invalide_catalogue(0)
+    @requete_sql_avec_modification_args
+    def creer_table(self, schema, table, champs):
+        '''
+        Crée la table à partir de la liste des champs, au formalisme renvoyé par la méthode lister_champs()
+        '''
+        champs_format = ',\n'.join([c[1] + ' ' + c[2] for c in champs])
+        return schema, table, champs_format
+    
+    def effacer_tables(self, schema, tables, detail = False):
         '''
-        Supprime les tables listées du schéma.
+        Supprime les tables listées du schéma, par lots de TAILLE_LOT_DDL traités en une requête 
+        (DROP TABLE a, b, ... CASCADE) et une transaction (voir effacer_schemas).
         '''
-        for table in tables:
-            reussite, nb = self.effacer_table(schema, table)
-            if not reussite:
-                return False, -1
-        return True, len(tables)            
+        return self._traiter_par_lots(tables, 
+                                      lambda lot: self.effacer_lot_de_tables(schema, lot), 
+                                      lambda table: self.effacer_table(schema, table), 
+                                      detail)
     
-    def effacer_tables_commencant_par(self, schema, prefixe):
+    def effacer_tables_commencant_par(self, schema, prefixe, detail = False):
         '''
         Supprime les tables du schéma commençant par le prefixe specifié.
         '''
         tables = self.lister_tables_commencant_par(schema, prefixe)
-        return self.effacer_tables(schema, tables)
+        return self.effacer_tables(schema, tables, detail)
     
+    @invalide_catalogue(0)
+    @requete_sql_avec_modification_args
+    def effacer_lot_de_tables(self, schema, tables):
+        '''
+        Supprime les tables listées du schéma en CASCADE par une requête unique
+        '''
+        return schema, ', '.join(schema + '.' + table for table in tables)
+    
+    def _traiter_par_lots(self, objets, traitement_lot, traitement_unitaire, detail):
+        '''
+        Applique traitement_lot aux objets par lots de TAILLE_LOT_DDL ; 
+        les objets d'un lot en échec sont repris un à un par traitement_unitaire.
+        '''
+        objets = list(objets or [])
+        resultats = {}
+        for debut in range(0, len(objets), self.TAILLE_LOT_DDL):
+            lot = list(dict.fromkeys(objets[debut:debut + self.TAILLE_LOT_DDL]))
+            reussite, nb = traitement_lot(lot)
+            if reussite:
+                resultats.update(dict.fromkeys(lot, True))
+                continue
+            for objet in lot:
+                resultat = traitement_unitaire(objet)
+                resultats[objet] = bool(resultat and resultat[0])
+        return self._bilan_des_lots(objets, resultats, detail)
+    
+    def _bilan_des_lots(self, objets, resultats, detail):
+        reussite = all(resultats.values())
+        nb = len(objets) if reussite else -1
+        if detail:
+            return reussite, nb, resultats
+        return reussite, nb
+    
+    @invalide_catalogue(0)
     @requete_sql
     def renommer_table(self, schema, table, nveau_nom_table):
         pass
     
+    @catalogue(None)
     @select_sql_champ_unique
     def lister_schemas(self):
         '''
@@ -378,6 +1204,7 @@ class PgOutils():
         '''
         pass
     
+    @catalogue(None)
     @select_sql_champ_unique
     def lister_schemas_commencant_par(self, prefixe):
         '''
@@ -385,6 +1212,7 @@ class PgOutils():
         '''
         pass
     
+    @catalogue(None)
     @select_sql_champ_unique
     def lister_schemas_contenant(self, chaine):
         '''
@@ -392,6 +1220,7 @@ class PgOutils():
         '''
         pass
     
+    @catalogue(0)
     @select_sql_champ_unique
     def lister_tables(self, schema):
         '''
@@ -399,6 +1228,7 @@ class PgOutils():
         '''
         pass
     
+    @catalogue(0)
     @select_sql_champ_unique
     def lister_tables_commencant_par(self, schema, prefixe):
         '''
@@ -406,6 +1236,7 @@ class PgOutils():
         '''
         pass
     
+    @catalogue(0)
     @select_sql
     def lister_champs(self, schema, table):
         '''
@@ -413,6 +1244,15 @@ class PgOutils():
         '''
         pass
     
+    @catalogue(0)
+    @select_sql_champ_unique
+    def lister_champs_clef_primaire(self, schema, table):
+        '''
+        Renvoie, sous forme de liste, les noms des champs composant la clef primaire de la table
+        '''
+        pass
+    
+    @invalide_catalogue(0)
     @requete_sql_avec_modification_args
     def ajouter_clef_primaire(self, schema, table, champs):
         '''
@@ -440,7 +1280,7 @@ class PgOutils():
         Ajout un commentaire au champ de la table.
         Renvoie True si le commentaire a bien été créé.
         '''
-        return schema, table, champ, commentaire.replace('\'', '\'\'')
+        return schema, table, champ, commentaire
     
     @requete_sql_avec_modification_args
     def ajouter_commentaire_sur_table(self, schema, table, commentaire):
@@ -448,8 +1288,9 @@ class PgOutils():
         Ajout un commentaire à la table.
         Renvoie True si le commentaire a bien été créé.
         '''
-        return schema, table, commentaire.replace('\'', '\'\'')
+        return schema, table, commentaire
     
+    @invalide_catalogue(2)
     @requete_sql
     def copier_table(self, schema_initial, table_initiale, schema_final, table_finale):
         '''
@@ -459,6 +1300,7 @@ class PgOutils():
         '''
         pass
 
+    @invalide_catalogue(0, 2)
     @requete_sql
     def changer_schema(self, schema_initial, table, schema_final):
         '''
@@ -494,13 +1336,14 @@ class PgOutils():
         '''
         pass
     
-    @requete_sql
+    @requete_sql_avec_modification_args
     def creer_serveur_distant_fdw(self, hote_distant, base_distante, port, nom_serveur_distant):
         '''
         Crée un serveur distant pour le foreign data wrapper
         '''
-        pass
+        return hote_distant, base_distante, str(port), nom_serveur_distant
     
+    @invalide_catalogue()
     @requete_sql
     def effacer_serveur_distant_fdw(self, nom_serveur_distant):
         '''
@@ -533,10 +1376,12 @@ class PgOutils():
         valid5, nb = self.creer_user_mapping_pour_serveur_distant_fdw(utilisateur, nom_serveur_distant, motdepasse)
         return (True, 1,) if valid and valid2 and valid3 and valid4 and valid5 else (False, -1,)
     
+    @invalide_catalogue(0)
     @requete_sql
     def effacer_table_etrangere(self, schema, table):
         pass
     
+    @invalide_catalogue(0)
     @requete_sql_avec_modification_args
     def creer_table_etrangere(self, schema, table, schema_distant, table_distante, champs, nom_serveur):
         '''
@@ -553,18 +1398,131 @@ class PgOutils():
         '''
         nom_serveur_temporaire = 'serveur_tmp' + str(randint(1,100000))
         valid, nb = self.mettre_en_place_serveur_distant_fdw(hote_distant, base_distante, port, utilisateur, motdepasse, nom_serveur_temporaire)
-        pgoutils_distant = PgOutils(hote_distant, base_distante, port, utilisateur, motdepasse, self.script)
+        pool_distant = PgPool.partage(hote_distant, base_distante, port, utilisateur, motdepasse) if self.pool is not None else None
+        pgoutils_distant = PgOutils(hote_distant, base_distante, port, utilisateur, motdepasse, self.script, pool = pool_distant)
         champs = pgoutils_distant.lister_champs(schema_initial, table_initiale)
         valid2, nb = self.creer_table_etrangere(schema_final, table_finale + '_fdw', schema_initial, table_initiale, champs, nom_serveur_temporaire) 
         valid3, nb = self.copier_table(schema_final, table_finale + '_fdw', schema_final, table_finale)
         valid4, nb = self.effacer_table_etrangere(schema_final, table_finale + '_fdw')
         valid5, nb = self.effacer_user_mapping_pour_serveur_distant_fdw(utilisateur, nom_serveur_temporaire)
         valid6, nb = self.effacer_serveur_distant_fdw(nom_serveur_temporaire)
-        self.deconnecter() # permettre d'effacer la connexion postgres_fdw qui sinon restera en attente inutilement
+        self.deconnecter(fermer = True) # permettre d'effacer la connexion postgres_fdw qui sinon restera en attente inutilement
         self.connecter()  # reconnexion dans la foulée. 
         pgoutils_distant.deconnecter()
         return (True, 1,) if valid and valid2 and valid3 and valid4 and valid5 and valid6 else (False, -1,)
     
+    def copier_table_distante_via_copy(self, hote_distant, base_distante, port, utilisateur, motdepasse, schema_initial, table_initiale, schema_final, table_finale, format_copy = 'text'):
+        '''
+        Copie une table d'une base de données distante dans la base locale sans foreign data wrapper : 
+        la table est créée à partir des champs de la table distante (lister_champs) puis alimentée par 
+        COPY ... TO STDOUT sur la base distante relié à COPY ... FROM STDIN sur la base locale (voir PgConn.copier_vers).
+        
+        format_copy : 'text' ou 'binary' (plus rapide, les types des champs devant alors être identiques).
+        Renvoie True et le nombre de lignes copiées, False et -1 en cas d'échec.
+        '''
+        pool_distant = PgPool.partage(hote_distant, base_distante, port, utilisateur, motdepasse) if self.pool is not None else None
+        pgoutils_distant = PgOutils(hote_distant, base_distante, port, utilisateur, motdepasse, self.script, pool = pool_distant)
+        try:
+            champs = pgoutils_distant.lister_champs(schema_initial, table_initiale)
+            if not champs:
+                return False, -1
+            valid, nb = self.effacer_table(schema_final, table_finale)
+            valid2, nb = self.creer_table(schema_final, table_finale, champs)
+            if not (valid and valid2):
+                return False, -1
+            noms = ', '.join([c[1] for c in champs])
+            select = 'SELECT {0} FROM {1}.{2}'.format(noms, schema_initial, table_initiale)
+            table = '{0}.{1} ({2})'.format(schema_final, table_finale, noms)
+            try:
+                return True, pgoutils_distant.pgconn.copier_vers(self.pgconn, select, table, format_copy)
+            except Exception as e:
+                logger.error('Echec de la copie de %s.%s vers %s.%s : %s', schema_initial, table_initiale, schema_final, table_finale, e)
+                return False, -1
+        finally:
+            pgoutils_distant.deconnecter()
+    
+    @invalide_catalogue(2)
+    @requete_sql_avec_modification_args
+    def importer_schema_etranger(self, schema_distant, nom_serveur, schema, tables = None):
+        '''
+        Crée dans le schéma local une table étrangère pour chacune des tables du schéma distant 
+        (uniquement celles de la liste tables si elle est spécifiée)
+        '''
+        limite = 'LIMIT TO ({0})'.format(', '.join(tables)) if tables else ''
+        return schema_distant, nom_serveur, schema, limite
+    
+    @select_sql_champ_unique
+    def lister_tables_etrangeres(self, schema):
+        '''
+        Liste les tables étrangères du schéma
+        '''
+        pass
+    
+    def copier_schema_distant(self, hote_distant, base_distante, port, utilisateur, motdepasse, schema_initial, schema_final, tables = None, nb_connexions = 4):
+        '''
+        Copie les tables d'un schéma d'une base de données distante (uniquement celles de la liste tables si elle 
+        est spécifiée) dans le schéma local schema_final, créé s'il n'existe pas.
+        
+        Un seul serveur fdw est mis en place : les tables distantes sont importées en tables étrangères 
+        (IMPORT FOREIGN SCHEMA) dans un schéma temporaire, puis copiées simultanément sur nb_connexions 
+        connexions supplémentaires. Schéma temporaire, user mapping et serveur sont effacés en fin de copie.
+        
+        Renvoie un tuple (reussite, nb de tables copiées, {table: reussite}).
+        '''
+        if tables is not None and len(tables) == 0:
+            return True, 0, {}
+        suffixe = str(randint(1,100000))
+        nom_serveur_temporaire = 'serveur_tmp' + suffixe
+        schema_temporaire = 'fdw_tmp' + suffixe
+        resultats = {}
+        valid, nb = self.mettre_en_place_serveur_distant_fdw(hote_distant, base_distante, port, utilisateur, motdepasse, nom_serveur_temporaire)
+        try:
+            valid2, nb = self.creer_schema(schema_temporaire)
+            valid3, nb = self.creer_schema_si_inexistant(schema_final)
+            valid4, nb = self.importer_schema_etranger(schema_initial, nom_serveur_temporaire, schema_temporaire, tables)
+            valid = valid and valid2 and valid3 and valid4
+            if valid:
+                tables_etrangeres = self.lister_tables_etrangeres(schema_temporaire) or []
+                a_copier = deque(tables_etrangeres)
+                
+                def copier_tables():
+                    with self._outils_supplementaires() as pgoutils:
+                        while True:
+                            try:
+                                table = a_copier.popleft()
+                            except IndexError:
+                                return
+                            reussite, nb = pgoutils.copier_table(schema_temporaire, table, schema_final, table)
+                            resultats[table] = reussite
+                
+                fils = [threading.Thread(target = copier_tables) for i in range(max(1, min(nb_connexions, len(a_copier))))]
+                for f in fils:
+                    f.start()
+                for f in fils:
+                    f.join()
+                # une table non traitée (connexion supplémentaire impossible par exemple) est en échec
+                resultats = {table: resultats.get(table, False) for table in tables_etrangeres}
+        finally:
+            valid5, nb = self.effacer_schema(schema_temporaire)
+            valid6, nb = self.effacer_user_mapping_pour_serveur_distant_fdw(utilisateur, nom_serveur_temporaire)
+            valid7, nb = self.effacer_serveur_distant_fdw(nom_serveur_temporaire)
+            self.vider_cache_catalogue(schema_final)
+            self.deconnecter(fermer = True) # permettre d'effacer la connexion postgres_fdw qui sinon restera en attente inutilement
+            self.connecter()
+        reussite = valid and valid5 and valid6 and valid7 and all(resultats.values())
+        return reussite, sum(resultats.values()), resultats
+    
+    @contextmanager
+    def _outils_supplementaires(self):
+        '''
+        Fournit une copie de l'objet travaillant sur une connexion supplémentaire (voir connexion_supplementaire)
+        '''
+        with self.connexion_supplementaire() as pgconn:
+            pgoutils = copy.copy(self)
+            pgoutils.pool = None
+            pgoutils.pgconn = pgconn
+            yield pgoutils
+    
     @requete_sql
     def creer_fonction_array_supprimer_null(self):
         pass
@@ -593,6 +1551,13 @@ class PgConn():
     '''
     Classe permettant de se connecter à une base Postgresql, à y effectuer des requêtes et à y importer des fichiers csv
     '''
+    
+    SEUIL_PREPARATION = 3
+    MAX_REQUETES_PREPAREES = 100
+    
+    # Instrumentation des requêtes : None (aucune mesure) par défaut ; 
+    # à affecter à la classe pour toutes les connexions ou à une instance pour elle seule
+    instrumentation = None
 
     def __init__(self, hote=None, base=None, port=None, utilisateur=None, motdepasse=None, connection_directe = True):
         '''
@@ -607,6 +1572,11 @@ class PgConn():
         self.connection = None        
         
         self.conn_actif = False
+        self._requetes_preparees = OrderedDict()
+        self._requetes_a_liberer = []
+        self._nb_executions = {}
+        self._non_preparables = set()
+        self.cache_catalogue = CacheCatalogue()
         
         self.hote = hote
         self.base = base
@@ -628,8 +1598,11 @@ class PgConn():
             self.connection = psycopg2.connect(host=self.hote, dbname=self.base, user=self.utilisateur, password=self.motdepasse, port=self.port)
             self.connection.set_client_encoding(client_encoding)            
             self.conn_actif = True            
+            self._requetes_preparees.clear()
+            self._requetes_a_liberer.clear()
+            self._nb_executions.clear()
         except Exception as e:
-            print('Connexion impossible : ', str(e))
+            logger.error('Connexion impossible : %s', e)
             self.conn_actif = False
 
         
@@ -641,33 +1614,266 @@ class PgConn():
             self.connection.close()
             self.conn_actif = False
         except Exception as e:
-            print('Problème de déconnexion : ',  str(e))
+            logger.error('Problème de déconnexion : %s', e)
         
+    def annuler(self):
+        '''
+        Annule la transaction en cours, après une erreur. 
+        Si la connexion est perdue, elle est marquée inactive (elle sera rétablie à la prochaine requête).
+        '''
+        if self.connection is None or self.connection.closed:
+            self.conn_actif = False
+            return
+        try:
+            self.connection.rollback()
+        except Exception:
+            self.conn_actif = False
+    
+    def reconnecter(self):
+        '''
+        Ferme la connexion, si elle ne l'est pas déjà, et la rétablit
+        '''
+        if self.connection is not None and not self.connection.closed:
+            try:
+                self.connection.close()
+            except Exception:
+                pass
+        self.conn_actif = False
+        self.connection_postgres()
+    
 
-    def execute_commit(self, sql):
+    def execute_commit(self, sql, parametres = None):
         '''
         Execute la requete sql et la soumet au serveur, 
         Renvoie également le nombre de lignes modifiés en fonction du type de requete.
+        
+        Si parametres est spécifié (tuple, éventuellement vide), la requête est au format psycopg2 (%s) 
+        et les valeurs sont transmises comme paramètres ; une requête exécutée souvent est alors préparée côté serveur.
+        Une requête modifiant la structure de la base libère les requêtes préparées de la connexion 
+        (pour les modifications faites par d'autres connexions, voir _executer).
         '''
         nb_ligne_affectee = -1
         if not self.conn_actif:
             self.connection_postgres()
+        instrumentation = self.instrumentation
+        debut = time.perf_counter() if instrumentation is not None else None
         with self.connection.cursor() as curseur: 
-            curseur.execute(sql)
+            self._executer(curseur, sql, parametres)
             nb_ligne_affectee = curseur.rowcount            
+            if self._requetes_preparees and _REQUETE_DDL.search(sql):
+                self._liberer_requetes_preparees(curseur)
         self.connection.commit()
+        if instrumentation is not None:
+            instrumentation.enregistrer('execute_commit', debut, sql, nb_ligne_affectee)
         return nb_ligne_affectee
     
     
-    def execute_recupere(self, sql):
+    def execute_recupere(self, sql, parametres = None):
         '''
         Execute la requete sql (SELECT) et renvoie le resultat dans une liste de tuple
+        
+        parametres : voir execute_commit
+        '''
+        if not self.conn_actif:
+            self.connection_postgres()
+        instrumentation = self.instrumentation
+        debut = time.perf_counter() if instrumentation is not None else None
+        with self.connection.cursor() as curseur:
+            self._executer(curseur, sql, parametres)
+            resultat = curseur.fetchall()
+        if instrumentation is not None:
+            instrumentation.enregistrer('execute_recupere', debut, sql, len(resultat))
+        return resultat
+    
+    def execute_recupere_iterateur(self, sql, itersize = 2000, parametres = None):
+        '''
+        Execute la requete sql (SELECT) dans un curseur nommé (côté serveur) et renvoie un générateur sur les tuples du résultat.
+        Les lignes sont rapatriées du serveur par paquets de itersize lignes.
+        
+        La transaction est validée une fois le résultat entièrement parcouru, annulée si le parcours est interrompu.
+        La mesure (instrumentation) est enregistrée à la fin du parcours et couvre sa durée complète.
+        '''
+        if not self.conn_actif:
+            self.connection_postgres()
+        instrumentation = self.instrumentation
+        debut = time.perf_counter() if instrumentation is not None else None
+        operation = _operation_courante.get()
+        nb_lignes = 0
+        reussite = False
+        try:
+            with self.connection.cursor(name = 'curseur_' + uuid.uuid4().hex) as curseur:
+                curseur.itersize = itersize
+                curseur.execute(sql, parametres or None)
+                for ligne in curseur:
+                    nb_lignes += 1
+                    yield ligne
+            reussite = True
+        finally:
+            if reussite:
+                self.connection.commit()
+            elif not self.connection.closed:
+                self.connection.rollback()
+        if instrumentation is not None:
+            _enregistrer_operation(instrumentation, operation, 'execute_recupere_iterateur', debut, sql, nb_lignes)
+
+    def execute_recupere_colonnes(self, sql, parametres = None):
+        '''
+        Execute la requete sql (SELECT) via COPY ... TO STDOUT WITH (FORMAT binary) et renvoie le resultat
+        rangé par colonnes (ResultatColonnaire) : les valeurs des types de taille fixe (int2/4/8, float4/8, bool,
+        date, timestamp) sont décodées directement dans des array.array, les autres dans des listes.
+
+        parametres : voir execute_commit (les valeurs sont insérées dans le texte de la requête, COPY n'acceptant pas de paramètres)
+        '''
+        if not self.conn_actif:
+            self.connection_postgres()
+        instrumentation = self.instrumentation
+        debut = time.perf_counter() if instrumentation is not None else None
+        requete = sql.strip().rstrip(';')
+        try:
+            with self.connection.cursor() as curseur:
+                curseur.execute('SELECT * FROM ({0}) AS requete LIMIT 0'.format(requete), parametres or None)
+                decodeur = DecodeurCopyBinaire([champ.name for champ in curseur.description],
+                                               [champ.type_code for champ in curseur.description])
+                if parametres:
+                    requete = curseur.mogrify(requete, parametres).decode(psycopg2.extensions.encodings[self.connection.encoding])
+                sql_copy = 'COPY ({0}) TO STDOUT WITH (FORMAT binary)'.format(requete)
+                curseur.copy_expert(sql_copy, decodeur)
+            self.connection.commit()
+        except Exception:
+            if not self.connection.closed:
+                self.connection.rollback()
+            raise
+        resultat = decodeur.resultat()
+        if instrumentation is not None:
+            instrumentation.enregistrer('execute_recupere_colonnes', debut, sql_copy, len(resultat), decodeur.nb_octets)
+        return resultat
+
+    def exporter_instantane(self):
+        '''
+        Ouvre une transaction REPEATABLE READ et renvoie l'identifiant de son instantané (pg_export_snapshot), 
+        que d'autres connexions peuvent adopter (importer_instantane) tant que cette transaction reste ouverte.
         '''
         if not self.conn_actif:
             self.connection_postgres()
+        self.connection.rollback()
         with self.connection.cursor() as curseur:
-            curseur.execute(sql)        
-            return curseur.fetchall()
+            curseur.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ;')
+            curseur.execute('SELECT pg_export_snapshot();')
+            return curseur.fetchone()[0]
+    
+    def importer_instantane(self, instantane):
+        '''
+        Ouvre une transaction REPEATABLE READ sur l'instantané exporté par une autre connexion (exporter_instantane) : 
+        les requêtes suivantes, jusqu'à la validation de la transaction, voient exactement les mêmes données.
+        '''
+        if not self.conn_actif:
+            self.connection_postgres()
+        self.connection.rollback()
+        with self.connection.cursor() as curseur:
+            curseur.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ;')
+            curseur.execute('SET TRANSACTION SNAPSHOT %s;', (instantane,))
+    
+    def mogrifier(self, sql, parametres = None):
+        '''
+        Renvoie le texte de la requête avec les paramètres insérés (pour affichage et écriture des scripts)
+        '''
+        if not parametres:
+            return sql
+        try:
+            with self.connection.cursor() as curseur:
+                return curseur.mogrify(sql, parametres).decode(psycopg2.extensions.encodings[self.connection.encoding])
+        except Exception:
+            return sql + ' -- ' + repr(parametres)
+    
+    def _executer(self, curseur, sql, parametres):
+        '''
+        Exécute la requête, préparée le cas échéant (voir _preparer).
+        
+        Après une modification de structure faite par une autre connexion, l'exécution d'une requête préparée 
+        échoue (SQLSTATE 0A000, "cached plan must not change result type") : la requête préparée est alors libérée 
+        et, si aucune transaction n'était ouverte, la requête est exécutée une seconde fois sans préparation. 
+        Sinon l'erreur est levée, le travail de la transaction ne pouvant être rejoué ; l'appel suivant réussira.
+        '''
+        transaction_ouverte = self.connection.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE
+        requete, valeurs = self._preparer(curseur, sql, parametres)
+        try:
+            curseur.execute(requete, valeurs)
+        except psycopg2.Error as e:
+            if e.pgcode != '0A000' or requete == sql or sql not in self._requetes_preparees:
+                raise
+            nom = self._requetes_preparees.pop(sql)
+            if transaction_ouverte:
+                self._requetes_a_liberer.append(nom)
+                raise
+            if not self.connection.autocommit:
+                self.connection.rollback()
+            curseur.execute('DEALLOCATE {0};'.format(nom))
+            curseur.execute(sql, parametres or None)
+    
+    def _preparer(self, curseur, sql, parametres):
+        '''
+        Renvoie les arguments de curseur.execute() pour la requête.
+        
+        A partir de SEUIL_PREPARATION exécutions d'une même requête issue d'un gabarit (parametres non None), 
+        celle-ci est préparée (PREPARE) sur la connexion et exécutée ensuite par EXECUTE. 
+        Au plus MAX_REQUETES_PREPAREES requêtes restent préparées, les moins récemment utilisées sont libérées ; 
+        toutes le sont après une modification de structure (voir execute_commit).
+        '''
+        if parametres is None:
+            return sql, None
+        while self._requetes_a_liberer:
+            curseur.execute('DEALLOCATE {0};'.format(self._requetes_a_liberer.pop()))
+        nom = self._requetes_preparees.get(sql)
+        if nom is None:
+            nb_executions = self._nb_executions.get(sql, 0) + 1
+            if nb_executions < self.SEUIL_PREPARATION or sql in self._non_preparables or not _est_preparable(sql):
+                if len(self._nb_executions) >= 10 * self.MAX_REQUETES_PREPAREES:
+                    self._nb_executions.clear()
+                self._nb_executions[sql] = nb_executions
+                return sql, parametres or None
+            nom = self._creer_requete_preparee(curseur, sql, parametres)
+            if nom is None:
+                return sql, parametres or None
+        else:
+            self._requetes_preparees.move_to_end(sql)
+        if parametres:
+            return 'EXECUTE {0} ({1});'.format(nom, ', '.join(['%s'] * len(parametres))), parametres
+        return 'EXECUTE {0};'.format(nom), None
+    
+    def _creer_requete_preparee(self, curseur, sql, parametres):
+        nom = 'requete_' + uuid.uuid4().hex[:16]
+        texte = sql.strip().rstrip(';')
+        if parametres:
+            compteur = iter(range(1, len(parametres) + 1))
+            texte = re.sub('%%|%s', lambda m: '%' if m.group(0) == '%%' else '$' + str(next(compteur)), texte)
+        self._nb_executions.pop(sql, None)
+        point_de_sauvegarde = not self.connection.autocommit
+        try:
+            if point_de_sauvegarde:
+                curseur.execute('SAVEPOINT avant_preparation;')
+            curseur.execute('PREPARE {0} AS {1};'.format(nom, texte))
+            if point_de_sauvegarde:
+                curseur.execute('RELEASE SAVEPOINT avant_preparation;')
+        except psycopg2.Error:
+            if point_de_sauvegarde:
+                curseur.execute('ROLLBACK TO SAVEPOINT avant_preparation;')
+            self._non_preparables.add(sql)
+            return None
+        self._requetes_preparees[sql] = nom
+        if len(self._requetes_preparees) > self.MAX_REQUETES_PREPAREES:
+            sql_ancienne, nom_ancien = self._requetes_preparees.popitem(last = False)
+            curseur.execute('DEALLOCATE {0};'.format(nom_ancien))
+        return nom
+    
+    def _liberer_requetes_preparees(self, curseur):
+        '''
+        Libère les requêtes préparées : après une modification de structure, l'exécution d'une requête préparée 
+        portant sur une table modifiée (ex: SELECT *) échouerait ("cached plan must not change result type").
+        Les modifications faites par d'autres connexions ne sont pas détectées.
+        '''
+        curseur.execute('DEALLOCATE ALL;')
+        self._requetes_preparees.clear()
+        self._requetes_a_liberer.clear()
     
     def execute_many(self, sql, donnees):
         '''
@@ -677,48 +1883,519 @@ class PgConn():
         nb_ligne_affectee = -1
         if not self.conn_actif:
             self.connection_postgres()
+        instrumentation = self.instrumentation
+        debut = time.perf_counter() if instrumentation is not None else None
         with self.connection.cursor() as curseur: 
             curseur.executemany(sql, donnees)
             nb_ligne_affectee = curseur.rowcount            
         self.connection.commit()
+        if instrumentation is not None:
+            instrumentation.enregistrer('execute_many', debut, sql, nb_ligne_affectee)
         return nb_ligne_affectee
 
     def copy_from_csv(self, fichier_csv, separateur, table, entete):
         """
             Copie le fichier csv encodé en UTF-8 dans la table définie de la PostgreSQL.
             
+            fichier_csv peut être un chemin, un fichier ouvert en mode texte ou un itérable de lignes : 
+            son contenu est transmis au fil de l'eau à COPY ... FROM STDIN, sans fichier intermédiaire.
+            
             Si entete est à True, la première ligne sera ignorée.
             
         """ 
-        lignes = self._lire_lignes_csv(fichier_csv)
-        self._ecrire_lignes_dans_csv(lignes, 'tmp', entete)
+        sql_copy = """COPY {0} FROM STDIN WITH (FORMAT text, DELIMITER '{1}', NULL '')""".format(table, separateur.replace("'", "''"))
         
         if not self.conn_actif:
             self.connection_postgres()
         
-        with open('tmp','r',encoding = 'utf-8') as donnees:
-            with self.connection.cursor() as curseur:
-                curseur.copy_from(donnees, table, separateur, '')            
-            self.connection.commit()
+        if isinstance(fichier_csv, str):
+            with open(fichier_csv, 'r', encoding = 'utf-8') as donnees:
+                return self._copy_from(sql_copy, donnees, entete, os.path.getsize(fichier_csv))
+        if not hasattr(fichier_csv, 'read'):
+            fichier_csv = _SourceCopy(fichier_csv)
+        return self._copy_from(sql_copy, fichier_csv, entete)
+    
+    def _copy_from(self, sql_copy, donnees, entete, octets = 0):
+        instrumentation = self.instrumentation
+        debut = time.perf_counter() if instrumentation is not None else None
+        if entete:
+            donnees.readline()
+        with self.connection.cursor() as curseur:
+            curseur.copy_expert(sql_copy, donnees)
+            nb_lignes = curseur.rowcount
+        self.connection.commit()
+        if instrumentation is not None:
+            instrumentation.enregistrer('copy_from_csv', debut, sql_copy, nb_lignes, octets)
+        return True
+    
+    def copy_from_lignes(self, lignes, table):
+        '''
+        Copie les tuples de l'itérable lignes dans la table via COPY ... FROM STDIN (format texte). 
+        Les lignes sont converties et transmises au fil de l'eau, sans être chargées en mémoire.
+        Renvoie le nombre de lignes copiées.
+        '''
+        if not self.conn_actif:
+            self.connection_postgres()
+        instrumentation = self.instrumentation
+        debut = time.perf_counter() if instrumentation is not None else None
+        compteur = [0]
+        def lignes_format_copy():
+            for ligne in lignes:
+                compteur[0] += 1
+                yield '\t'.join([_valeur_format_copy(valeur) for valeur in ligne]) + '\n'
+        sql_copy = 'COPY {0} FROM STDIN'.format(table)
+        with self.connection.cursor() as curseur:
+            curseur.copy_expert(sql_copy, _SourceCopy(lignes_format_copy()))
+        self.connection.commit()
+        if instrumentation is not None:
+            instrumentation.enregistrer('copy_from_lignes', debut, sql_copy, compteur[0])
+        return compteur[0]
+    
+    def execute_values(self, sql, lignes, taille_lot = 1000):
+        '''
+        Execute la requete sql (ex: INSERT INTO table VALUES %s) en regroupant les tuples de l'itérable lignes 
+        par paquets de taille_lot dans des VALUES multi-lignes, puis la soumet au serveur.
+        Renvoie le nombre de lignes modifiées.
+        '''
+        nb_ligne_affectee = 0
+        if not self.conn_actif:
+            self.connection_postgres()
+        instrumentation = self.instrumentation
+        debut = time.perf_counter() if instrumentation is not None else None
+        lignes = iter(lignes)
+        with self.connection.cursor() as curseur:
+            lot = list(islice(lignes, taille_lot))
+            while lot:
+                psycopg2.extras.execute_values(curseur, sql, lot, page_size = taille_lot)
+                nb_ligne_affectee += len(lot)
+                lot = list(islice(lignes, taille_lot))
+        self.connection.commit()
+        if instrumentation is not None:
+            instrumentation.enregistrer('execute_values', debut, sql, nb_ligne_affectee)
+        return nb_ligne_affectee
+    
+    def copy_to_csv(self, sql, fichier_csv, separateur, entete = True, fin_de_ligne = '\n'):
+        '''
+        Exporte le résultat de la requête sql (SELECT) dans le fichier csv défini (chemin ou fichier ouvert en binaire) 
+        via COPY ... TO STDOUT : la mise en forme csv est réalisée par le serveur et écrite directement dans le fichier.
         
-        if os.path.exists('tmp'):
-            os.remove('tmp')
+        Si entete est à True, la première ligne contient le nom des champs.
+        fin_de_ligne permet de remplacer les fins de ligne émises par PostgreSQL ('\n') par une autre séquence (ex: '\r\n').
+        Renvoie le nombre d'octets écrits.
+        '''
+        sql_copy = '''COPY ({0}) TO STDOUT WITH (FORMAT csv{1}, DELIMITER '{2}')'''.format(sql.strip().rstrip(';'), 
+                                                                                           ', HEADER' if entete else '', 
+                                                                                           separateur.replace("'", "''"))
+        if not self.conn_actif:
+            self.connection_postgres()
         
-        return True                  
+        if isinstance(fichier_csv, str):
+            with open(fichier_csv, 'wb') as f:
+                return self._copy_to_csv(sql_copy, _SortieCopyCsv(f, fin_de_ligne))
+        return self._copy_to_csv(sql_copy, _SortieCopyCsv(fichier_csv, fin_de_ligne))
+    
+    def _copy_to_csv(self, sql_copy, sortie):
+        instrumentation = self.instrumentation
+        debut = time.perf_counter() if instrumentation is not None else None
+        with self.connection.cursor() as curseur:
+            curseur.copy_expert(sql_copy, sortie)
+            nb_lignes = curseur.rowcount
+        self.connection.commit()
+        if instrumentation is not None:
+            instrumentation.enregistrer('copy_to_csv', debut, sql_copy, nb_lignes, sortie.nb_octets)
+        return sortie.nb_octets
 
 
+    def copier_vers(self, destination, sql, table, format_copy = 'text', taille_bloc = 65536, nb_blocs = 64):
+        '''
+        Copie le résultat de la requête sql (SELECT) de la connexion dans la table de la connexion destination (PgConn) : 
+        COPY ... TO STDOUT, exécuté dans un thread, alimente COPY ... FROM STDIN au travers d'un tube en mémoire 
+        (TubeCopy) d'au plus nb_blocs blocs de taille_bloc octets, sans fichier intermédiaire ni conversion en tuples Python.
+        
+        table peut comporter la liste des champs à alimenter (ex: 'schema.table (champ1, champ2)').
+        format_copy : 'text' ou 'binary' (plus rapide, les types des champs devant alors être identiques).
+        Renvoie le nombre de lignes copiées ; une exception est levée en cas d'échec de la lecture ou de l'écriture.
+        '''
+        if format_copy not in ('text', 'binary'):
+            raise Exception("Format de copie inconnu : {0} (text ou binary).".format(format_copy))
+        for pgconn in (self, destination):
+            if not pgconn.conn_actif:
+                pgconn.connection_postgres()
+        sql_lecture = 'COPY ({0}) TO STDOUT WITH (FORMAT {1})'.format(sql.strip().rstrip(';'), format_copy)
+        sql_ecriture = 'COPY {0} FROM STDIN WITH (FORMAT {1})'.format(table, format_copy)
+        instrumentation = self.instrumentation
+        debut = time.perf_counter() if instrumentation is not None else None
+        tube = TubeCopy(taille_bloc, nb_blocs)
+        
+        def lire():
+            try:
+                with self.connection.cursor() as curseur:
+                    curseur.copy_expert(sql_lecture, tube)
+                self.connection.commit()
+                tube.fermer()
+            except Exception as e:
+                if not self.connection.closed:
+                    self.connection.rollback()
+                tube.fermer(e)
+        
+        lecteur = threading.Thread(target = lire, daemon = True)
+        lecteur.start()
+        try:
+            with destination.connection.cursor() as curseur:
+                curseur.copy_expert(sql_ecriture, tube, size = taille_bloc)
+                nb_lignes = curseur.rowcount
+            destination.connection.commit()
+        except Exception:
+            tube.abandonner()
+            if not destination.connection.closed:
+                destination.connection.rollback()
+            if tube.erreur is not None:
+                raise tube.erreur
+            raise
+        finally:
+            lecteur.join()
+        if instrumentation is not None:
+            instrumentation.enregistrer('copier_vers', debut, sql_ecriture, nb_lignes, tube.nb_octets)
+        return nb_lignes
+
     def _lire_lignes_csv(self, fichier_csv):
         """ Générateur qui renvoie les lignes d'un fichier csv encodé en UTF-8"""
         with open(fichier_csv, 'r', encoding = 'utf-8') as f:
             for ligne in f:
                 yield ligne
                 
-    def _ecrire_lignes_dans_csv(self, lignes, fichier_sortie, entete):
-        ''' Ecriture en UTF-8 dans le fichier de sortie des lignes en omettant l'entete si sa valeur est à True'''
-        with open(fichier_sortie, 'wt', encoding = 'utf-8') as f:
-            if entete:
-                next(lignes)
-            for ligne in lignes:
-                print(ligne, end='', file=f)
+
+class PgPool():
+    '''
+    Pool de connexions PostgreSQL (PgConn) utilisable depuis plusieurs threads.
+    
+    Les connexions sont empruntées par emprunter() et rendues par rendre(). Au plus max_connexions 
+    connexions sont ouvertes simultanément ; au-delà, emprunter() attend qu'une connexion soit rendue 
+    (delai_attente secondes au plus, 30 par défaut, puis lève une exception ; indéfiniment si delai_attente est None).
+    Avant d'être réutilisée, une connexion est vérifiée : fermée, elle est remplacée ; restée inactive 
+    plus de delai_verification secondes, elle est testée par un SELECT 1.
+    Rendre une connexion qui n'est pas empruntée (rendue deux fois, ou issue d'un autre pool) lève une exception.
+    '''
+    
+    _POOLS = {}
+    _VERROU_POOLS = threading.Lock()
+    
+    def __init__(self, hote=None, base=None, port=None, utilisateur=None, motdepasse=None, 
+                 min_connexions = 1, max_connexions = 10, delai_attente = 30, delai_verification = 30):
+        self.hote = hote
+        self.base = base
+        self.port = port
+        self.utilisateur = utilisateur
+        self.motdepasse = motdepasse
+        self.min_connexions = min_connexions
+        self.max_connexions = max(max_connexions, 1)
+        self.delai_attente = delai_attente
+        self.delai_verification = delai_verification
+        
+        self._libres = deque()
+        self._empruntees = set()
+        self._nb_connexions = 0
+        self._ferme = False
+        self._condition = threading.Condition()
+        for i in range(min(min_connexions, self.max_connexions)):
+            self._reserver_place(None)
+            self._libres.append(self._creer_connexion())
+    
+    @classmethod
+    def partage(cls, hote=None, base=None, port=None, utilisateur=None, motdepasse=None, **options):
+        '''
+        Renvoie le pool commun au processus pour ces paramètres de connexion (créé au premier appel).
+        '''
+        clef = (hote, base, port, utilisateur, motdepasse)
+        with cls._VERROU_POOLS:
+            pool = cls._POOLS.get(clef)
+            if pool is None or pool._ferme:
+                pool = cls(hote, base, port, utilisateur, motdepasse, **options)
+                cls._POOLS[clef] = pool
+            return pool
+    
+    @contextmanager
+    def connexion(self):
+        '''
+        Gestionnaire de contexte empruntant une connexion et la rendant en sortie.
+        '''
+        pgconn = self.emprunter()
+        try:
+            yield pgconn
+        finally:
+            self.rendre(pgconn)
+    
+    def emprunter(self, delai_attente = None):
+        '''
+        Renvoie une connexion (PgConn) valide du pool, ouverte si nécessaire.
+        delai_attente (par défaut celui du pool) borne l'attente d'une connexion rendue.
+        '''
+        delai_attente = self.delai_attente if delai_attente is None else delai_attente
+        limite = None if delai_attente is None else time.monotonic() + delai_attente
+        while True:
+            pgconn = self._reserver_place(limite)
+            if pgconn is None:
+                pgconn = self._creer_connexion()
+            elif not self._est_valide(pgconn):
+                self._jeter(pgconn)
+                continue
+            with self._condition:
+                self._empruntees.add(pgconn)
+            return pgconn
+    
+    def rendre(self, pgconn, fermer = False):
+        '''
+        Rend la connexion au pool. La transaction en cours éventuelle est annulée.
+        Si fermer est à True (ou si le pool est fermé), la connexion est fermée au lieu d'être conservée.
+        '''
+        with self._condition:
+            if pgconn not in self._empruntees:
+                raise Exception("La connexion rendue n'est pas empruntée au pool.")
+            self._empruntees.remove(pgconn)
+        if fermer or self._ferme or not self._remettre_a_zero(pgconn):
+            self._jeter(pgconn)
+            return
+        pgconn.date_retour_pool = time.monotonic()
+        with self._condition:
+            self._libres.append(pgconn)
+            self._condition.notify()
+    
+    def fermer(self):
+        '''
+        Ferme les connexions disponibles du pool. Les connexions encore empruntées seront fermées à leur retour.
+        '''
+        with self._condition:
+            self._ferme = True
+            libres, self._libres = list(self._libres), deque()
+            self._nb_connexions -= len(libres)
+            self._condition.notify_all()
+        for pgconn in libres:
+            pgconn.deconnection_postgres()
+    
+    def _reserver_place(self, limite):
+        '''
+        Renvoie une connexion disponible, ou None après avoir réservé la place d'une nouvelle connexion.
+        '''
+        with self._condition:
+            while True:
+                if self._ferme:
+                    raise Exception('Le pool de connexions est fermé.')
+                if self._libres:
+                    return self._libres.pop()
+                if self._nb_connexions < self.max_connexions:
+                    self._nb_connexions += 1
+                    return None
+                attente = None if limite is None else limite - time.monotonic()
+                if attente is not None and attente <= 0:
+                    raise Exception('Aucune connexion disponible dans le pool.')
+                self._condition.wait(attente)
+    
+    def _creer_connexion(self):
+        pgconn = PgConn(self.hote, self.base, self.port, self.utilisateur, self.motdepasse)
+        if not pgconn.conn_actif:
+            self._liberer_place()
+            raise Exception('Connexion impossible pour le pool.')
+        pgconn.date_retour_pool = time.monotonic()
+        return pgconn
+    
+    def _jeter(self, pgconn):
+        if pgconn.connection is not None and not pgconn.connection.closed:
+            pgconn.deconnection_postgres()
+        self._liberer_place()
+    
+    def _liberer_place(self):
+        with self._condition:
+            self._nb_connexions -= 1
+            self._condition.notify()
+    
+    def _remettre_a_zero(self, pgconn):
+        '''
+        Annule la transaction éventuellement ouverte. Renvoie False si la connexion est inutilisable.
+        '''
+        if not pgconn.conn_actif or pgconn.connection is None or pgconn.connection.closed:
+            return False
+        try:
+            if pgconn.connection.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                pgconn.connection.rollback()
+            return True
+        except Exception:
+            return False
+    
+    def _est_valide(self, pgconn):
+        if not self._remettre_a_zero(pgconn):
+            return False
+        if self.delai_verification is None or time.monotonic() - pgconn.date_retour_pool < self.delai_verification:
+            return True
+        try:
+            pgconn.execute_recupere('SELECT 1;')
+            pgconn.connection.rollback()
+            return True
+        except Exception:
+            return False
+
+
+# ordre de modification de structure en début d'instruction (éventuellement précédé de commentaires)
+_REQUETE_DDL = re.compile(r'(?:^|;)(?:\s|--[^\n]*\n)*(CREATE|DROP|ALTER|COMMENT|IMPORT|TRUNCATE)\b', re.IGNORECASE)
+
+_REQUETE_PREPARABLE = re.compile(r'^\s*(SELECT|INSERT|UPDATE|DELETE|VALUES|WITH)\b', re.IGNORECASE)
+
+def _est_preparable(sql):
+    '''
+    Seules les requêtes uniques de type SELECT, INSERT, UPDATE, DELETE ou VALUES peuvent être préparées
+    '''
+    return bool(_REQUETE_PREPARABLE.match(sql)) and ';' not in sql.strip().rstrip(';')
+
+
+def _valeur_format_copy(valeur):
+    '''
+    Représentation d'une valeur Python dans le format texte de COPY
+    '''
+    if valeur is None:
+        return '\\N'
+    if isinstance(valeur, (bytes, bytearray, memoryview)):
+        return '\\\\x' + bytes(valeur).hex()
+    return str(valeur).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+
+class _SourceCopy():
+    '''
+    Adapte un itérable de lignes (chaînes terminées par une fin de ligne) en fichier lisible par COPY ... FROM STDIN.
+    '''
+    
+    def __init__(self, lignes):
+        self.lignes = iter(lignes)
+        self.reste = ''
+    
+    def readline(self, taille = -1):
+        if not self.reste:
+            return next(self.lignes, '')
+        ligne, fin, self.reste = self.reste.partition('\n')
+        return ligne + fin if fin else ligne + next(self.lignes, '')
+    
+    def read(self, taille = -1):
+        morceaux = [self.reste]
+        longueur = len(self.reste)
+        while taille < 0 or longueur < taille:
+            ligne = next(self.lignes, None)
+            if ligne is None:
+                break
+            morceaux.append(ligne)
+            longueur += len(ligne)
+        donnees = ''.join(morceaux)
+        if taille < 0:
+            self.reste = ''
+            return donnees
+        self.reste = donnees[taille:]
+        return donnees[:taille]
+
+
+class TubeCopy():
+    '''
+    Tube en mémoire reliant COPY ... TO STDOUT (write, sur la connexion source) à COPY ... FROM STDIN 
+    (read, sur la connexion de destination), l'un et l'autre s'exécutant dans des threads distincts.
+    
+    Les données sont regroupées en blocs d'environ taille_bloc octets ; au plus nb_blocs blocs sont en attente, 
+    la source attendant au-delà que la destination ait lu : la mémoire utilisée reste bornée.
+    '''
+    
+    def __init__(self, taille_bloc = 65536, nb_blocs = 64):
+        self.taille_bloc = taille_bloc
+        self.nb_octets = 0
+        self.erreur = None
+        self._file = queue.Queue(maxsize = nb_blocs)
+        self._tampon = bytearray()
+        self._reste = b''
+        self._fin = False
+        self._arret = threading.Event()
+    
+    def write(self, donnees):
+        if isinstance(donnees, str):
+            donnees = donnees.encode('utf-8')
+        self._tampon += donnees
+        self.nb_octets += len(donnees)
+        if len(self._tampon) >= self.taille_bloc:
+            self._deposer(bytes(self._tampon))
+            self._tampon = bytearray()
+    
+    def fermer(self, erreur = None):
+        '''
+        Fin des données côté source ; erreur est l'exception éventuelle de la source, levée côté destination.
+        '''
+        self.erreur = erreur
+        try:
+            if self._tampon and erreur is None:
+                self._deposer(bytes(self._tampon))
+            self._tampon = bytearray()
+            self._deposer(None)
+        except Exception:
+            pass
+    
+    def abandonner(self):
+        '''
+        Arrêt côté destination : la source est débloquée et interrompue à sa prochaine écriture.
+        '''
+        self._arret.set()
+    
+    def _deposer(self, bloc):
+        while not self._arret.is_set():
+            try:
+                self._file.put(bloc, timeout = 0.5)
+                return
+            except queue.Full:
+                pass
+        raise Exception('Copie interrompue par la destination.')
+    
+    def read(self, taille = -1):
+        while not self._reste:
+            if self._fin:
+                return b''
+            bloc = self._file.get()
+            if bloc is None:
+                self._fin = True
+                if self.erreur is not None:
+                    raise self.erreur
+                return b''
+            self._reste = bloc
+        if taille < 0 or taille >= len(self._reste):
+            donnees, self._reste = self._reste, b''
+        else:
+            donnees, self._reste = self._reste[:taille], self._reste[taille:]
+        return donnees
+
+
+class _SortieCopyCsv():
+    '''
+    Fichier de sortie binaire alimenté par COPY ... TO STDOUT (FORMAT csv).
+    Les fins d'enregistrement émises par PostgreSQL ('\n') sont remplacées par fin_de_ligne, 
+    les retours à la ligne contenus dans une valeur entre guillemets sont conservés tels quels.
+    '''
+    
+    def __init__(self, fichier, fin_de_ligne = '\n'):
+        self.fichier = fichier
+        self.fin_de_ligne = fin_de_ligne.encode('utf-8')
+        self.entre_guillemets = False
+        self.nb_octets = 0
+    
+    def write(self, donnees):
+        if isinstance(donnees, str):
+            donnees = donnees.encode('utf-8')
+        if self.fin_de_ligne != b'\n':
+            donnees = self._remplacer_fins_de_ligne(donnees)
+        self.nb_octets += len(donnees)
+        return self.fichier.write(donnees)
+    
+    def _remplacer_fins_de_ligne(self, donnees):
+        '''
+        Un guillemet double échappé ("") bascule deux fois l'état : seul le nombre de guillemets importe.
+        '''
+        if not self.entre_guillemets and b'"' not in donnees:
+            return donnees.replace(b'\n', self.fin_de_ligne)
+        morceaux = donnees.split(b'"')
+        for i, morceau in enumerate(morceaux):
+            if not self.entre_guillemets:
+                morceaux[i] = morceau.replace(b'\n', self.fin_de_ligne)
+            if i < len(morceaux) - 1:
+                self.entre_guillemets = not self.entre_guillemets
+        return b'"'.join(morceaux)
 
 #eof
\ No newline at end of file
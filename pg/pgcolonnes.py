@@ -0,0 +1,310 @@
+'''
+@author: antoine.herman
+
+Décodage du format binaire de COPY (COPY ... TO STDOUT WITH (FORMAT binary)) en colonnes :
+les valeurs des types de taille fixe sont rangées dans des array.array, sans créer d'objet Python par valeur.
+'''
+
+import struct
+import uuid
+from array import array
+from datetime import date, datetime, time, timedelta, timezone
+from decimal import Decimal
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+SIGNATURE_COPY_BINAIRE = b'PGCOPY\n\xff\r\n\x00'
+
+# OID des types de taille fixe : (code array.array, taille en octets, code struct)
+TYPES_FIXES = {16: ('b', 1, 'b'),      # bool
+               21: ('h', 2, 'h'),      # int2
+               23: ('i', 4, 'i'),      # int4
+               20: ('q', 8, 'q'),      # int8
+               700: ('f', 4, 'f'),     # float4
+               701: ('d', 8, 'd'),     # float8
+               1082: ('i', 4, 'i'),    # date (jours depuis le 01/01/2000)
+               1114: ('q', 8, 'q'),    # timestamp (microsecondes depuis le 01/01/2000)
+               1184: ('q', 8, 'q')}    # timestamptz (idem, en UTC)
+
+OID_TEXTES = {18, 19, 25, 1042, 1043, 114, 3802}    # char, name, text, bpchar, varchar, json, jsonb (précédé d'une version)
+OID_BYTEA = 17
+OID_NUMERIC = 1700
+OID_UUID = 2950
+OID_TIME = 1083
+OID_DATE = 1082
+OID_TIMESTAMP = 1114
+OID_TIMESTAMPTZ = 1184
+OID_BOOL = 16
+
+ORIGINE_PG = datetime(2000, 1, 1)
+ORIGINE_PG_DATE = date(2000, 1, 1)
+DECALAGE_JOURS_UNIX = 10957                 # jours entre le 01/01/1970 et le 01/01/2000
+DECALAGE_MICROSECONDES_UNIX = 946684800000000
+
+_ENTETE_CHAMP = struct.Struct('>i')
+_NB_CHAMPS = struct.Struct('>h')
+
+
+class DecodeurCopyBinaire():
+    '''
+    Fichier de sortie alimenté par COPY ... TO STDOUT WITH (FORMAT binary) (méthode write),
+    décodant le flux au fil de l'eau en colonnes.
+
+    noms et oids sont les noms et OID des types des champs (cursor.description). Les valeurs des types
+    de taille fixe (TYPES_FIXES) sont rangées dans des array.array, une valeur nulle y étant représentée
+    par 0 et signalée dans le masque des nuls de la colonne ; les autres types sont décodés dans des listes.
+    resultat() renvoie les colonnes (ResultatColonnaire) une fois le flux entièrement lu.
+    '''
+
+    def __init__(self, noms, oids):
+        self.noms = list(noms)
+        self.oids = list(oids)
+        self.colonnes = [array(TYPES_FIXES[oid][0]) if oid in TYPES_FIXES else [] for oid in self.oids]
+        self.nuls = [None] * len(self.oids)
+        self.nb_lignes = 0
+        self.nb_octets = 0
+        self._tampon = bytearray()
+        self._entete_lu = False
+        self._termine = False
+        self._decodeurs = [_decodeur_variable(oid) for oid in self.oids]
+        # ligne sans valeur nulle composée uniquement de champs de taille fixe : décodée d'un seul bloc
+        if all(oid in TYPES_FIXES for oid in self.oids):
+            self._ligne_fixe = struct.Struct('>h' + ''.join('i' + TYPES_FIXES[oid][2] for oid in self.oids))
+            self._tailles = tuple(TYPES_FIXES[oid][1] for oid in self.oids)
+        else:
+            self._ligne_fixe = None
+
+    def write(self, donnees):
+        self.nb_octets += len(donnees)
+        self._tampon += donnees
+        position = self._decoder(memoryview(self._tampon))
+        del self._tampon[:position]
+
+    def resultat(self):
+        if not self._termine:
+            raise Exception('Flux COPY binaire incomplet.')
+        return ResultatColonnaire(self.noms, self.oids, self.colonnes, self.nuls, self.nb_lignes)
+
+    def _decoder(self, tampon):
+        '''
+        Décode les lignes complètes du tampon et renvoie la position du début de la première ligne incomplète
+        '''
+        position = 0
+        if not self._entete_lu:
+            if len(tampon) < 19:
+                return 0
+            if bytes(tampon[:11]) != SIGNATURE_COPY_BINAIRE:
+                raise Exception('Signature COPY binaire invalide.')
+            taille_extension = _ENTETE_CHAMP.unpack_from(tampon, 15)[0]
+            if len(tampon) < 19 + taille_extension:
+                return 0
+            position = 19 + taille_extension
+            self._entete_lu = True
+        nb_champs = len(self.oids)
+        lot = []
+        while not self._termine and position + 2 <= len(tampon):
+            if self._ligne_fixe is not None and position + self._ligne_fixe.size <= len(tampon):
+                valeurs = self._ligne_fixe.unpack_from(tampon, position)
+                if valeurs[0] == nb_champs and valeurs[1::2] == self._tailles:
+                    lot.append(valeurs[2::2])
+                    position += self._ligne_fixe.size
+                    continue
+            self._ajouter_lot(lot)
+            lot = []
+            fin = self._decoder_ligne(tampon, position)
+            if fin is None:
+                break
+            position = fin
+        self._ajouter_lot(lot)
+        return position
+
+    def _ajouter_lot(self, lot):
+        if not lot:
+            return
+        for colonne, masque, valeurs in zip(self.colonnes, self.nuls, zip(*lot)):
+            colonne.extend(valeurs)
+            if masque is not None:
+                masque.extend(bytes(len(lot)))
+        self.nb_lignes += len(lot)
+
+    def _decoder_ligne(self, tampon, position):
+        '''
+        Décode une ligne champ par champ ; renvoie la position suivante ou None si la ligne est incomplète
+        '''
+        nb = _NB_CHAMPS.unpack_from(tampon, position)[0]
+        if nb == -1:
+            self._termine = True
+            return position + 2
+        if nb != len(self.oids):
+            raise Exception('Nombre de champs inattendu dans le flux COPY binaire : {0}.'.format(nb))
+        curseur = position + 2
+        champs = []
+        for i in range(nb):
+            if curseur + 4 > len(tampon):
+                return None
+            taille = _ENTETE_CHAMP.unpack_from(tampon, curseur)[0]
+            curseur += 4
+            if taille == -1:
+                champs.append(None)
+                continue
+            if curseur + taille > len(tampon):
+                return None
+            champs.append(bytes(tampon[curseur:curseur + taille]))
+            curseur += taille
+        for i, brut in enumerate(champs):
+            self._ajouter_valeur(i, brut)
+        self.nb_lignes += 1
+        return curseur
+
+    def _ajouter_valeur(self, i, brut):
+        oid = self.oids[i]
+        colonne = self.colonnes[i]
+        if oid in TYPES_FIXES:
+            if self.nuls[i] is None and brut is None:
+                self.nuls[i] = bytearray(len(colonne))
+            if self.nuls[i] is not None:
+                self.nuls[i].append(brut is None)
+            colonne.append(0 if brut is None else struct.unpack('>' + TYPES_FIXES[oid][2], brut)[0])
+        else:
+            colonne.append(None if brut is None else self._decodeurs[i](brut))
+
+
+class ResultatColonnaire():
+    '''
+    Résultat d'une requête rangé par colonnes (voir DecodeurCopyBinaire).
+
+    resultat['champ'] renvoie la colonne brute : array.array pour les types de taille fixe (dates en jours et
+    horodatages en microsecondes depuis le 01/01/2000, nuls à 0), liste de valeurs Python sinon.
+    nuls('champ') renvoie le masque des nuls (bytearray, 1 pour une valeur nulle) ou None si la colonne n'en contient pas.
+    valeurs('champ') renvoie la colonne en valeurs Python (None pour les nuls), lignes() les tuples ligne par ligne,
+    en_numpy('champ') un tableau numpy (module numpy nécessaire).
+    '''
+
+    def __init__(self, noms, oids, colonnes, nuls, nb_lignes):
+        self.noms = list(noms)
+        self.oids = list(oids)
+        self._colonnes = dict(zip(self.noms, colonnes))
+        self._nuls = dict(zip(self.noms, nuls))
+        self._oids = dict(zip(self.noms, self.oids))
+        self.nb_lignes = nb_lignes
+        for nom, masque in self._nuls.items():
+            if masque is not None and len(masque) < nb_lignes:
+                masque.extend(bytes(nb_lignes - len(masque)))
+
+    def __len__(self):
+        return self.nb_lignes
+
+    def __getitem__(self, nom):
+        return self._colonnes[nom]
+
+    def __iter__(self):
+        return iter(self.noms)
+
+    def __repr__(self):
+        return 'ResultatColonnaire({0} lignes, champs={1})'.format(self.nb_lignes, self.noms)
+
+    def nuls(self, nom):
+        return self._nuls[nom]
+
+    def valeurs(self, nom):
+        colonne = self._colonnes[nom]
+        oid = self._oids[nom]
+        if oid not in TYPES_FIXES:
+            return list(colonne)
+        conversion = _conversion_fixe(oid)
+        masque = self._nuls[nom]
+        if masque is None:
+            return list(colonne) if conversion is None else [conversion(v) for v in colonne]
+        return [None if nul else (v if conversion is None else conversion(v)) for v, nul in zip(colonne, masque)]
+
+    def lignes(self):
+        return zip(*[self.valeurs(nom) for nom in self.noms])
+
+    def en_numpy(self, nom):
+        '''
+        Renvoie la colonne sous forme d'un tableau numpy, sans copie pour les types numériques
+        (dates et horodatages en datetime64, tableau masqué si la colonne contient des nuls)
+        '''
+        if numpy is None:
+            raise Exception('Le module numpy est nécessaire à la conversion en tableau numpy.')
+        colonne = self._colonnes[nom]
+        oid = self._oids[nom]
+        if oid not in TYPES_FIXES:
+            return numpy.array(colonne, dtype = object)
+        tableau = numpy.frombuffer(colonne, dtype = colonne.typecode) if len(colonne) else numpy.array([], dtype = colonne.typecode)
+        if oid == OID_BOOL:
+            tableau = tableau.astype(bool)
+        elif oid == OID_DATE:
+            tableau = (tableau.astype('int64') + DECALAGE_JOURS_UNIX).astype('datetime64[D]')
+        elif oid in (OID_TIMESTAMP, OID_TIMESTAMPTZ):
+            tableau = (tableau + DECALAGE_MICROSECONDES_UNIX).astype('datetime64[us]')
+        masque = self._nuls[nom]
+        if masque is not None:
+            return numpy.ma.masked_array(tableau, mask = numpy.frombuffer(bytes(masque), dtype = bool))
+        return tableau
+
+
+def _conversion_fixe(oid):
+    if oid == OID_BOOL:
+        return bool
+    if oid == OID_DATE:
+        return _date_pg
+    if oid == OID_TIMESTAMP:
+        return _horodatage_pg
+    if oid == OID_TIMESTAMPTZ:
+        return lambda v: _horodatage_pg(v).replace(tzinfo = timezone.utc)
+    return None
+
+def _date_pg(jours):
+    try:
+        return ORIGINE_PG_DATE + timedelta(days = jours)
+    except OverflowError:
+        return date.max if jours > 0 else date.min
+
+def _horodatage_pg(microsecondes):
+    try:
+        return ORIGINE_PG + timedelta(microseconds = microsecondes)
+    except OverflowError:
+        return datetime.max if microsecondes > 0 else datetime.min
+
+def _decodeur_variable(oid):
+    '''
+    Fonction de décodage de la représentation binaire d'une valeur de type variable (octets bruts par défaut)
+    '''
+    if oid in OID_TEXTES:
+        if oid == 3802:
+            return lambda brut: brut[1:].decode('utf-8')
+        return lambda brut: brut.decode('utf-8')
+    if oid == OID_NUMERIC:
+        return _numeric_pg
+    if oid == OID_UUID:
+        return lambda brut: str(uuid.UUID(bytes = brut))
+    if oid == OID_TIME:
+        return lambda brut: (datetime.min + timedelta(microseconds = struct.unpack('>q', brut)[0])).time()
+    return bytes
+
+def _numeric_pg(brut):
+    '''
+    Décode un numeric : nb de chiffres, poids, signe, échelle puis chiffres en base 10000
+    '''
+    nb_chiffres, poids, signe, echelle = struct.unpack_from('>hhHh', brut)
+    if signe == 0xC000:
+        return Decimal('NaN')
+    if signe == 0xD000:
+        return Decimal('Infinity')
+    if signe == 0xF000:
+        return Decimal('-Infinity')
+    chiffres = struct.unpack_from('>' + 'h' * nb_chiffres, brut, 8)
+    decimaux = tuple(int(c) for c in ''.join('{0:04d}'.format(chiffre) for chiffre in chiffres))
+    exposant = (poids - nb_chiffres + 1) * 4
+    # ramène l'exposant à l'échelle du numeric (les chiffres au-delà de l'échelle sont nuls)
+    if exposant > -echelle:
+        decimaux += (0,) * (exposant + echelle)
+    elif exposant < -echelle:
+        decimaux = decimaux[:len(decimaux) - (-echelle - exposant)]
+    return Decimal((1 if signe == 0x4000 else 0, decimaux or (0,), -echelle))
+
+#eof
@@ -2,25 +2,250 @@
 @author: antoine.herman
 '''
 import os
+import re
 import subprocess
 import csv
+import json
+import logging
+import queue
+import shutil
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+from itertools import islice
+from html import escape
+from concurrent.futures import ThreadPoolExecutor
+from psycopg2 import sql as pgsql
 from pg.pgbasics import *
 #from pgbasics import *
 from pg.pgsqlite import SqliteConn
 #from pgsqlite import SqliteConn
 
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+logger = logging.getLogger(__name__)
+
+def operation_annulable(methode):
+    '''
+    Décorateur des opérations de PgSave et PgLoad : l'annulation (annuler()) est réarmée au lancement 
+    d'une opération alors qu'aucune autre n'est en cours ; une annulation n'interrompt ainsi que les opérations en cours 
+    (y compris les commandes restantes d'une opération composée) et non les suivantes.
+    '''
+    @wraps(methode)
+    def interne(objet, *args, **kwargs):
+        with objet._verrou_operations:
+            if objet._nb_operations == 0:
+                objet.annulation.clear()
+            objet._nb_operations += 1
+        try:
+            return methode(objet, *args, **kwargs)
+        finally:
+            with objet._verrou_operations:
+                objet._nb_operations -= 1
+    return interne
+
+class Progression():
+    '''
+    Avancement d'une commande externe transmis à la fonction de suivi : nombre d'objets traités, 
+    durée écoulée (s), nombre d'octets écrits (None si inconnu) et dernière ligne émise par la commande.
+    '''
+    
+    def __init__(self, nb_objets, duree, nb_octets, ligne):
+        self.nb_objets = nb_objets
+        self.duree = duree
+        self.nb_octets = nb_octets
+        self.ligne = ligne
+    
+    def __repr__(self):
+        return 'Progression(nb_objets={0}, duree={1:.1f}, nb_octets={2})'.format(self.nb_objets, self.duree, self.nb_octets)
+
+
+class ExecutionCommande():
+    '''
+    Exécute une commande externe (pg_dump, pg_restore, psql) en lisant ses sorties au fil de l'eau.
+    
+    Les lignes émises sont journalisées (niveau DEBUG) dès leur réception et seules les nb_lignes_max dernières de chaque sortie 
+    sont conservées. Chaque ligne signalant le traitement d'un objet (table, index, etc. : messages verbeux 
+    de pg_dump et pg_restore, lignes CREATE ... et COPY n de psql) déclenche l'appel de progression(Progression) ; 
+    cible est le fichier ou répertoire produit dont la taille est suivie.
+    La commande est interrompue dès que l'évènement annulation (threading.Event) est activé 
+    ou que la fonction progression renvoie False.
+    
+    executer() renvoie un subprocess.CompletedProcess dont stdout et stderr contiennent les dernières lignes émises.
+    '''
+    
+    MOTIF_OBJET = re.compile(r'^(pg_dump: dumping contents of table'
+                             r'|pg_restore: (processing data for table|creating|finished item)'
+                             r'|CREATE( [A-Z]+)+$|COPY \d+$)')
+    DELAI_SCRUTATION = 0.2
+    DELAI_ARRET = 5
+    
+    def __init__(self, cmd, entree = None, progression = None, annulation = None, cible = None, nb_lignes_max = 1000):
+        self.cmd = cmd
+        self.entree = entree
+        self.progression = progression
+        self.annulation = annulation
+        self.cible = cible
+        self.sortie = deque(maxlen = nb_lignes_max)
+        self.erreurs = deque(maxlen = nb_lignes_max)
+        self.nb_objets = 0
+        self._debut = None
+        self._arret_demande = False
+        self._verrou = threading.Lock()
+    
+    def executer(self):
+        self._debut = time.monotonic()
+        processus = subprocess.Popen(self.cmd, 
+                                     stdin = subprocess.PIPE if self.entree is not None else subprocess.DEVNULL, 
+                                     stdout = subprocess.PIPE, stderr = subprocess.PIPE, 
+                                     universal_newlines = True, bufsize = 1)
+        lecteurs = [threading.Thread(target = self._lire, args = (processus.stdout, self.sortie), daemon = True),
+                    threading.Thread(target = self._lire, args = (processus.stderr, self.erreurs), daemon = True)]
+        for lecteur in lecteurs:
+            lecteur.start()
+        if self.entree is not None:
+            try:
+                processus.stdin.write(self.entree)
+                processus.stdin.close()
+            except OSError:
+                pass
+        while True:
+            try:
+                processus.wait(timeout = self.DELAI_SCRUTATION)
+                break
+            except subprocess.TimeoutExpired:
+                if self.annulee():
+                    self._arreter(processus)
+        for lecteur in lecteurs:
+            lecteur.join()
+        return subprocess.CompletedProcess(self.cmd, processus.returncode, ''.join(self.sortie), ''.join(self.erreurs))
+    
+    def annulee(self):
+        return self._arret_demande or (self.annulation is not None and self.annulation.is_set())
+    
+    def _arreter(self, processus):
+        processus.terminate()
+        try:
+            processus.wait(timeout = self.DELAI_ARRET)
+        except subprocess.TimeoutExpired:
+            processus.kill()
+    
+    def _lire(self, flux, tampon):
+        for ligne in flux:
+            tampon.append(ligne)
+            logger.debug('%s', ligne.rstrip('\n'))
+            if self.MOTIF_OBJET.match(ligne):
+                self._signaler(ligne)
+        flux.close()
+    
+    def _signaler(self, ligne):
+        with self._verrou:
+            self.nb_objets += 1
+            nb_objets = self.nb_objets
+        if self.progression is None:
+            return
+        try:
+            if self.progression(Progression(nb_objets, time.monotonic() - self._debut, self._taille_cible(), ligne.rstrip('\n'))) is False:
+                self._arret_demande = True
+        except Exception as e:
+            logger.error('Erreur du suivi de progression : %s', e)
+    
+    def _taille_cible(self):
+        if self.cible is None:
+            return None
+        try:
+            if os.path.isdir(self.cible):
+                return sum(entree.stat().st_size for entree in os.scandir(self.cible) if entree.is_file())
+            return os.path.getsize(self.cible)
+        except OSError:
+            return 0
+
+
+class EtatExports():
+    '''
+    Repères des exports incrémentaux, conservés dans un fichier json {clef: repère}.
+    
+    Le fichier est réécrit par l'intermédiaire d'un fichier temporaire renommé : il n'est jamais laissé 
+    partiellement écrit. Les horodatages sont conservés au format ISO 8601.
+    '''
+    
+    _VERROU = threading.Lock()
+    
+    def __init__(self, fichier):
+        self.fichier = fichier
+    
+    def lire(self, clef):
+        return self._charger().get(clef)
+    
+    def ecrire(self, clef, repere):
+        with self._VERROU:
+            etat = self._charger()
+            etat[clef] = self._serialiser(repere)
+            self._enregistrer(etat)
+    
+    def effacer(self, clef):
+        '''
+        Efface le repère : le prochain export incrémental portera sur toute la table
+        '''
+        with self._VERROU:
+            etat = self._charger()
+            if clef in etat:
+                del etat[clef]
+                self._enregistrer(etat)
+    
+    def _enregistrer(self, etat):
+        temporaire = self.fichier + '.tmp'
+        with open(temporaire, 'w', encoding = 'utf-8') as f:
+            json.dump(etat, f, indent = 2, ensure_ascii = False)
+        os.replace(temporaire, self.fichier)
+    
+    def _charger(self):
+        if not os.path.exists(self.fichier):
+            return {}
+        with open(self.fichier, encoding = 'utf-8') as f:
+            return json.load(f)
+    
+    def _serialiser(self, repere):
+        if repere is None or isinstance(repere, (int, float, str)):
+            return repere
+        if hasattr(repere, 'isoformat'):
+            return repere.isoformat()
+        return str(repere)
+
+
 class PgSave():    
     '''
     Classe permettant de sauvegarder sous format sql ou dump à partir de commandes pg_dump
+    
+    Les sorties de pg_dump sont lues au fil de l'eau (voir ExecutionCommande) : la fonction progression 
+    est appelée pour chaque objet sauvegardé et les sauvegardes en cours peuvent être interrompues par annuler().
     '''
     
-    def __init__(self, hote=None, base=None, utilisateur=None, mdp=None, demande_mdp=True):
+    def __init__(self, hote=None, base=None, utilisateur=None, mdp=None, demande_mdp=True, progression=None):
         self.hote = hote
         self.base = base
         self.utilisateur = utilisateur
         self.mdp = mdp
         self.demande_mdp = demande_mdp
+        self.progression = progression
+        self.annulation = threading.Event()
+        self._verrou_operations = threading.Lock()
+        self._nb_operations = 0
+    
+    def annuler(self):
+        '''
+        Interrompt les commandes en cours et les commandes restantes des opérations en cours 
+        (l'annulation est réarmée au lancement d'une nouvelle opération, voir operation_annulable)
+        '''
+        self.annulation.set()
 
+    @operation_annulable
     def sauvegarder_base_format_sql(self, fichier):
         '''
         Sauvegarde la base sous format sql dans le nom de fichier spécifié. 
@@ -30,6 +255,7 @@ class PgSave():
         cmd = self._commande_pg_dump_base_entiere(fichier)
         return self.executer_commande_pg_dump(cmd)
 
+    @operation_annulable
     def sauvegarder_schemas_format_dump(self, fichier, schemas):
         '''
         Sauvegarde les schemas sous format dump dans le nom de fichier spécifié.        
@@ -38,6 +264,7 @@ class PgSave():
         cmd = self._commande_pg_dump_schemas(fichier, schemas, format_dump=True)
         return self.executer_commande_pg_dump(cmd)
 
+    @operation_annulable
     def sauvegarder_schemas_format_sql(self, fichier, schemas):
         '''
         Sauvegarde les schemas sous format sql dans le nom de fichier spécifié.        
@@ -46,6 +273,7 @@ class PgSave():
         cmd = self._commande_pg_dump_schemas(fichier, schemas, format_dump=False)
         return self.executer_commande_pg_dump(cmd)
 
+    @operation_annulable
     def sauvegarder_tables_format_dump(self, fichier, tables):
         '''
         Sauvegarde les tables sous format dump dans le nom de fichier spécifié.        
@@ -54,6 +282,7 @@ class PgSave():
         cmd = self._commande_pg_dump_tables(fichier, tables, format_dump=True)
         return self.executer_commande_pg_dump(cmd)
 
+    @operation_annulable
     def sauvegarder_tables_format_sql(self, fichier, tables):
         '''
         Sauvegarde les tables sous format sql dans le nom de fichier spécifié.        
@@ -62,19 +291,88 @@ class PgSave():
         cmd = self._commande_pg_dump_tables(fichier, tables, format_dump=False)
         return self.executer_commande_pg_dump(cmd)
     
+    @operation_annulable
+    def sauvegarder_base_format_repertoire(self, repertoire, nb_processus = 4):
+        '''
+        Sauvegarde la base sous format répertoire (pg_dump -Fd) dans le répertoire spécifié, 
+        les tables étant exportées simultanément par nb_processus processus (pg_dump -j). 
+        Le répertoire ne doit pas exister (ou être vide).
+        La commande pg_dump doit être disponible sur la machine.
+        '''
+        cmd = self._commande_pg_dump_racine(repertoire, format_repertoire = True, nb_processus = nb_processus)
+        cmd += ['-C', self.base]
+        return self.executer_commande_pg_dump(cmd)
+
+    @operation_annulable
+    def sauvegarder_schemas_format_repertoire(self, repertoire, schemas, nb_processus = 4):
+        '''
+        Sauvegarde les schemas sous format répertoire (pg_dump -Fd -j nb_processus) dans le répertoire spécifié.        
+        La commande pg_dump doit être disponible sur la machine.
+        '''
+        cmd = self._commande_pg_dump_schemas(repertoire, schemas, format_repertoire = True, nb_processus = nb_processus)
+        return self.executer_commande_pg_dump(cmd)
+
+    @operation_annulable
+    def sauvegarder_tables_format_repertoire(self, repertoire, tables, nb_processus = 4):
+        '''
+        Sauvegarde les tables sous format répertoire (pg_dump -Fd -j nb_processus) dans le répertoire spécifié.        
+        La commande pg_dump doit être disponible sur la machine.
+        '''
+        cmd = self._commande_pg_dump_tables(repertoire, tables, format_repertoire = True, nb_processus = nb_processus)
+        return self.executer_commande_pg_dump(cmd)
+    
+    @operation_annulable
+    def sauvegarder_schemas_simultanement(self, repertoire, schemas, format_dump = True, nb_processus = 4):
+        '''
+        Sauvegarde chacun des schemas dans son propre fichier du répertoire spécifié (schema.dump, ou schema.sql 
+        si format_dump est à False), au plus nb_processus commandes pg_dump s'exécutant simultanément.
+        
+        Renvoie True si toutes les sauvegardes ont réussi ainsi que le dictionnaire {schema: processus terminé}.
+        '''
+        extension = '.dump' if format_dump else '.sql'
+        commandes = {schema: self._commande_pg_dump_schemas(os.path.join(repertoire, schema + extension), [schema], format_dump = format_dump) 
+                     for schema in schemas}
+        return self._executer_commandes_pg_dump_simultanement(repertoire, commandes, nb_processus)
+    
+    @operation_annulable
+    def sauvegarder_groupes_de_tables_simultanement(self, repertoire, groupes, format_dump = True, nb_processus = 4):
+        '''
+        Sauvegarde chaque groupe de tables du dictionnaire groupes ({nom: [tables]}) dans son propre fichier 
+        du répertoire spécifié (nom.dump, ou nom.sql si format_dump est à False), au plus nb_processus 
+        commandes pg_dump s'exécutant simultanément.
+        
+        Renvoie True si toutes les sauvegardes ont réussi ainsi que le dictionnaire {nom: processus terminé}.
+        '''
+        extension = '.dump' if format_dump else '.sql'
+        commandes = {nom: self._commande_pg_dump_tables(os.path.join(repertoire, nom + extension), tables, format_dump = format_dump) 
+                     for nom, tables in groupes.items()}
+        return self._executer_commandes_pg_dump_simultanement(repertoire, commandes, nb_processus)
+    
+    def _executer_commandes_pg_dump_simultanement(self, repertoire, commandes, nb_processus):
+        if not self.verification_commande_pg_dump():
+            raise Exception("La commande pg_dump n'existe pas.")
+        os.makedirs(repertoire, exist_ok = True)
+        with ThreadPoolExecutor(max_workers = nb_processus) as executeur:
+            processus = dict(zip(commandes, executeur.map(self._executer_pg_dump, commandes.values())))
+        return all(p.returncode == 0 for p in processus.values()), processus
+    
+    @operation_annulable
     def executer_commande_pg_dump(self, cmd):
         '''
         Execute le process pg_dump
         '''
         if not self.verification_commande_pg_dump():
             raise Exception("La commande pg_dump n'existe pas.")
-        print('-- DEBUT CREATION SAUVEGARDE:')        
-        p = subprocess.run(cmd,input=self.mdp, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+        return self._executer_pg_dump(cmd)
+    
+    def _executer_pg_dump(self, cmd):
+        logger.info('-- DEBUT CREATION SAUVEGARDE')
+        cible = cmd[cmd.index('-f') + 1] if '-f' in cmd else None
+        p = ExecutionCommande(cmd, self.mdp, self.progression, self.annulation, cible).executer()
         if p.returncode == 0:
-            print(p.stdout, p.stderr)
-            print('-- FIN CREATION SAUVEGARDE')
+            logger.info('-- FIN CREATION SAUVEGARDE')
         else:
-            print('ECHEC SAUVEGARDE :', p.stderr)
+            logger.error('ECHEC SAUVEGARDE : %s', p.stderr)
         return p
     
     def verification_commande_pg_dump(self):
@@ -84,13 +382,17 @@ class PgSave():
             return True
         return False
         
-    def _commande_pg_dump_racine(self, fichier, format_dump=False):
+    def _commande_pg_dump_racine(self, fichier, format_dump=False, format_repertoire=False, nb_processus=1):
         cmd = ['pg_dump', 
                '-h', self.hote, 
                '-U', self.utilisateur, 
                '-v', '-O',
                '-f', fichier]
-        if format_dump:
+        if format_repertoire:
+            cmd.append('-Fd')
+            if nb_processus > 1:
+                cmd += ['-j', str(nb_processus)]
+        elif format_dump:
             cmd.append('-Fc')
         if self.demande_mdp:
             cmd.append('-W')
@@ -101,15 +403,15 @@ class PgSave():
         cmd += ['-C', self.base]
         return cmd
     
-    def _commande_pg_dump_schemas(self, fichier, schemas, format_dump=False):
-        cmd = self._commande_pg_dump_racine(fichier, format_dump=format_dump)
+    def _commande_pg_dump_schemas(self, fichier, schemas, format_dump=False, format_repertoire=False, nb_processus=1):
+        cmd = self._commande_pg_dump_racine(fichier, format_dump=format_dump, format_repertoire=format_repertoire, nb_processus=nb_processus)
         for schema in schemas:
             cmd += ['-n', schema]
         cmd.append(self.base)
         return cmd
     
-    def _commande_pg_dump_tables(self, fichier, tables, format_dump=False):
-        cmd = self._commande_pg_dump_racine(fichier, format_dump=format_dump)
+    def _commande_pg_dump_tables(self, fichier, tables, format_dump=False, format_repertoire=False, nb_processus=1):
+        cmd = self._commande_pg_dump_racine(fichier, format_dump=format_dump, format_repertoire=format_repertoire, nb_processus=nb_processus)
         for table in tables:
             cmd += ['-t', table]
         cmd.append(self.base)
@@ -117,20 +419,37 @@ class PgSave():
     
 class PgLoad():    
     '''
-    Classe permettant de charger des données au format sql à partir de commandes psql
+    Classe permettant de charger des données au format sql à partir de commandes psql,
+    ou des archives au format dump ou répertoire à partir de commandes pg_restore
+    
+    Comme pour PgSave, les sorties des commandes sont lues au fil de l'eau, la fonction progression 
+    est appelée pour chaque objet chargé et les commandes en cours peuvent être interrompues par annuler().
     '''
     
-    def __init__(self, hote=None, base=None, utilisateur=None, mdp=None, demande_mdp=True):
+    def __init__(self, hote=None, base=None, utilisateur=None, mdp=None, demande_mdp=True, progression=None):
         self.hote = hote
         self.base = base
         self.utilisateur = utilisateur
         self.mdp = mdp
         self.demande_mdp = demande_mdp
+        self.progression = progression
+        self.annulation = threading.Event()
+        self._verrou_operations = threading.Lock()
+        self._nb_operations = 0
+    
+    def annuler(self):
+        '''
+        Interrompt la commande en cours et les commandes restantes des opérations en cours 
+        (l'annulation est réarmée au lancement d'une nouvelle opération, voir operation_annulable)
+        '''
+        self.annulation.set()
     
+    @operation_annulable
     def charger_fichier_sql(self, fichier_sql):
         cmd = self._commande_psql_fichier(fichier_sql, specifier_bdd = True)
         return self.executer_commande_psql(cmd)
         
+    @operation_annulable
     def charger_fichier_sql_dans_nouvelle_base(self, fichier_sql, postgis = True):
         self.effacer_base()
         self.creer_nouvelle_base()
@@ -138,33 +457,73 @@ class PgLoad():
             self.creer_extensions_postgis()
         return self.charger_fichier_sql(fichier_sql)
     
+    @operation_annulable
+    def charger_archive(self, archive, nb_processus = 4, schemas = None, tables = None, donnees_seulement = False, structure_seulement = False):
+        '''
+        Restaure dans la base une archive au format dump (pg_dump -Fc) ou répertoire (pg_dump -Fd), 
+        nb_processus processus chargeant les données et créant les index simultanément (pg_restore -j).
+        
+        Si schemas est spécifié, seuls les objets de ces schémas sont restaurés.
+        Si tables est spécifié, seules ces tables (noms sans schéma, restreints aux schémas s'ils sont spécifiés) sont restaurées.
+        donnees_seulement (pg_restore -a) ou structure_seulement (pg_restore -s) permettent de restaurer 
+        la structure et les données en deux temps.
+        La commande pg_restore doit être disponible sur la machine.
+        '''
+        if donnees_seulement and structure_seulement:
+            raise Exception("Les options donnees_seulement et structure_seulement sont incompatibles.")
+        cmd = self._commande_pg_restore(archive, nb_processus, schemas, tables, donnees_seulement, structure_seulement)
+        return self.executer_commande_pg_restore(cmd)
+    
+    @operation_annulable
+    def charger_archive_dans_nouvelle_base(self, archive, nb_processus = 4, postgis = True, schemas = None, tables = None):
+        self.effacer_base()
+        self.creer_nouvelle_base()
+        if postgis :
+            self.creer_extensions_postgis()
+        return self.charger_archive(archive, nb_processus, schemas, tables)
+    
+    @operation_annulable
     def effacer_base(self):
         requete = "DROP DATABASE IF EXISTS {0};".format(self.base)
         cmd = self._commande_psql_requete(requete, specifier_bdd = False)
         return self.executer_commande_psql(cmd)
     
+    @operation_annulable
     def creer_nouvelle_base(self):
         requete = "CREATE DATABASE {0};".format(self.base)
         cmd = self._commande_psql_requete(requete, specifier_bdd = False)
         return self.executer_commande_psql(cmd)
     
+    @operation_annulable
     def creer_extensions_postgis(self):
         requete = "CREATE EXTENSION postgis; CREATE EXTENSION postgis_topology;"
         cmd = self._commande_psql_requete(requete, specifier_bdd = True)
         return self.executer_commande_psql(cmd)
         
+    @operation_annulable
     def executer_commande_psql(self, cmd):
         '''
         Execute le process psql
         '''
         if not self.verification_commande_psql():
             raise Exception("La commande psql n'existe pas.")        
-        p = subprocess.run(cmd, input=self.mdp, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
-        if p.returncode == 0:
-            print(p.stdout, p.stderr)
-        else:
-            print(p.stderr)
-        return p
+        return ExecutionCommande(cmd, self.mdp, self.progression, self.annulation).executer()
+    
+    @operation_annulable
+    def executer_commande_pg_restore(self, cmd):
+        '''
+        Execute le process pg_restore
+        '''
+        if not self.verification_commande_pg_restore():
+            raise Exception("La commande pg_restore n'existe pas.")        
+        return ExecutionCommande(cmd, self.mdp, self.progression, self.annulation).executer()
+    
+    def verification_commande_pg_restore(self):
+        cmd = ['pg_restore', '--version']
+        p = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+        if p.returncode == 0 and p.stdout.startswith('pg_restore'):
+            return True
+        return False
     
     def verification_commande_psql(self):
         cmd = ['psql', '--version']
@@ -192,6 +551,27 @@ class PgLoad():
         cmd = self._commande_psql_racine(specifier_bdd)
         cmd += ['-f', fichier]
         return cmd  
+    
+    def _commande_pg_restore(self, archive, nb_processus = 1, schemas = None, tables = None, donnees_seulement = False, structure_seulement = False):
+        cmd = ['pg_restore', 
+               '-h', self.hote, 
+               '-U', self.utilisateur,
+               '-d', self.base,
+               '-v', '-O']
+        if self.demande_mdp:
+            cmd.append('-W')
+        if nb_processus > 1:
+            cmd += ['-j', str(nb_processus)]
+        for schema in schemas or []:
+            cmd += ['-n', schema]
+        for table in tables or []:
+            cmd += ['-t', table]
+        if donnees_seulement:
+            cmd.append('-a')
+        if structure_seulement:
+            cmd.append('-s')
+        cmd.append(archive)
+        return cmd
 
 class PgExport(PgOutils):
     '''
@@ -199,9 +579,12 @@ class PgExport(PgOutils):
     '''
     
     VUE_TEMPORAIRE = 'public.temporaire'
+    MARQUEUR_HTML = '\x00tableau\x00'
+    # types (lister_champs) dont l'écriture csv par Python n'est pas reproduite par exporter_table_vers_csv_via_copy
+    TYPES_NON_EXPORTABLES_VIA_COPY = ('json', 'jsonb', 'bytea', 'interval', 'time with time zone')
     
-    def __init__(self, hote=None, base=None, port=None, utilisateur=None, motdepasse=None):
-        super().__init__(hote, base, port, utilisateur, motdepasse) 
+    def __init__(self, hote=None, base=None, port=None, utilisateur=None, motdepasse=None, pool=None):
+        super().__init__(hote, base, port, utilisateur, motdepasse, pool=pool) 
     
     def _creer_vue_temporaire(self, select_sql):
         '''
@@ -211,35 +594,113 @@ class PgExport(PgOutils):
         CREATE VIEW {1} AS {0}'''.format(select_sql, self.VUE_TEMPORAIRE)
         return self.execution(requete_vue)
     
-    def _recuperer_donnees_table_pg(self, schema, table, limit = None):
+    def _recuperer_donnees_table_pg(self, schema, table, limit = None, iterateur = False):
         '''
         Renvoie les données de la table PostgreSQL spécifiée dans une liste de tuples
+        
+        Si iterateur est à True, renvoie un itérateur alimenté par un curseur côté serveur 
+        afin de ne pas charger l'ensemble de la table en mémoire.
         '''
-        if limit is None:
-            select = 'SELECT * FROM {0}.{1};'.format(schema, table)
-        else:
-            select = 'SELECT * FROM {0}.{1} LIMIT {2};'.format(schema, table, limit)
+        select = self._requete_select_table(schema, table, limit)
+        if iterateur:
+            return self.execution_et_recuperation_iterateur(select)
         return self.execution_et_recuperation(select)
 
+    def _requete_select_table(self, schema, table, limit = None):
+        if limit is None:
+            return 'SELECT * FROM {0}.{1};'.format(schema, table)
+        return 'SELECT * FROM {0}.{1} LIMIT {2};'.format(schema, table, limit)
+    
+    def _requete_select_csv(self, schema, table, champs, limit = None):
+        '''
+        Renvoie la requête SELECT de la table dont chaque champ (liste renvoyée par lister_champs) est converti 
+        par le serveur en texte tel que l'écrirait csv.writer à partir des valeurs renvoyées par psycopg2.
+        
+        Dans le format csv de COPY, NULL est écrit sans guillemets et la chaîne vide entre guillemets : 
+        une chaîne vide est donc exportée comme NULL, sauf pour une table à un seul champ 
+        où csv.writer écrit "" dans les deux cas.
+        '''
+        if not champs:
+            return self._requete_select_table(schema, table, limit)
+        remplacement_des_nuls = "COALESCE({0}, '')" if len(champs) == 1 else "NULLIF({0}, '')"
+        expressions = []
+        for position, nom, type_champ in champs:
+            champ = '"' + nom.replace('"', '""') + '"'
+            expressions.append(remplacement_des_nuls.format(self._expression_csv(champ, type_champ)) + ' AS ' + champ)
+        select = 'SELECT {0} FROM {1}.{2}'.format(', '.join(expressions), schema, table)
+        return select + ';' if limit is None else select + ' LIMIT {0};'.format(limit)
+    
+    def _expression_csv(self, champ, type_champ):
+        '''
+        Renvoie l'expression sql (texte) du champ reproduisant l'écriture csv de la valeur Python correspondante.
+        Lève une exception pour les types dont la valeur Python n'a pas d'équivalent textuel simple (json, tableaux...).
+        '''
+        if type_champ is None or type_champ.endswith('[]') or type_champ.endswith('range') or type_champ in self.TYPES_NON_EXPORTABLES_VIA_COPY:
+            raise Exception("Le champ {0} (type {1}) ne peut être exporté à l'identique via COPY.".format(champ, type_champ))
+        if type_champ == 'boolean':
+            return "CASE {0} WHEN TRUE THEN 'True' WHEN FALSE THEN 'False' END".format(champ)
+        if type_champ in ('real', 'double precision'):
+            # psycopg2 lit un real comme un float Python (double)
+            return self._expression_csv_reel(champ if type_champ == 'double precision' else '{0}::text::float8'.format(champ))
+        if type_champ == 'character':
+            # le cast en texte supprimerait les espaces de complétion, conservés par psycopg2
+            return 'concat({0})'.format(champ)
+        if type_champ == 'date':
+            return "to_char({0}, 'YYYY-MM-DD')".format(champ)
+        if type_champ.startswith('timestamp') or type_champ == 'time without time zone':
+            # str(datetime) / str(time) : microsecondes seulement si non nulles, décalage horaire ±HH:MM
+            horodatage = champ if type_champ.startswith('timestamp') else "('2000-01-01'::date + {0})".format(champ)
+            masque = 'YYYY-MM-DD HH24:MI:SS' if type_champ.startswith('timestamp') else 'HH24:MI:SS'
+            expression = ("to_char({0}, '{1}') || CASE WHEN date_trunc('second', {0}) = {0} THEN '' ELSE to_char({0}, '.US') END"
+                          ).format(horodatage, masque)
+            if type_champ == 'timestamp with time zone':
+                expression += " || to_char({0}, 'TZH:TZM')".format(champ)
+            return expression
+        return champ + '::text'
+    
+    def _expression_csv_reel(self, reel):
+        '''
+        Renvoie l'expression sql écrivant le réel (float8) comme repr() en Python : plus courte écriture décimale 
+        redonnant le même réel, notation scientifique en deçà de 1e-4 et à partir de 1e16 (1e15 pour PostgreSQL), 
+        '.0' pour les valeurs entières, nan, inf et -inf.
+        
+        L'écriture de PostgreSQL (la plus courte aussi) n'en diffère que lorsque celle-ci tombe exactement entre deux réels, 
+        ce qui n'arrive qu'à partir de 2**53 (ex: 5.1036700000000003e+20) : les arrondis à 15, 16 puis 17 chiffres (to_char) 
+        y sont alors essayés.
+        '''
+        arrondi = "to_char({0}, '9.{{0}}EEEE')".format(reel)
+        redonne_le_reel = ("CASE WHEN abs({0}) < 1e308 THEN {{0}}::float8 = {0} "
+                           "WHEN abs({{0}}::numeric) > 1.7976931348623157e308 THEN FALSE ELSE {{0}}::float8 = {0} END").format(reel)
+        a_15_chiffres, a_16_chiffres = arrondi.format('9' * 14), arrondi.format('9' * 15)
+        scientifique = '(CASE WHEN {0} THEN {1} WHEN {2} THEN {3} ELSE {4} END)'.format(
+            redonne_le_reel.format(a_15_chiffres), a_15_chiffres, redonne_le_reel.format(a_16_chiffres), a_16_chiffres, 
+            arrondi.format('9' * 16))
+        return ("CASE WHEN {0} = 'NaN' THEN 'nan' WHEN {0} = 'Infinity' THEN 'inf' WHEN {0} = '-Infinity' THEN '-inf' "
+                "WHEN abs({0}) < 9007199254740992 THEN regexp_replace(CASE WHEN abs({0}) >= 1e15 AND abs({0}) < 1e16 "
+                "THEN {0}::text::numeric::text ELSE {0}::text END, '^(-?[0-9]+)$', '\\1.0') "
+                "WHEN split_part({1}, 'e', 2)::int NOT BETWEEN -4 AND 15 THEN regexp_replace(trim({1}), '\\.?0+e', 'e') "
+                "ELSE regexp_replace(regexp_replace({1}::numeric::text, '(\\.[0-9]*[1-9])0+$|\\.0*$', '\\1'), '^(-?[0-9]+)$', '\\1.0') END"
+                ).format(reel, scientifique)
+
     '''
     EXPORT SQLITE
     '''
     
-    def exporter_table_vers_sqlite(self, schema, table, nom_bdd_sqlite, nom_table_sqlite, recreer_table = True, limit = None):
+    def exporter_table_vers_sqlite(self, schema, table, nom_bdd_sqlite, nom_table_sqlite, recreer_table = True, limit = None, iterateur = True):
         '''
         Insére des données issues d'une table PostgreSQL dans la table d'une base sqlite
         
         Par défaut, la table sqlite est créée (ou recréée) si elle existe.
         Si recreer_table est False, les données sont insérées à la table sqlite existante.
         Si une valeur entière n est spécifiée pour limit, seules les n premières lignes de la table sont exportées.   
+        Par défaut (iterateur à True), les données sont lues par paquets via un curseur côté serveur 
+        et insérées au fil de l'eau dans une transaction sqlite unique.
         '''
         champs = self.lister_champs(schema, table)
-        if recreer_table:
-            self._creer_table_sqlite(nom_bdd_sqlite, nom_table_sqlite, champs)
-        donnees = self._recuperer_donnees_table_pg(schema, table, limit)
-        self._inserer_donnees_dans_sqlite(donnees, nom_bdd_sqlite, nom_table_sqlite)
+        donnees = self._recuperer_donnees_table_pg(schema, table, limit, iterateur = iterateur)
+        self._charger_table_sqlite(donnees, nom_bdd_sqlite, nom_table_sqlite, champs, recreer_table)
     
-    def exporter_requete_vers_sqlite(self, sql, nom_bdd_sqlite, nom_table_sqlite, recreer_table = True, limit = None):
+    def exporter_requete_vers_sqlite(self, sql, nom_bdd_sqlite, nom_table_sqlite, recreer_table = True, limit = None, iterateur = True):
         '''
         Insére des données issues d'une requête dans la table d'une base sqlite
         
@@ -249,36 +710,73 @@ class PgExport(PgOutils):
         schema, table = self.VUE_TEMPORAIRE.split('.')
         reussite, nb = self._creer_vue_temporaire(sql)
         if reussite:
-            self.exporter_table_vers_sqlite(schema, table, nom_bdd_sqlite, nom_table_sqlite, champs, recreer_table, limit)        
+            self.exporter_table_vers_sqlite(schema, table, nom_bdd_sqlite, nom_table_sqlite, recreer_table, limit, iterateur)        
     
-    def _creer_table_sqlite(self, nom_bdd_sqlite, nom_table_sqlite, champs):
+    def _charger_table_sqlite(self, donnees, nom_bdd_sqlite, nom_table_sqlite, champs, recreer_table):
+        '''
+        Crée la table sqlite si recreer_table est à True puis y insère les données (itérable de tuples), 
+        sur une seule connexion, en une seule transaction et avec les pragmas de chargement massif.
+        '''
+        sqlite = SqliteConn(nom_bdd_sqlite)
+        try:
+            with sqlite.chargement_massif():
+                if recreer_table:
+                    self._creer_table_sqlite(sqlite, nom_table_sqlite, champs)
+                self._inserer_donnees_dans_sqlite(donnees or [], sqlite, nom_table_sqlite, len(champs))
+        finally:
+            sqlite.deconnection_sqlite()
+    
+    def _creer_table_sqlite(self, sqlite, nom_table_sqlite, champs):
         champs_pour_requete = ', '.join([nom + ' ' + type for position, nom, type in champs]) 
         drop_table = 'DROP TABLE IF EXISTS {0};'.format(nom_table_sqlite)
         create_table = 'CREATE TABLE {0} ({1});'.format(nom_table_sqlite, champs_pour_requete)
-        sqlite = SqliteConn(nom_bdd_sqlite)
         for sql in [drop_table, create_table]:
-            sqlite.execute_commit(sql)
+            sqlite.connection.execute(sql)
            
-    def _inserer_donnees_dans_sqlite(self, donnees, nom_bdd_sqlite, nom_table_sqlite):
-        sqlite = SqliteConn(nom_bdd_sqlite)
-        insert = 'INSERT INTO {0} VALUES ({1});'.format(nom_table_sqlite, ', '.join(['?']*len(donnees[0])))
-        sqlite.execute_many(insert, donnees)
+    def _inserer_donnees_dans_sqlite(self, donnees, sqlite, nom_table_sqlite, nb_champs):
+        insert = 'INSERT INTO {0} VALUES ({1});'.format(nom_table_sqlite, ', '.join(['?']*nb_champs))
+        return sqlite.execute_many(insert, donnees, validation = False)
     
     '''
     EXPORT CSV
     '''
     
-    def exporter_table_vers_csv(self, schema, table, fichier_csv, delimiteur = '|', limit = None):
+    def exporter_table_vers_csv(self, schema, table, fichier_csv, delimiteur = '|', limit = None, iterateur = False):
+        '''
+        Exporte la table PostgreSQL dans le fichier csv, la première ligne contenant le nom des champs.
+        '''
         champs = [nom for position, nom, type in self.lister_champs(schema, table)]
-        donnees = self._recuperer_donnees_table_pg(schema, table, limit=limit)
+        donnees = self._recuperer_donnees_table_pg(schema, table, limit=limit, iterateur=iterateur)
         self._ecrire_dans_csv(fichier_csv, champs, donnees, delimiteur)
     
-    def exporter_requete_vers_csv(self, sql, fichier_csv, delimiteur = '|', limit = None):
+    def exporter_requete_vers_csv(self, sql, fichier_csv, delimiteur = '|', limit = None, iterateur = False):
         schema, table = self.VUE_TEMPORAIRE.split('.')
         reussite, nb = self._creer_vue_temporaire(sql)
         if reussite:
-            self.exporter_table_vers_csv(schema, table, fichier_csv, delimiteur, limit = limit)
+            self.exporter_table_vers_csv(schema, table, fichier_csv, delimiteur, limit = limit, iterateur = iterateur)
+    
+    def exporter_table_vers_csv_via_copy(self, schema, table, fichier_csv, delimiteur = '|', limit = None):
+        '''
+        Exporte la table PostgreSQL dans le fichier csv, la première ligne contenant le nom des champs : 
+        le fichier est produit par le serveur (COPY ... TO STDOUT) sans passer par des tuples Python.
         
+        Les champs sont convertis par le serveur (voir _requete_select_csv) afin que le fichier soit identique 
+        à celui de exporter_table_vers_csv (booléens True/False, réels, dates et horodatages au format Python...). 
+        Les champs json, bytea, interval, tableaux et intervalles (range) ne peuvent être exportés ainsi : une exception est levée.
+        Renvoie le nombre d'octets écrits.
+        '''
+        select = self._requete_select_csv(schema, table, self.lister_champs(schema, table), limit)
+        return self.pgconn.copy_to_csv(select, fichier_csv, delimiteur, entete = True, fin_de_ligne = '\r\n')
+    
+    def exporter_requete_vers_csv_via_copy(self, sql, fichier_csv, delimiteur = '|', limit = None):
+        '''
+        Voir exporter_table_vers_csv_via_copy ; renvoie le nombre d'octets écrits ou None en cas d'échec.
+        '''
+        schema, table = self.VUE_TEMPORAIRE.split('.')
+        reussite, nb = self._creer_vue_temporaire(sql)
+        if reussite:
+            return self.exporter_table_vers_csv_via_copy(schema, table, fichier_csv, delimiteur, limit = limit)
+    
     def _ecrire_dans_csv(self, fichier_csv, champs, donnees, delimiteur):
         with open(fichier_csv, 'w',encoding ='utf-8', newline = '\n') as fichier:
             csv_writer = csv.writer(fichier, delimiter = delimiteur)
@@ -286,21 +784,422 @@ class PgExport(PgOutils):
             for ligne in donnees:
                 csv_writer.writerow(ligne)
     
+    '''
+    EXPORT INCREMENTAL
+    '''
+    
+    def exporter_table_vers_csv_incremental(self, schema, table, fichier_csv, champ_suivi, fichier_etat, delimiteur = '|', autoriser_xmin = False):
+        '''
+        Exporte dans fichier_csv (fichier delta, avec entête) les seules lignes de la table ajoutées ou modifiées 
+        depuis l'export précédent, repérées par champ_suivi : champ croissant (horodatage de mise à jour, 
+        identifiant serial) ou 'xmin' (numéro de la transaction ayant écrit la ligne).
+        
+        xmin n'est accepté que si autoriser_xmin est à True : c'est un compteur de 32 bits qui repart de zéro 
+        après environ 4 milliards de transactions sur l'instance. Les lignes écrites ensuite ont un xmin inférieur 
+        au repère et ne sont plus exportées ; l'état (fichier_etat) doit alors être supprimé pour tout réexporter. 
+        Les lignes gelées par VACUUM ont pour xmin 2 : sans incidence, puisqu'elles ont déjà été exportées.
+        
+        Le repère (plus grande valeur de champ_suivi exportée) est conservé dans le fichier json fichier_etat 
+        (voir EtatExports) et n'est mis à jour qu'une fois le fichier écrit. Au premier export, toute la table est exportée.
+        Une ligne écrite par une transaction encore en cours lors de l'export, avec une valeur de champ_suivi 
+        inférieure au repère, ne sera pas exportée : le champ doit être croissant dans l'ordre des validations.
+        
+        Renvoie le nombre de lignes exportées, -1 en cas d'échec.
+        '''
+        etat = EtatExports(fichier_etat)
+        clef = 'csv:{0}.{1}'.format(schema, table)
+        champs = [nom for position, nom, type in self.lister_champs(schema, table)]
+        lignes = self._recuperer_donnees_incrementales(schema, table, champ_suivi, etat.lire(clef), autoriser_xmin)
+        if lignes is None:
+            return -1
+        suivi = {'nb': 0, 'repere': None}
+        self._ecrire_dans_csv(fichier_csv, champs, self._suivre_repere(lignes, suivi), delimiteur)
+        if suivi['nb'] > 0:
+            etat.ecrire(clef, suivi['repere'])
+        return suivi['nb']
+    
+    def exporter_table_vers_sqlite_incremental(self, schema, table, nom_bdd_sqlite, nom_table_sqlite, champ_suivi, fichier_etat, champs_clef = None, 
+                                               autoriser_xmin = False):
+        '''
+        Ajoute à la table sqlite (créée si elle n'existe pas) les lignes de la table ajoutées ou modifiées 
+        depuis l'export précédent (voir exporter_table_vers_csv_incremental pour champ_suivi, fichier_etat et autoriser_xmin).
+        
+        Une ligne modifiée remplace dans la table sqlite la ligne de même clef (champs_clef, par défaut 
+        la clef primaire de la table PostgreSQL) ; sans clef, les lignes sont simplement ajoutées.
+        
+        Renvoie le nombre de lignes exportées, -1 en cas d'échec.
+        '''
+        etat = EtatExports(fichier_etat)
+        clef = 'sqlite:{0}.{1}:{2}:{3}'.format(schema, table, nom_bdd_sqlite, nom_table_sqlite)
+        champs = self.lister_champs(schema, table)
+        if champs_clef is None:
+            champs_clef = self.lister_champs_clef_primaire(schema, table) or []
+        lignes = self._recuperer_donnees_incrementales(schema, table, champ_suivi, etat.lire(clef), autoriser_xmin)
+        if lignes is None:
+            return -1
+        suivi = {'nb': 0, 'repere': None}
+        sqlite = SqliteConn(nom_bdd_sqlite)
+        try:
+            # la base sqlite est conservée d'un export à l'autre : sa journalisation est maintenue
+            with sqlite.chargement_massif(pragmas = {'journal_mode': 'DELETE', 'synchronous': 'NORMAL'}):
+                existe = sqlite.execute_recupere("SELECT count(*) FROM sqlite_master WHERE type = 'table' AND name = '{0}';".format(nom_table_sqlite))[0][0]
+                if not existe:
+                    self._creer_table_sqlite(sqlite, nom_table_sqlite, champs)
+                donnees = self._suivre_repere(lignes, suivi)
+                if champs_clef:
+                    self._remplacer_dans_sqlite(donnees, sqlite, nom_table_sqlite, champs, champs_clef)
+                else:
+                    self._inserer_donnees_dans_sqlite(donnees, sqlite, nom_table_sqlite, len(champs))
+        finally:
+            sqlite.deconnection_sqlite()
+        if suivi['nb'] > 0:
+            etat.ecrire(clef, suivi['repere'])
+        return suivi['nb']
+    
+    def _recuperer_donnees_incrementales(self, schema, table, champ_suivi, repere, autoriser_xmin = False):
+        '''
+        Renvoie un itérateur sur les lignes de la table dont champ_suivi dépasse le repère (toutes si repère est None), 
+        la valeur de champ_suivi étant ajoutée en fin de ligne
+        '''
+        if champ_suivi == 'xmin' and not autoriser_xmin:
+            raise Exception("Le suivi par xmin n'est pas fiable au-delà de 4 milliards de transactions : "
+                            "voir exporter_table_vers_csv_incremental (autoriser_xmin).")
+        expression = 'xmin::text::bigint' if champ_suivi == 'xmin' else champ_suivi
+        select = 'SELECT *, {0} FROM {1}.{2}'.format(expression, schema, table)
+        if repere is None:
+            return self.execution_et_recuperation_iterateur(select + ';')
+        return self.execution_et_recuperation_iterateur(select + ' WHERE {0} > %s;'.format(expression), parametres = (repere,))
+    
+    def _suivre_repere(self, lignes, suivi):
+        '''
+        Générateur renvoyant les lignes sans leur dernière valeur (celle de champ_suivi), 
+        dont le maximum et le nombre de lignes sont reportés dans le dictionnaire suivi
+        '''
+        for ligne in lignes:
+            valeur = ligne[-1]
+            if suivi['repere'] is None or (valeur is not None and valeur > suivi['repere']):
+                suivi['repere'] = valeur
+            suivi['nb'] += 1
+            yield ligne[:-1]
+    
+    def _remplacer_dans_sqlite(self, donnees, sqlite, nom_table_sqlite, champs, champs_clef):
+        '''
+        Insère les données par paquets, après suppression des lignes de même clef déjà présentes
+        '''
+        noms = [nom for position, nom, type in champs]
+        positions = [noms.index(nom) for nom in champs_clef]
+        condition = ' AND '.join(['{0} = ?'.format(nom) for nom in champs_clef])
+        sqlite.connection.execute('CREATE INDEX IF NOT EXISTS {0}_clef ON {0} ({1});'.format(nom_table_sqlite, ', '.join(champs_clef)))
+        suppression = 'DELETE FROM {0} WHERE {1};'.format(nom_table_sqlite, condition)
+        donnees = iter(donnees)
+        lot = list(islice(donnees, self.ITERSIZE))
+        while lot:
+            sqlite.execute_many(suppression, [tuple(ligne[i] for i in positions) for ligne in lot], validation = False)
+            self._inserer_donnees_dans_sqlite(lot, sqlite, nom_table_sqlite, len(champs))
+            lot = list(islice(donnees, self.ITERSIZE))
+    
+    '''
+    EXPORT PARALLELE
+    '''
+    
+    def exporter_table_vers_csv_parallele(self, schema, table, fichier_csv, delimiteur = '|', nb_processus = 4, champ_decoupage = None, fusionner = True):
+        '''
+        Exporte la table dans le fichier csv en la découpant en nb_processus tranches lues simultanément 
+        sur autant de connexions (COPY ... TO STDOUT).
+        
+        Le découpage se fait sur champ_decoupage s'il est spécifié, sinon sur la clef primaire si elle 
+        est composée d'un seul champ, sinon sur les blocs physiques de la table (ctid, à partir de PostgreSQL 14 : 
+        la table est lue d'un seul tenant sur les versions antérieures).
+        Toutes les tranches sont lues dans le même instantané (pg_export_snapshot) : l'export reste cohérent 
+        si la table est modifiée pendant son déroulement.
+        Si fusionner est à True, les tranches sont concaténées dans l'ordre dans fichier_csv, sinon elles 
+        sont conservées dans les fichiers fichier_csv.000, fichier_csv.001, etc. (chacun avec une entête).
+        Renvoie la liste des fichiers produits.
+        Avec un pool, celui-ci doit pouvoir fournir nb_processus + 2 connexions (voir _verifier_taille_pool).
+        '''
+        self._verifier_taille_pool(nb_processus)
+        conditions = self._decouper_table(schema, table, nb_processus, champ_decoupage)
+        fichiers = ['{0}.{1:03d}'.format(fichier_csv, i) for i in range(len(conditions))]
+        
+        def exporter_tranche(i):
+            select = 'SELECT * FROM {0}.{1} WHERE {2}'.format(schema, table, conditions[i])
+            with self.connexion_supplementaire() as pgconn:
+                pgconn.importer_instantane(instantane)
+                pgconn.copy_to_csv(select, fichiers[i], delimiteur, entete = (i == 0 or not fusionner), fin_de_ligne = '\r\n')
+        
+        try:
+            with self._instantane_partage() as instantane:
+                with ThreadPoolExecutor(max_workers = nb_processus) as executeur:
+                    list(executeur.map(exporter_tranche, range(len(conditions))))
+        except Exception:
+            self._supprimer_fichiers(fichiers)
+            raise
+        if not fusionner:
+            return fichiers
+        with open(fichier_csv, 'wb') as sortie:
+            for fichier in fichiers:
+                with open(fichier, 'rb') as tranche:
+                    shutil.copyfileobj(tranche, sortie)
+        self._supprimer_fichiers(fichiers)
+        return [fichier_csv]
+    
+    def exporter_table_vers_sqlite_parallele(self, schema, table, nom_bdd_sqlite, nom_table_sqlite, recreer_table = True, nb_processus = 4, champ_decoupage = None):
+        '''
+        Insère les données de la table PostgreSQL dans la table d'une base sqlite en lisant nb_processus 
+        tranches de la table simultanément (voir exporter_table_vers_csv_parallele pour le découpage).
+        
+        Les lignes sont lues par paquets via des curseurs côté serveur et insérées au fil de l'eau 
+        par une seule connexion sqlite ; l'ordre des lignes n'est pas conservé. 
+        Comme pour l'export csv, toutes les tranches sont lues dans le même instantané.
+        '''
+        self._verifier_taille_pool(nb_processus)
+        champs = self.lister_champs(schema, table)
+        conditions = self._decouper_table(schema, table, nb_processus, champ_decoupage)
+        file_lots = queue.Queue(maxsize = 2 * nb_processus)
+        arret = threading.Event()
+        
+        def deposer(element):
+            while not arret.is_set():
+                try:
+                    file_lots.put(element, timeout = 0.5)
+                    return
+                except queue.Full:
+                    pass
+        
+        def lire_tranche(condition):
+            try:
+                select = 'SELECT * FROM {0}.{1} WHERE {2}'.format(schema, table, condition)
+                with self.connexion_supplementaire() as pgconn:
+                    pgconn.importer_instantane(instantane)
+                    lot = []
+                    for ligne in pgconn.execute_recupere_iterateur(select, self.ITERSIZE):
+                        lot.append(ligne)
+                        if len(lot) == self.ITERSIZE:
+                            deposer(lot)
+                            lot = []
+                            if arret.is_set():
+                                return
+                    deposer(lot)
+            except Exception as e:
+                deposer(e)
+            finally:
+                deposer(None)
+        
+        with self._instantane_partage() as instantane:
+            with ThreadPoolExecutor(max_workers = nb_processus) as executeur:
+                for condition in conditions:
+                    executeur.submit(lire_tranche, condition)
+                try:
+                    lots = self._lots_de_la_file(file_lots, len(conditions))
+                    donnees = (ligne for lot in lots for ligne in lot)
+                    self._charger_table_sqlite(donnees, nom_bdd_sqlite, nom_table_sqlite, champs, recreer_table)
+                finally:
+                    arret.set()
+    
+    def _verifier_taille_pool(self, nb_processus):
+        '''
+        Lève une exception si le pool de l'objet ne peut fournir simultanément sa connexion, celle de l'instantané partagé 
+        et celles des nb_processus lectures : les lectures attendraient sinon une connexion jusqu'à l'expiration du délai.
+        '''
+        if self.pool is not None and nb_processus + 2 > self.pool.max_connexions:
+            raise Exception("Le pool de connexions ({0} au plus) est trop petit pour {1} processus : {2} connexions sont nécessaires."
+                            .format(self.pool.max_connexions, nb_processus, nb_processus + 2))
+    
+    @contextmanager
+    def _instantane_partage(self):
+        '''
+        Fournit, le temps du bloc, l'instantané d'une transaction maintenue ouverte sur une connexion supplémentaire, 
+        à adopter par les connexions lisant les tranches (PgConn.importer_instantane).
+        '''
+        with self.connexion_supplementaire() as pgconn:
+            instantane = pgconn.exporter_instantane()
+            try:
+                yield instantane
+            finally:
+                pgconn.connection.rollback()
+    
+    def _lots_de_la_file(self, file_lots, nb_producteurs):
+        '''
+        Générateur renvoyant les lots déposés dans la file jusqu'à la fin de tous les producteurs.
+        Une exception déposée par un producteur est levée.
+        '''
+        while nb_producteurs > 0:
+            lot = file_lots.get()
+            if lot is None:
+                nb_producteurs -= 1
+            elif isinstance(lot, Exception):
+                raise lot
+            else:
+                yield lot
+    
+    def _decouper_table(self, schema, table, nb_morceaux, champ = None):
+        '''
+        Renvoie une liste de conditions SQL (clauses WHERE) partitionnant la table en au plus nb_morceaux tranches.
+        '''
+        if nb_morceaux < 2:
+            return ['TRUE']
+        if champ is None:
+            clef_primaire = self.lister_champs_clef_primaire(schema, table) or []
+            if len(clef_primaire) == 1:
+                champ = clef_primaire[0]
+        if champ is not None:
+            return self._decouper_table_selon_champ(schema, table, nb_morceaux, champ)
+        return self._decouper_table_selon_blocs(schema, table, nb_morceaux)
+    
+    def _decouper_table_selon_champ(self, schema, table, nb_morceaux, champ):
+        bornes_min_max = self.execution_et_recuperation('SELECT min({0}), max({0}) FROM {1}.{2};'.format(champ, schema, table))
+        if not bornes_min_max or bornes_min_max[0][0] is None:
+            return ['TRUE']
+        minimum, maximum = bornes_min_max[0]
+        if isinstance(minimum, int) and isinstance(maximum, int):
+            pas = max((maximum - minimum + 1) // nb_morceaux, 1)
+            bornes = list(range(minimum + pas, maximum + 1, pas))[:nb_morceaux - 1]
+        else:
+            fractions = ', '.join(str(i / nb_morceaux) for i in range(1, nb_morceaux))
+            requete = 'SELECT DISTINCT unnest(percentile_disc(ARRAY[{0}]) WITHIN GROUP (ORDER BY {1})) AS b FROM {2}.{3} ORDER BY b;'
+            bornes = [b for b, in self.execution_et_recuperation(requete.format(fractions, champ, schema, table)) or []]
+        bornes = [pgsql.Literal(b).as_string(self.pgconn.connection) for b in bornes]
+        inferieures = [None] + bornes
+        superieures = bornes + [None]
+        conditions = []
+        for inf, sup in zip(inferieures, superieures):
+            condition = ' AND '.join(c for c in ['{0} >= {1}'.format(champ, inf) if inf else None, 
+                                                  '{0} < {1}'.format(champ, sup) if sup else None] if c) or 'TRUE'
+            conditions.append(condition)
+        conditions[-1] = '({0} OR {1} IS NULL)'.format(conditions[-1], champ)
+        return conditions
+    
+    def _decouper_table_selon_blocs(self, schema, table, nb_morceaux):
+        '''
+        Découpage sur les intervalles de ctid, lus par un parcours TID Range Scan à partir de PostgreSQL 14 ; 
+        auparavant, chaque tranche parcourrait toute la table : elle est alors lue d'un seul tenant.
+        '''
+        if self.pgconn.connection.server_version < 140000:
+            return ['TRUE']
+        requete = '''SELECT pg_relation_size('{0}.{1}'::regclass) / current_setting('block_size')::integer;'''
+        nb_blocs = self.execution_et_recuperation(requete.format(schema, table))
+        nb_blocs = nb_blocs[0][0] if nb_blocs else 0
+        if nb_blocs < nb_morceaux:
+            return ['TRUE']
+        pas = nb_blocs // nb_morceaux
+        bornes = ["'({0},0)'::tid".format(i * pas) for i in range(1, nb_morceaux)]
+        conditions = ['ctid < ' + bornes[0]]
+        for inf, sup in zip(bornes[:-1], bornes[1:]):
+            conditions.append('ctid >= {0} AND ctid < {1}'.format(inf, sup))
+        conditions.append('ctid >= ' + bornes[-1])
+        return conditions
+    
+    def _supprimer_fichiers(self, fichiers):
+        for fichier in fichiers:
+            if os.path.exists(fichier):
+                os.remove(fichier)
+    
+    '''
+    EXPORT PARQUET
+    '''
+    
+    def exporter_table_vers_parquet(self, schema, table, fichier_parquet, taille_groupe = 100000, compression = 'zstd', limit = None, types = None):
+        '''
+        Exporte la table PostgreSQL dans le fichier parquet (module pyarrow nécessaire).
+        
+        Les lignes sont lues par paquets via un curseur côté serveur et écrites par groupes de taille_groupe 
+        lignes (row groups), la mémoire utilisée restant bornée. compression : 'zstd', 'snappy', 'gzip', 'none'...
+        Les types parquet sont déduits des types PostgreSQL (voir _type_arrow) ; types permet d'imposer 
+        le type pyarrow de certains champs ({nom: type}). Les numeric sont convertis en float64 par défaut.
+        
+        Renvoie le nombre de lignes exportées.
+        '''
+        if pyarrow is None:
+            raise Exception("Le module pyarrow est nécessaire à l'export parquet (pip install pg[parquet]).")
+        champs = self.lister_champs(schema, table)
+        types = types or {}
+        schema_arrow = pyarrow.schema([pyarrow.field(nom, types.get(nom) or self._type_arrow(type)) for position, nom, type in champs])
+        conversions = [self._conversion_arrow(champ.type) for champ in schema_arrow]
+        donnees = self._recuperer_donnees_table_pg(schema, table, limit = limit, iterateur = True)
+        nb = 0
+        with pyarrow.parquet.ParquetWriter(fichier_parquet, schema_arrow, compression = compression) as fichier:
+            donnees = iter(donnees or [])
+            lot = list(islice(donnees, taille_groupe))
+            while lot:
+                colonnes = zip(*lot)
+                tableaux = [pyarrow.array(colonne if conversion is None else [conversion(v) for v in colonne], type = champ.type) 
+                            for colonne, conversion, champ in zip(colonnes, conversions, schema_arrow)]
+                fichier.write_table(pyarrow.Table.from_arrays(tableaux, schema = schema_arrow), row_group_size = taille_groupe)
+                nb += len(lot)
+                lot = list(islice(donnees, taille_groupe))
+        return nb
+    
+    def exporter_requete_vers_parquet(self, sql, fichier_parquet, taille_groupe = 100000, compression = 'zstd', limit = None, types = None):
+        schema, table = self.VUE_TEMPORAIRE.split('.')
+        reussite, nb = self._creer_vue_temporaire(sql)
+        if reussite:
+            return self.exporter_table_vers_parquet(schema, table, fichier_parquet, taille_groupe, compression, limit, types)
+    
+    def _type_arrow(self, type_pg):
+        '''
+        Type pyarrow correspondant au type PostgreSQL renvoyé par lister_champs (texte par défaut)
+        '''
+        type_pg = type_pg.lower()
+        if type_pg.endswith('[]'):
+            return pyarrow.list_(self._type_arrow(type_pg[:-2]))
+        types = {'smallint': pyarrow.int16(),
+                 'integer': pyarrow.int32(),
+                 'bigint': pyarrow.int64(),
+                 'real': pyarrow.float32(),
+                 'double precision': pyarrow.float64(),
+                 'numeric': pyarrow.float64(),
+                 'boolean': pyarrow.bool_(),
+                 'date': pyarrow.date32(),
+                 'timestamp without time zone': pyarrow.timestamp('us'),
+                 'timestamp with time zone': pyarrow.timestamp('us', tz = 'UTC'),
+                 'time without time zone': pyarrow.time64('us'),
+                 'interval': pyarrow.duration('us'),
+                 'bytea': pyarrow.binary()}
+        return types.get(type_pg, pyarrow.string())
+    
+    def _conversion_arrow(self, type_arrow):
+        '''
+        Fonction de conversion des valeurs psycopg2 vers le type pyarrow (None si aucune conversion n'est nécessaire)
+        '''
+        if pyarrow.types.is_list(type_arrow):
+            conversion = self._conversion_arrow(type_arrow.value_type)
+            if conversion is not None:
+                return lambda v: None if v is None else [conversion(x) for x in v]
+            return None
+        if pyarrow.types.is_floating(type_arrow):
+            return lambda v: None if v is None else float(v)
+        if pyarrow.types.is_string(type_arrow):
+            return lambda v: v if v is None or isinstance(v, str) else (json.dumps(v) if isinstance(v, (dict, list)) else str(v))
+        if pyarrow.types.is_binary(type_arrow):
+            return lambda v: None if v is None else bytes(v)
+        return None
+    
     '''
     EXPORT HTML
     '''
                 
-    def exporter_table_vers_html(self, schema, table, fichier_html, support_html = None, limit = None):
-        support = self._definir_support_html(support = support_html)
-        table_html = self._table_pg_vers_table_html(schema, table, limit)
-        html = support.format(table_html)
-        self._ecrire_dans_fichier_html(html, fichier_html)
-    
-    def exporter_requete_vers_html(self, sql, fichier_html, support_html = None, limit = None):
-        support = self._definir_support_html(support = support_html)
-        table_html = self._requete_vers_table_html(sql, limit)
-        html = support.format(table_html)
-        self._ecrire_dans_fichier_html(html, fichier_html)
+    def exporter_table_vers_html(self, schema, table, fichier_html, support_html = None, limit = None, iterateur = True, lignes_par_page = None):
+        '''
+        Exporte la table PostgreSQL dans le fichier html sous forme d'un tableau placé dans support_html 
+        (page html contenant le marqueur {0}, page bootstrap par défaut).
+        
+        Les lignes sont écrites dans le fichier au fil de leur lecture (par paquets via un curseur côté serveur 
+        si iterateur est à True) et les valeurs des cellules sont échappées.
+        Si lignes_par_page est spécifié, le tableau est réparti dans des pages numérotées de lignes_par_page lignes 
+        (export_0001.html, export_0002.html, etc. pour export.html) et fichier_html devient une page d'index 
+        renvoyant vers chacune d'elles.
+        
+        Renvoie le nombre de lignes exportées.
+        '''
+        champs = [nom for position, nom, type in self.lister_champs(schema, table)]
+        donnees = self._recuperer_donnees_table_pg(schema, table, limit = limit, iterateur = iterateur)
+        return self._ecrire_dans_fichier_html(fichier_html, champs, donnees or [], support_html, lignes_par_page)
+    
+    def exporter_requete_vers_html(self, sql, fichier_html, support_html = None, limit = None, iterateur = True, lignes_par_page = None):
+        schema, table = self.VUE_TEMPORAIRE.split('.')
+        reussite, nb = self._creer_vue_temporaire(sql)
+        if reussite:
+            return self.exporter_table_vers_html(schema, table, fichier_html, support_html, limit, iterateur, lignes_par_page)
     
     def _definir_support_html(self, support = None):
         if not support:
@@ -325,42 +1224,91 @@ class PgExport(PgOutils):
             '''
         return support
     
-    def _table_pg_vers_table_html(self, schema, table, limit = None):
+    def _decouper_support_html(self, support = None):
         '''
-        Renvoie le resultat de la requête sous forme d'un tableau html
+        Renvoie les parties du support html situées avant et après l'emplacement du tableau
         '''
-        champs = [nom for position, nom, type in self.lister_champs(schema, table)]
-        donnees = self._recuperer_donnees_table_pg(schema, table, limit = limit)
-        return self._ecrire_tableau_html(champs, donnees)
+        support = self._definir_support_html(support = support).format(self.MARQUEUR_HTML)
+        morceaux = support.split(self.MARQUEUR_HTML, 1)
+        if len(morceaux) != 2:
+            raise Exception("Le support html doit contenir le marqueur {0}.")
+        return morceaux
+    
+    def _ecrire_dans_fichier_html(self, fichier_html, champs, donnees, support_html = None, lignes_par_page = None):
+        avant, apres = self._decouper_support_html(support_html)
+        if lignes_par_page:
+            return self._ecrire_pages_html(fichier_html, champs, donnees, avant, apres, lignes_par_page)
+        with open(fichier_html, 'wt', encoding = 'utf-8') as f:
+            f.write(avant + self._entete_tableau_html(champs))
+            nb = 0
+            for ligne in donnees:
+                f.write(self._ligne_tableau_html(ligne))
+                nb += 1
+            f.write('</table>' + apres)
+        return nb
     
-    def _requete_vers_table_html(self, sql, limit = None):
+    def _ecrire_pages_html(self, fichier_html, champs, donnees, avant, apres, lignes_par_page):
         '''
-        Renvoie le resultat de la requête sous forme d'un tableau html
+        Répartit les lignes dans des pages de lignes_par_page lignes puis écrit la page d'index fichier_html. 
+        Une page n'est terminée (et sa navigation écrite) qu'à l'arrivée de la ligne suivante ou en fin de données.
         '''
-        schema, table = self.VUE_TEMPORAIRE.split('.')
-        reussite, nb = self._creer_vue_temporaire(sql)
-        if reussite:
-            return self._table_pg_vers_table_html(schema, table, limit = limit)        
-    
-    def _ecrire_tableau_html(self, champs, donnees):
-        tableau_html = '<table class = "table table-condensed table-striped">\n'
-        # entete
-        tableau_html += '\t<tr>\n'
-        for nom_champ in champs:                
-            tableau_html += '\t\t<th>' + str(nom_champ) + '</th>\n'
-        tableau_html += '\t</tr>\n'
-        # corps
-        for ligne in donnees:
-            tableau_html += '\t<tr>\n'            
-            for elt in ligne:
-                tableau_html += '\t\t<td>' + str(elt) + '</td>\n'
-            tableau_html += '\t</tr>\n'        
-        tableau_html += '</table>'
-        return tableau_html
-    
-    def _ecrire_dans_fichier_html(self, html, fichier_html):
-        with open(fichier_html, 'wt',encoding="utf-8") as f:
-            f.write(html)
+        racine, extension = os.path.splitext(fichier_html)
+        entete = self._entete_tableau_html(champs)
+        pages = [] # [fichier, première ligne, dernière ligne]
+        f = None
+        nb = 0
+        try:
+            for ligne in donnees:
+                if nb % lignes_par_page == 0:
+                    if f:
+                        self._terminer_page_html(f, apres, fichier_html, pages, derniere = False)
+                    fichier_page = '{0}_{1:04d}{2}'.format(racine, len(pages) + 1, extension)
+                    pages.append([fichier_page, nb + 1, nb])
+                    f = open(fichier_page, 'wt', encoding = 'utf-8')
+                    f.write(avant + entete)
+                f.write(self._ligne_tableau_html(ligne))
+                nb += 1
+                pages[-1][2] = nb
+            if not f:
+                fichier_page = '{0}_{1:04d}{2}'.format(racine, 1, extension)
+                pages.append([fichier_page, 0, 0])
+                f = open(fichier_page, 'wt', encoding = 'utf-8')
+                f.write(avant + entete)
+            self._terminer_page_html(f, apres, fichier_html, pages, derniere = True)
+        finally:
+            if f:
+                f.close()
+        with open(fichier_html, 'wt', encoding = 'utf-8') as f:
+            f.write(avant + self._index_pages_html(pages) + apres)
+        return nb
+    
+    def _terminer_page_html(self, f, apres, fichier_html, pages, derniere):
+        numero = len(pages)
+        liens = ['<li><a href="{0}">Index</a></li>'.format(escape(os.path.basename(fichier_html)))]
+        if numero > 1:
+            liens.insert(0, '<li class="previous"><a href="{0}">Page précédente</a></li>'.format(escape(os.path.basename(pages[-2][0]))))
+        if not derniere:
+            # la page suivante n'existe pas encore : son nom est déduit de celui de la page courante
+            racine, extension = os.path.splitext(fichier_html)
+            suivante = '{0}_{1:04d}{2}'.format(racine, numero + 1, extension)
+            liens.append('<li class="next"><a href="{0}">Page suivante</a></li>'.format(escape(os.path.basename(suivante))))
+        f.write('</table>\n<ul class="pager">' + ''.join(liens) + '</ul>' + apres)
+        f.close()
+    
+    def _index_pages_html(self, pages):
+        index = '<table class = "table table-condensed table-striped">\n\t<tr>\n\t\t<th>Page</th>\n\t\t<th>Lignes</th>\n\t</tr>\n'
+        for numero, (fichier_page, premiere, derniere) in enumerate(pages, 1):
+            index += '\t<tr>\n\t\t<td><a href="{0}">{1}</a></td>\n\t\t<td>{2} - {3}</td>\n\t</tr>\n'.format(
+                escape(os.path.basename(fichier_page)), numero, premiere, derniere)
+        return index + '</table>'
+    
+    def _entete_tableau_html(self, champs):
+        return ('<table class = "table table-condensed table-striped">\n\t<tr>\n' 
+                + ''.join(['\t\t<th>' + escape(str(nom_champ)) + '</th>\n' for nom_champ in champs]) 
+                + '\t</tr>\n')
+    
+    def _ligne_tableau_html(self, ligne):
+        return '\t<tr>\n' + ''.join(['\t\t<td>' + escape(str(elt)) + '</td>\n' for elt in ligne]) + '\t</tr>\n'
             
 class PgImport(PgOutils):
     
@@ -368,14 +1316,25 @@ class PgImport(PgOutils):
     Classe permettant d'importer des tables dans PostgreSQL depuis d'autres formats (sqlite, csv, etc.)
     '''
         
-    def __init__(self, hote=None, base=None, port=None, utilisateur=None, motdepasse=None):
-        super().__init__(hote, base, port, utilisateur, motdepasse)
+    def __init__(self, hote=None, base=None, port=None, utilisateur=None, motdepasse=None, pool=None):
+        super().__init__(hote, base, port, utilisateur, motdepasse, pool=pool)
     
-    def importer_table_depuis_sqlite(self, fichier_sqlite, table_sqlite, schema, table):
+    def importer_table_depuis_sqlite(self, fichier_sqlite, table_sqlite, schema, table, methode = 'copy'):
+        '''
+        Importe la table sqlite dans la table PostgreSQL (recréée).
+        
+        Les lignes sont lues par paquets dans sqlite et transmises au fil de l'eau :
+        - par COPY ... FROM STDIN si methode vaut 'copy' (par défaut)
+        - par des INSERT multi-lignes (VALUES) si methode vaut 'values'
+        Renvoie True si l'import a réussi ainsi que le nombre de lignes importées (-1 en cas d'échec).
+        '''
         s = SqliteConn(fichier_sqlite)
-        self._creer_table_pg(fichier_sqlite, table_sqlite, schema, table, s)        
-        donnees = self._recuperer_donnees_sqlite(table_sqlite, s)
-        self._inserer_donnees_dans_postgres(donnees, schema, table)
+        try:
+            self._creer_table_pg(fichier_sqlite, table_sqlite, schema, table, s)        
+            donnees = self._recuperer_donnees_sqlite(table_sqlite, s)
+            return self._inserer_donnees_dans_postgres(donnees, schema, table, methode)
+        finally:
+            s.deconnection_sqlite()
     
     def _creer_table_pg(self, fichier_sqlite, table_sqlite, schema, table, s):
         self.creer_schema_si_inexistant(schema)
@@ -388,16 +1347,18 @@ class PgImport(PgOutils):
     
     def _recuperer_donnees_sqlite(self, table_sqlite, s):
         select = '''SELECT * FROM {0};'''.format(table_sqlite)
-        donnees = s.execute_recupere(select)
-        return donnees
+        return s.execute_recupere_iterateur(select, self.ITERSIZE)
 
-    def _inserer_donnees_dans_postgres(self, donnees, schema, table):
-        insert = 'INSERT INTO {0} VALUES ({1});'.format(schema + '.' + table, ', '.join(['%s']*len(donnees[0])))
-        self.execution_multiple(insert, donnees)
+    def _inserer_donnees_dans_postgres(self, donnees, schema, table, methode = 'copy'):
+        if methode == 'values':
+            insert = 'INSERT INTO {0} VALUES %s;'.format(schema + '.' + table)
+            return self.execution_valeurs(insert, donnees, self.ITERSIZE)
+        return self.execution_copy(donnees, schema + '.' + table)
         
     def importer_table_depuis_csv(self, fichier_csv, schema, table, separateur):
         lignes = self.pgconn._lire_lignes_csv(fichier_csv)
         entete = [elt.strip() for elt in next(lignes).split(separateur)]
+        lignes.close()
         self.effacer_table(schema, table)
         champs = ' TEXT, '.join(entete) + ' TEXT'        
         create_table = '''CREATE TABLE {0}.{1} ({2});'''.format(schema, table, champs)
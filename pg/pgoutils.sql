@@ -4,6 +4,13 @@ SET search_path TO {0}, public;
 ## EFFACER_SCHEMA
 DROP SCHEMA IF EXISTS {0} CASCADE;
 
+## EFFACER_LOT_DE_SCHEMAS
+DROP SCHEMA IF EXISTS {0} CASCADE;
+
+## EFFACER_ET_CREER_LOT_DE_SCHEMAS
+DROP SCHEMA IF EXISTS {0} CASCADE;
+{1}
+
 ## CREER_SCHEMA 
 CREATE SCHEMA {0};
 
@@ -13,6 +20,15 @@ CREATE SCHEMA IF NOT EXISTS {0};
 ## EFFACER_TABLE
 DROP TABLE IF EXISTS {0}.{1} CASCADE;
 
+## EFFACER_LOT_DE_TABLES
+DROP TABLE IF EXISTS {1} CASCADE;
+
+## CREER_TABLE
+CREATE TABLE {0}.{1} 
+(
+{2}
+);
+
 ## RENOMMER_TABLE
 ALTER TABLE {0}.{1} RENAME To {2};
 
@@ -27,23 +43,23 @@ FROM pg_catalog.pg_namespace
 ## LISTER_SCHEMAS_COMMENCANT_PAR 
 SELECT nspname
 FROM pg_catalog.pg_namespace 
-WHERE nspname LIKE '{0}%';
+WHERE nspname LIKE {0!v} || '%';
 
 ## LISTER_SCHEMAS_CONTENANT 
 SELECT nspname
 FROM pg_catalog.pg_namespace 
-WHERE nspname LIKE '%{0}%';
+WHERE nspname LIKE '%' || {0!v} || '%';
 
 ## LISTER_TABLES
 SELECT tablename 
 FROM pg_tables 
-WHERE schemaname = '{0}';
+WHERE schemaname = {0!v};
 
 ## LISTER_TABLES_COMMENCANT_PAR 
 SELECT tablename 
 FROM pg_tables 
-WHERE schemaname = '{0}' 
-AND tablename LIKE '{1}%';
+WHERE schemaname = {0!v} 
+AND tablename LIKE {1!v} || '%';
 
 ## LISTER_CHAMPS
 SELECT 
@@ -63,10 +79,17 @@ SELECT
 		ELSE data_type 
 	END AS typ
 FROM information_schema.columns
-WHERE table_schema = '{0}'
-AND table_name = '{1}'
+WHERE table_schema = {0!v}
+AND table_name = {1!v}
 ORDER BY ordinal_position;
 
+## LISTER_CHAMPS_CLEF_PRIMAIRE
+SELECT a.attname
+FROM pg_index i
+JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = ANY(i.indkey)
+WHERE i.indrelid = ({0!v} || '.' || {1!v})::regclass
+AND i.indisprimary;
+
 ## AJOUTER_CLEF_PRIMAIRE
 ALTER TABLE {0}.{1} 
 ADD CONSTRAINT {1}_pkey PRIMARY KEY ({2});
@@ -80,10 +103,10 @@ ALTER TABLE {0}.{1}
 ADD CONSTRAINT {1}_check CHECK ({2});
 
 ## AJOUTER_COMMENTAIRE_SUR_CHAMP
-COMMENT ON COLUMN {0}.{1}.{2} IS '{3}';
+COMMENT ON COLUMN {0}.{1}.{2} IS {3!v};
 
 ## AJOUTER_COMMENTAIRE_SUR_TABLE
-COMMENT ON TABLE {0}.{1} IS '{2}';
+COMMENT ON TABLE {0}.{1} IS {2!v};
 
 ## COPIER_TABLE
 DROP TABLE IF EXISTS {2}.{3} CASCADE;
@@ -107,13 +130,13 @@ CREATE EXTENSION IF NOT EXISTS postgres_fdw;
 ## CREER_SERVEUR_DISTANT_FDW
 CREATE SERVER {3}
 FOREIGN DATA WRAPPER postgres_fdw 
-OPTIONS (host '{0}', dbname '{1}', port '{2}');
+OPTIONS (host {0!v}, dbname {1!v}, port {2!v});
 
 ## EFFACER_SERVEUR_DISTANT_FDW
 DROP SERVER IF EXISTS {0} CASCADE;
 
 ## CREER_USER_MAPPING_POUR_SERVEUR_DISTANT_FDW
-CREATE USER MAPPING FOR CURRENT_USER SERVER {1} OPTIONS (user '{0}', password '{2}');
+CREATE USER MAPPING FOR CURRENT_USER SERVER {1} OPTIONS (user {0!v}, password {2!v});
 
 ## EFFACER_USER_MAPPING_POUR_SERVEUR_DISTANT_FDW
 DROP USER MAPPING IF EXISTS FOR CURRENT_USER SERVER {1};
@@ -126,7 +149,18 @@ CREATE FOREIGN TABLE {0}.{1}
 (
 {4}    
 )SERVER {5}
-OPTIONS (schema_name '{2}', table_name '{3}')
+OPTIONS (schema_name {2!v}, table_name {3!v})
+
+## IMPORTER_SCHEMA_ETRANGER
+IMPORT FOREIGN SCHEMA {0} {3}
+FROM SERVER {1} INTO {2};
+
+## LISTER_TABLES_ETRANGERES
+SELECT c.relname 
+FROM pg_class c 
+JOIN pg_namespace n ON n.oid = c.relnamespace 
+WHERE n.nspname = {0!v} AND c.relkind = 'f'
+ORDER BY c.relname;
 
 ## CREER_FONCTION_ARRAY_SUPPRIMER_NULL
 CREATE OR REPLACE FUNCTION array_supprimer_null(numlot VARCHAR[])
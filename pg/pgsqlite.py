@@ -3,11 +3,17 @@
 '''
 
 import sqlite3
+from contextlib import contextmanager
    
 class SqliteConn():
     '''
     Classe permettant de se connecter à une base sqlite, à y effectuer des requêtes
     '''
+    
+    PRAGMAS_CHARGEMENT_MASSIF = {'journal_mode': 'MEMORY', 
+                                 'synchronous': 'OFF', 
+                                 'cache_size': -200000, 
+                                 'page_size': 65536}
 
     def __init__(self, nom_bdd, connection_directe = True):
         '''
@@ -61,10 +67,13 @@ class SqliteConn():
         self.connection.commit()
         return nb_ligne_affectee
     
-    def execute_many(self, sql, donnees):
+    def execute_many(self, sql, donnees, validation = True):
         '''
         Execute la requete sql et la soumet au serveur, 
         Renvoie également le nombre de lignes modifiés en fonction du type de requete.
+        
+        donnees peut être un itérable quelconque (générateur), parcouru au fil de l'eau.
+        Si validation est à False, la transaction en cours n'est pas validée.
         '''
         nb_ligne_affectee = -1
         if not self.conn_actif:
@@ -72,9 +81,54 @@ class SqliteConn():
         curseur = self.connection.cursor() 
         curseur.executemany(sql, donnees)
         nb_ligne_affectee = curseur.rowcount            
-        self.connection.commit()
+        if validation:
+            self.connection.commit()
         return nb_ligne_affectee    
     
+    def lire_pragma(self, nom):
+        '''
+        Renvoie la valeur courante du pragma
+        '''
+        if not self.conn_actif:
+            self.connection_sqlite()
+        return self.connection.execute('PRAGMA {0};'.format(nom)).fetchone()[0]
+    
+    def appliquer_pragmas(self, pragmas):
+        '''
+        Applique les pragmas définis dans le dictionnaire {nom: valeur}
+        '''
+        if not self.conn_actif:
+            self.connection_sqlite()
+        for nom, valeur in pragmas.items():
+            self.connection.execute('PRAGMA {0} = {1};'.format(nom, valeur))
+    
+    @contextmanager
+    def chargement_massif(self, pragmas = None):
+        '''
+        Gestionnaire de contexte pour les chargements volumineux :
+        - applique les pragmas de PRAGMAS_CHARGEMENT_MASSIF (complétés ou remplacés par pragmas)
+        - ouvre une transaction unique, validée en sortie ou annulée en cas d'erreur
+        - restaure ensuite les valeurs initiales des pragmas
+        
+        page_size n'a d'effet que sur une base encore vide.
+        '''
+        pragmas = dict(self.PRAGMAS_CHARGEMENT_MASSIF, **(pragmas or {}))
+        if not self.conn_actif:
+            self.connection_sqlite()
+        if self.connection.in_transaction:
+            self.connection.commit()
+        initiaux = {nom: self.lire_pragma(nom) for nom in pragmas if nom != 'page_size'}
+        self.appliquer_pragmas(pragmas)
+        try:
+            self.connection.execute('BEGIN;')
+            yield self
+            self.connection.commit()
+        except BaseException:
+            self.connection.rollback()
+            raise
+        finally:
+            self.appliquer_pragmas(initiaux)
+    
     def execute_recupere(self, sql):
         '''
         Execute la requete sql (SELECT) et renvoie le resultat dans une liste de tuple
@@ -85,5 +139,20 @@ class SqliteConn():
         curseur.execute(sql)        
         return curseur.fetchall()
     
+    def execute_recupere_iterateur(self, sql, taille_lot = 2000):
+        '''
+        Execute la requete sql (SELECT) et renvoie un générateur sur les tuples du résultat, 
+        lus par paquets de taille_lot lignes
+        '''
+        if not self.conn_actif:
+            self.connection_sqlite()
+        curseur = self.connection.cursor()
+        curseur.execute(sql)
+        lot = curseur.fetchmany(taille_lot)
+        while lot:
+            yield from lot
+            lot = curseur.fetchmany(taille_lot)
+        curseur.close()
+    
     def recuperer_requete_creation_table(self, table):
         return self.execute_recupere('''SELECT sql FROM sqlite_master WHERE tbl_name = '{0}';'''.format(table))[0][0]
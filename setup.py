@@ -28,6 +28,7 @@ setup(
     package_data = {'pg': ['*.sql']},
     include_package_data=True,
     install_requires=['psycopg2>=2.6.1'],
+    extras_require={'parquet': ['pyarrow>=1.0']},
 )
 
 # eof
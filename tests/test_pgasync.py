@@ -0,0 +1,150 @@
+'''
+@author: antoine.herman
+'''
+import unittest
+import asyncio
+import time
+import os
+import psycopg2
+from pg.pgbasics import *
+from pg.pgasync import AsyncPgConn, AsyncPgOutils, AsyncPgPool, AsyncPgExport, AsyncPgImport
+
+hote = 'localhost'
+bdd = 'test_pg'
+utilisateur = 'postgres'
+mdp = 'postgres'
+port = '5432'
+
+class TestAsyncPgOutils(unittest.TestCase):
+    
+    @classmethod
+    def setUpClass(cls):
+        os.system('''psql -h {0} -p {1} -U {2} -c "CREATE DATABASE {3};"'''.format(hote, port, utilisateur, bdd))
+        pgoutils = PgOutils(hote, bdd, port, utilisateur, mdp)
+        pgoutils.execution('CREATE TABLE public.test_async (id integer, nom text);')
+        pgoutils.execution('INSERT INTO public.test_async SELECT i, \'nom\' || i FROM generate_series(1, 100) i;')
+        for i in range(4):
+            pgoutils.creer_schema('schema_async_' + str(i))
+        pgoutils.deconnecter()
+    
+    @classmethod
+    def tearDownClass(cls):
+        os.system('''psql -h {0} -p {1} -U {2} -c "DROP DATABASE {3};"'''.format(hote, port, utilisateur, bdd))
+        for fichier in ['test_async.csv', 'test_async.sqlite3']:
+            if os.path.exists(fichier):
+                os.remove(fichier)
+    
+    def executer(self, coroutine):
+        return asyncio.run(coroutine)
+    
+    def test_les_methodes_des_gabarits_renvoient_les_memes_resultats_que_pgoutils(self):
+        async def lister():
+            async with AsyncPgOutils(hote, bdd, port, utilisateur, mdp) as pgoutils:
+                return await pgoutils.lister_schemas_commencant_par('schema_async'), await pgoutils.compter('public', 'test_async')
+        schemas, nb = self.executer(lister())
+        pgoutils = PgOutils(hote, bdd, port, utilisateur, mdp)
+        self.assertEqual(schemas, pgoutils.lister_schemas_commencant_par('schema_async'))
+        self.assertEqual(nb, 100)
+        pgoutils.deconnecter()
+    
+    def test_execution_et_recuperation_iterateur_renvoie_toutes_les_lignes(self):
+        async def parcourir():
+            async with AsyncPgOutils(hote, bdd, port, utilisateur, mdp) as pgoutils:
+                lignes = await pgoutils.execution_et_recuperation_iterateur('SELECT * FROM public.test_async ORDER BY id;', itersize = 7)
+                return [ligne async for ligne in lignes]
+        lignes = self.executer(parcourir())
+        self.assertEqual(len(lignes), 100)
+        self.assertEqual(lignes[0], (1, 'nom1'))
+    
+    def test_les_methodes_champ_unique_renvoient_un_iterateur_asynchrone(self):
+        async def lister():
+            async with AsyncPgOutils(hote, bdd, port, utilisateur, mdp) as pgoutils:
+                schemas = await pgoutils.lister_schemas_commencant_par('schema_async', iterateur = True)
+                return sorted([schema async for schema in schemas])
+        self.assertEqual(self.executer(lister()), ['schema_async_' + str(i) for i in range(4)])
+    
+    def test_execution_et_recuperation_renvoie_None_en_cas_echec(self):
+        async def echouer():
+            async with AsyncPgOutils(hote, bdd, port, utilisateur, mdp) as pgoutils:
+                return await pgoutils.execution_et_recuperation('SELECT * FROM table_inexistante;')
+        self.assertIsNone(self.executer(echouer()))
+    
+    def test_echec_de_connexion_leve_l_erreur_et_ferme_la_connexion(self):
+        pgconn = AsyncPgConn(hote, 'base_inexistante', port, utilisateur, mdp)
+        with self.assertRaises(psycopg2.OperationalError):
+            self.executer(pgconn.connection_postgres())
+        self.assertIsNone(pgconn.connection)
+        self.assertFalse(pgconn.conn_actif)
+        pgoutils = AsyncPgOutils(hote, 'base_inexistante', port, utilisateur, mdp)
+        with self.assertLogs('pg.pgasync', level = 'WARNING') as journal:
+            self.assertEqual(self.executer(pgoutils.execution('SELECT 1;', max_tentative = 1)), (False, -1))
+        self.assertIn('base_inexistante', journal.output[0])
+    
+    def test_les_copies_simultanees_sur_une_connexion_sont_executees_l_une_apres_l_autre(self):
+        async def copier():
+            pgconn = AsyncPgConn(hote, bdd, port, utilisateur, mdp)
+            await pgconn.execute_commit('CREATE TABLE public.test_async_copie (id integer);')
+            try:
+                nbs = await asyncio.gather(*[pgconn.copy_from_lignes([(i,) for i in range(1000)], 'public.test_async_copie') for j in range(4)])
+                return nbs, await pgconn.execute_recupere('SELECT count(*) FROM public.test_async_copie;')
+            finally:
+                await pgconn.execute_commit('DROP TABLE public.test_async_copie;')
+                pgconn.deconnection_postgres()
+        self.assertEqual(self.executer(copier()), ([1000] * 4, [(4000,)]))
+    
+    def test_execution_copy_et_execution_valeurs(self):
+        async def inserer():
+            async with AsyncPgOutils(hote, bdd, port, utilisateur, mdp) as pgoutils:
+                await pgoutils.execution('CREATE TABLE public.test_async_lignes (id integer, nom text);')
+                try:
+                    copie = await pgoutils.execution_copy([(1, 'nom1'), (2, None)], 'public.test_async_lignes')
+                    valeurs = await pgoutils.execution_valeurs('INSERT INTO public.test_async_lignes VALUES %s;', 
+                                                               iter([(3, 'nom3'), (4, 'nom4'), (5, 'nom5')]), taille_lot = 2)
+                    echec = await pgoutils.execution_copy(iter([(6, 'nom6'), ('sept', 'nom7')]), 'public.test_async_lignes')
+                    lignes = await pgoutils.execution_et_recuperation('SELECT * FROM public.test_async_lignes ORDER BY id;')
+                    return copie, valeurs, echec, lignes
+                finally:
+                    await pgoutils.execution('DROP TABLE public.test_async_lignes;')
+        copie, valeurs, echec, lignes = self.executer(inserer())
+        self.assertEqual(copie, (True, 2))
+        self.assertEqual(valeurs, (True, 3))
+        self.assertEqual(echec, (False, -1))
+        self.assertEqual([ligne[0] for ligne in lignes], [1, 2, 3, 4, 5])
+        self.assertEqual(lignes[1], (2, None))
+    
+    def test_les_operations_sur_pool_sont_simultanees(self):
+        async def lister():
+            pool = AsyncPgPool(hote, bdd, port, utilisateur, mdp, max_connexions = 4)
+            pgoutils = AsyncPgOutils(pool = pool)
+            schemas = ['schema_async_' + str(i) for i in range(4)]
+            debut = time.monotonic()
+            await pgoutils.executer_simultanement(*[pgoutils.execution('SELECT pg_sleep(0.5);') for schema in schemas])
+            duree = time.monotonic() - debut
+            tables = await pgoutils.lister_tables_des_schemas(schemas)
+            pool.fermer()
+            return duree, tables
+        duree, tables = self.executer(lister())
+        self.assertLess(duree, 1.5)
+        self.assertEqual(tables, {'schema_async_' + str(i): [] for i in range(4)})
+    
+    def test_export_csv_et_sqlite(self):
+        async def exporter():
+            async with AsyncPgExport(hote, bdd, port, utilisateur, mdp) as pgexport:
+                await pgexport.exporter_table_vers_csv('public', 'test_async', 'test_async.csv')
+                return await pgexport.exporter_table_vers_sqlite('public', 'test_async', 'test_async.sqlite3', 'test_async')
+        nb = self.executer(exporter())
+        self.assertEqual(nb, 100)
+        with open('test_async.csv', 'r', encoding = 'utf-8') as f:
+            self.assertEqual(len(f.readlines()), 101)
+    
+    def test_import_sqlite(self):
+        async def importer():
+            async with AsyncPgExport(hote, bdd, port, utilisateur, mdp) as pgexport:
+                await pgexport.exporter_table_vers_sqlite('public', 'test_async', 'test_async.sqlite3', 'test_async')
+            async with AsyncPgImport(hote, bdd, port, utilisateur, mdp) as pgimport:
+                reussite, nb = await pgimport.importer_table_depuis_sqlite('test_async.sqlite3', 'test_async', 'public', 'test_async_import')
+                return nb, await pgimport.compter('public', 'test_async_import')
+        self.assertEqual(self.executer(importer()), (100, 100))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,7 +3,10 @@
 '''
 import unittest
 import psycopg2
+import psycopg2.errors
 import os
+import threading
+import time
 from pg.pgbasics import *
 
 hote = 'localhost'
@@ -98,6 +101,107 @@ class TestPgConn(unittest.TestCase):
         pgconn = PgConn(hote, bdd, port, utilisateur, mdp)
         self.assertRaises(Exception, pgconn.execute_recupere, '''SELECT test ERREUR DE FRAPPE FROM test;''')
         
+    def test_execute_recupere_iterateur_renvoie_les_tuples_par_paquets(self):
+        pgconn = PgConn(hote, bdd, port, utilisateur, mdp)
+        nb = pgconn.execute_commit('''CREATE TABLE test (id serial, nom text);''')
+        nb = pgconn.execute_commit('''INSERT INTO test (nom) VALUES('Nom1'), ('Nom2'), ('Nom3');''')
+        resultat = pgconn.execute_recupere_iterateur('''SELECT * FROM test ORDER BY id;''', itersize = 2)
+        self.assertNotEqual(type(resultat), type(list()))
+        self.assertEqual(list(resultat), [(1, 'Nom1'), (2, 'Nom2'), (3, 'Nom3')])
+        nb = pgconn.execute_commit('''DROP TABLE test;''')
+    
+    def test_execute_recupere_iterateur_est_mesure_en_fin_de_parcours(self):
+        pgconn = PgConn(hote, bdd, port, utilisateur, mdp)
+        pgconn.instrumentation = Instrumentation(seuil_requete_lente = None)
+        resultat = pgconn.execute_recupere_iterateur('''SELECT generate_series(1, 5);''', itersize = 2)
+        self.assertEqual(len(list(resultat)), 5)
+        statistiques = pgconn.instrumentation.statistiques()['execute_recupere_iterateur']
+        self.assertEqual((statistiques['nb'], statistiques['lignes']), (1, 5))
+    
+    def test_execute_recupere_iterateur_echoue_si_erreur_requete(self):
+        pgconn = PgConn(hote, bdd, port, utilisateur, mdp)
+        resultat = pgconn.execute_recupere_iterateur('''SELECT test ERREUR DE FRAPPE FROM test;''')
+        self.assertRaises(Exception, list, resultat)
+        
+    def test_requete_preparee_reste_valide_apres_modification_de_structure(self):
+        pgconn = PgConn(hote, bdd, port, utilisateur, mdp)
+        nb = pgconn.execute_commit('''CREATE TABLE test (id integer, nom text);''')
+        nb = pgconn.execute_commit('''INSERT INTO test VALUES (1, 'Nom1');''')
+        for i in range(PgConn.SEUIL_PREPARATION + 1):
+            self.assertEqual(pgconn.execute_recupere('''SELECT * FROM test WHERE id = %s;''', (1,)), [(1, 'Nom1')])
+        nb = pgconn.execute_commit('''ALTER TABLE test ADD COLUMN age integer;''')
+        self.assertEqual(pgconn.execute_recupere('''SELECT * FROM test WHERE id = %s;''', (1,)), [(1, 'Nom1', None)])
+        nb = pgconn.execute_commit('''DROP TABLE test;''')
+
+    def test_requete_preparee_reste_valide_apres_modification_par_une_autre_connexion(self):
+        pgconn = PgConn(hote, bdd, port, utilisateur, mdp)
+        nb = pgconn.execute_commit('''CREATE TABLE test (id integer, nom text);''')
+        nb = pgconn.execute_commit('''INSERT INTO test VALUES (1, 'Nom1');''')
+        for i in range(PgConn.SEUIL_PREPARATION + 1):
+            self.assertEqual(pgconn.execute_recupere('''SELECT * FROM test WHERE id = %s;''', (1,)), [(1, 'Nom1')])
+            pgconn.connection.rollback()
+        autre = PgConn(hote, bdd, port, utilisateur, mdp)
+        nb = autre.execute_commit('''ALTER TABLE test ADD COLUMN age integer;''')
+        self.assertEqual(pgconn.execute_recupere('''SELECT * FROM test WHERE id = %s;''', (1,)), [(1, 'Nom1', None)])
+        pgconn.connection.rollback()
+        for i in range(PgConn.SEUIL_PREPARATION + 1):
+            pgconn.execute_recupere('''SELECT * FROM test WHERE id = %s;''', (1,))
+            pgconn.connection.rollback()
+        nb = autre.execute_commit('''ALTER TABLE test DROP COLUMN age;''')
+        pgconn.execute_recupere('''SELECT 1;''')
+        self.assertRaises(psycopg2.Error, pgconn.execute_recupere, '''SELECT * FROM test WHERE id = %s;''', (1,))
+        pgconn.connection.rollback()
+        self.assertEqual(pgconn.execute_recupere('''SELECT * FROM test WHERE id = %s;''', (1,)), [(1, 'Nom1')])
+        self.assertEqual(pgconn.execute_recupere('''SELECT count(*) FROM pg_prepared_statements;'''), [(0,)])
+        pgconn.connection.rollback()
+        nb = autre.execute_commit('''DROP TABLE test;''')
+        autre.deconnection_postgres()
+        pgconn.deconnection_postgres()
+
+    def test_importer_instantane_voit_les_donnees_de_l_instantane_exporte(self):
+        pgconn = PgConn(hote, bdd, port, utilisateur, mdp)
+        nb = pgconn.execute_commit('''CREATE TABLE test (id integer);''')
+        coordinateur = PgConn(hote, bdd, port, utilisateur, mdp)
+        instantane = coordinateur.exporter_instantane()
+        nb = pgconn.execute_commit('''INSERT INTO test VALUES (1);''')
+        lecteur = PgConn(hote, bdd, port, utilisateur, mdp)
+        lecteur.importer_instantane(instantane)
+        self.assertEqual(lecteur.execute_recupere('''SELECT count(*) FROM test;'''), [(0,)])
+        lecteur.connection.rollback()
+        coordinateur.connection.rollback()
+        nb = pgconn.execute_commit('''DROP TABLE test;''')
+
+    def test_execute_recupere_colonnes_renvoie_des_colonnes_typees(self):
+        pgconn = PgConn(hote, bdd, port, utilisateur, mdp)
+        nb = pgconn.execute_commit('''CREATE TABLE test (id integer, montant float8, jour date, nom text);''')
+        nb = pgconn.execute_commit('''INSERT INTO test VALUES (1, 1.5, '2020-01-01', 'Nom1'), (2, NULL, NULL, NULL);''')
+        resultat = pgconn.execute_recupere_colonnes('''SELECT * FROM test WHERE id <= %s ORDER BY id;''', (2,))
+        self.assertEqual(resultat['id'].typecode, 'i')
+        self.assertEqual(list(resultat['id']), [1, 2])
+        self.assertEqual(list(resultat.nuls('montant')), [0, 1])
+        self.assertEqual(resultat['nom'], ['Nom1', None])
+        self.assertEqual(list(resultat.lignes()), pgconn.execute_recupere('''SELECT * FROM test ORDER BY id;'''))
+        nb = pgconn.execute_commit('''DROP TABLE test;''')
+
+    def test_copy_from_csv_accepte_un_iterable_de_lignes_et_ignore_entete(self):
+        pgconn = PgConn(hote, bdd, port, utilisateur, mdp)
+        nb = pgconn.execute_commit('''CREATE TABLE test (id integer, nom text);''')
+        pgconn.copy_from_csv(['id|nom\n', '1|Nom1\n', '2|Nom2\n'], '|', 'public.test', entete = True)
+        resultat = pgconn.execute_recupere('''SELECT * FROM test ORDER BY id;''')
+        self.assertEqual(resultat, [(1, 'Nom1'), (2, 'Nom2')])
+        nb = pgconn.execute_commit('''DROP TABLE test;''')
+    
+    def test_copy_from_csv_ne_cree_pas_de_fichier_temporaire(self):
+        pgconn = PgConn(hote, bdd, port, utilisateur, mdp)
+        nb = pgconn.execute_commit('''CREATE TABLE test (id integer, nom text);''')
+        with open('test_copy.csv', 'w', encoding = 'utf-8') as f:
+            f.write('id;nom\n1;Nom1\n')
+        pgconn.copy_from_csv('test_copy.csv', ';', 'public.test', entete = True)
+        self.assertFalse(os.path.exists('tmp'))
+        self.assertEqual(pgconn.execute_recupere('''SELECT * FROM test;'''), [(1, 'Nom1')])
+        os.remove('test_copy.csv')
+        nb = pgconn.execute_commit('''DROP TABLE test;''')
+        
     def test_execute_many_renvoie_le_nombre_de_lignes_modifie_si_parametres_pgconn_et_syntaxe_requete_corrects(self):
         pgconn = PgConn(hote, bdd, port, utilisateur, mdp)
         nb = pgconn.execute_commit('''CREATE TABLE test (id serial, nom text);''')
@@ -112,6 +216,251 @@ class TestPgConn(unittest.TestCase):
         self.assertRaises(Exception, pgconn.execute_many, '''SELECT test ERREUR DE FRAPPE FROM test;''')
     
     
+class TestRegistreSql(unittest.TestCase):
+    
+    def tearDown(self):
+        if os.path.exists('test_registre.sql'):
+            os.remove('test_registre.sql')
+    
+    def test_les_requetes_dune_classe_sont_partagees_entre_appels(self):
+        requetes = RegistreSql.requetes_de_la_classe(PgOutils)
+        self.assertIn('COMPTER', requetes)
+        self.assertIs(RegistreSql.requetes_de_la_classe(PgOutils), requetes)
+    
+    def test_un_fichier_modifie_est_relu(self):
+        with open('test_registre.sql', 'w', encoding = 'utf-8') as f:
+            f.write('## REQUETE\nSELECT 1;\n')
+        self.assertEqual(RegistreSql.requetes_du_fichier('test_registre.sql'), {'REQUETE': 'SELECT 1;\n'})
+        with open('test_registre.sql', 'w', encoding = 'utf-8') as f:
+            f.write('## REQUETE\nSELECT 2;\n## AUTRE\nSELECT 3;\n')
+        os.utime('test_registre.sql', ns = (0, 10**9))
+        self.assertEqual(RegistreSql.requetes_du_fichier('test_registre.sql'), {'REQUETE': 'SELECT 2;\n', 'AUTRE': 'SELECT 3;\n'})
+    
+    
+class TestGabaritSql(unittest.TestCase):
+    
+    def test_gabarit_sans_valeur_se_comporte_comme_format(self):
+        gabarit = GabaritSql('SELECT count(*) FROM {0}.{1} WHERE x ~ \'[0-9]{{8}}\';')
+        self.assertEqual(gabarit.lier(('public', 'test')), ("SELECT count(*) FROM public.test WHERE x ~ '[0-9]{8}';", ()))
+    
+    def test_gabarit_avec_valeurs_renvoie_des_parametres(self):
+        gabarit = GabaritSql("SELECT * FROM {0}.{1} WHERE nom LIKE {2!v} || '%';")
+        requete, parametres = gabarit.lier(('public', 'test', "l'a"))
+        self.assertEqual(requete, "SELECT * FROM public.test WHERE nom LIKE %s || '%%';")
+        self.assertEqual(parametres, ("l'a",))
+    
+    
+class TestJournalScript(unittest.TestCase):
+    
+    def tearDown(self):
+        JournalScript.fermer_tous()
+        for fichier in ['test_journal.sql', 'test_journal.sql.1', 'test_journal.sql.2']:
+            if os.path.exists(fichier):
+                os.remove(fichier)
+    
+    def test_les_ecritures_sont_differees_jusqua_vider(self):
+        journal = JournalScript.pour('test_journal.sql', delai_ecriture = 60)
+        self.assertIs(JournalScript.pour('test_journal.sql'), journal)
+        journal.ecrire('SELECT 1;')
+        self.assertFalse(os.path.exists('test_journal.sql'))
+        journal.vider()
+        with open('test_journal.sql', encoding='utf-8') as f:
+            self.assertEqual(f.read(), 'SELECT 1;')
+    
+    def test_les_ecritures_de_plusieurs_threads_ne_se_melangent_pas(self):
+        journal = JournalScript.pour('test_journal.sql', taille_tampon = 100)
+        def ecrire(i):
+            for j in range(500):
+                journal.ecrire('SELECT {0}, {1};\n'.format(i, j))
+        threads = [threading.Thread(target = ecrire, args = (i,)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        journal.vider()
+        with open('test_journal.sql', encoding='utf-8') as f:
+            lignes = f.read().splitlines()
+        self.assertEqual(len(lignes), 2000)
+        self.assertTrue(all(ligne.startswith('SELECT ') and ligne.endswith(';') for ligne in lignes))
+    
+    def test_le_fichier_est_archive_au_dela_de_taille_max(self):
+        journal = JournalScript.pour('test_journal.sql', taille_tampon = 0, taille_max = 100, nb_archives = 2)
+        for i in range(30):
+            journal.ecrire('SELECT {0};\n'.format(i))
+        self.assertTrue(os.path.exists('test_journal.sql.1'))
+        self.assertTrue(os.path.exists('test_journal.sql.2'))
+        self.assertLess(os.path.getsize('test_journal.sql'), 100)
+    
+
+class TestCacheCatalogue(unittest.TestCase):
+    
+    def test_une_entree_expiree_nest_plus_renvoyee(self):
+        cache = CacheCatalogue(duree_vie = 0.01)
+        cache.ecrire('clef', ['a'], 'public')
+        self.assertEqual(cache.lire('clef'), (True, ['a']))
+        time.sleep(0.02)
+        self.assertEqual(cache.lire('clef'), (False, None))
+    
+    def test_les_entrees_les_moins_recemment_utilisees_sont_evincees(self):
+        cache = CacheCatalogue(duree_vie = 60, taille_max = 2)
+        cache.ecrire('a', 1)
+        cache.ecrire('b', 2)
+        cache.lire('a')
+        cache.ecrire('c', 3)
+        self.assertEqual(cache.lire('b'), (False, None))
+        self.assertEqual(cache.lire('a'), (True, 1))
+    
+    def test_invalider_supprime_le_schema_et_les_listes_de_schemas(self):
+        cache = CacheCatalogue(duree_vie = 60)
+        cache.ecrire('schemas', ['public'], None)
+        cache.ecrire('tables_public', ['t1'], 'public')
+        cache.ecrire('tables_autre', ['t2'], 'autre')
+        cache.invalider(['public'])
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(cache.lire('tables_autre'), (True, ['t2']))
+    
+    def test_le_cache_est_desactive_par_defaut(self):
+        cache = CacheCatalogue()
+        cache.ecrire('schemas', ['public'], None)
+        self.assertEqual(cache.lire('schemas'), (False, None))
+    
+
+class TestPolitiqueTentatives(unittest.TestCase):
+    
+    def test_seules_les_erreurs_transitoires_sont_retentees(self):
+        politique = PolitiqueTentatives()
+        self.assertTrue(politique.est_transitoire(psycopg2.OperationalError('connexion perdue')))
+        self.assertTrue(politique.est_transitoire(psycopg2.errors.SerializationFailure()))
+        self.assertTrue(politique.est_transitoire(psycopg2.errors.DeadlockDetected()))
+        self.assertFalse(politique.est_transitoire(psycopg2.errors.SyntaxError()))
+        self.assertFalse(politique.est_transitoire(psycopg2.errors.UniqueViolation()))
+    
+    def test_le_delai_croit_et_reste_borne(self):
+        politique = PolitiqueTentatives(delai_initial = 1, delai_max = 4, facteur = 2, gigue = 0.5)
+        for tentative, maximum in [(1, 1), (2, 2), (3, 4), (10, 4)]:
+            delai = politique.delai(tentative)
+            self.assertTrue(maximum / 2 <= delai <= maximum)
+    
+
+class TestInstrumentation(unittest.TestCase):
+    
+    def test_les_mesures_sont_regroupees_par_operation(self):
+        instrumentation = Instrumentation(seuil_requete_lente = None)
+        instrumentation.enregistrer('execute_recupere', time.perf_counter(), 'SELECT 1;', 1)
+        instrumentation.enregistrer('execute_recupere', time.perf_counter(), 'SELECT 2;', 2)
+        statistiques = instrumentation.statistiques()['execute_recupere']
+        self.assertEqual(statistiques['nb'], 2)
+        self.assertEqual(statistiques['lignes'], 3)
+        self.assertEqual(sum(nb for borne, nb in statistiques['histogramme']), 2)
+    
+    def test_les_requetes_lentes_sont_signalees(self):
+        instrumentation = Instrumentation(seuil_requete_lente = 0.01)
+        with self.assertLogs('pg.requetes_lentes', level = 'WARNING') as logs:
+            instrumentation.enregistrer('execute_commit', time.perf_counter() - 0.02, 'UPDATE t SET a = 1;', 10)
+        self.assertIn('UPDATE t SET a = 1;', logs.output[0])
+    
+
+class TestTubeCopy(unittest.TestCase):
+    
+    def test_les_donnees_traversent_le_tube_dans_l_ordre(self):
+        tube = TubeCopy(taille_bloc = 100, nb_blocs = 2)
+        lignes = ['{0}\tvaleur\n'.format(i).encode() for i in range(5000)]
+        def source():
+            for ligne in lignes:
+                tube.write(ligne)
+            tube.fermer()
+        ecrivain = threading.Thread(target = source)
+        ecrivain.start()
+        lu = []
+        donnees = tube.read(37)
+        while donnees:
+            lu.append(donnees)
+            donnees = tube.read(37)
+        ecrivain.join()
+        self.assertEqual(b''.join(lu), b''.join(lignes))
+        self.assertEqual(tube.nb_octets, len(b''.join(lignes)))
+    
+    def test_l_abandon_de_la_destination_interrompt_la_source(self):
+        tube = TubeCopy(taille_bloc = 10, nb_blocs = 1)
+        erreurs = []
+        def source():
+            try:
+                for i in range(100):
+                    tube.write(b'x' * 20)
+            except Exception as e:
+                erreurs.append(e)
+        ecrivain = threading.Thread(target = source)
+        ecrivain.start()
+        tube.abandonner()
+        ecrivain.join(5)
+        self.assertFalse(ecrivain.is_alive())
+        self.assertEqual(len(erreurs), 1)
+    
+
+class TestPgPool(unittest.TestCase):
+    
+    @classmethod
+    def setUpClass(cls):
+        os.system('''psql -h {0} -p {1} -U {2} -c "CREATE DATABASE {3};"'''.format(hote, port, utilisateur, bdd))
+    
+    @classmethod
+    def tearDownClass(cls):
+        os.system('''psql -h {0} -p {1} -U {2} -c "DROP DATABASE {3};"'''.format(hote, port, utilisateur, bdd))
+    
+    def setUp(self):
+        self.pool = PgPool(hote, bdd, port, utilisateur, mdp, min_connexions = 1, max_connexions = 2, delai_attente = 0.1)
+    
+    def tearDown(self):
+        self.pool.fermer()
+    
+    def test_une_connexion_rendue_est_reutilisee(self):
+        pgconn = self.pool.emprunter()
+        self.pool.rendre(pgconn)
+        self.assertIs(self.pool.emprunter(), pgconn)
+    
+    def test_emprunter_echoue_si_max_connexions_atteint(self):
+        self.pool.emprunter()
+        self.pool.emprunter()
+        self.assertRaises(Exception, self.pool.emprunter)
+    
+    def test_une_connexion_fermee_nest_pas_reutilisee(self):
+        pgconn = self.pool.emprunter()
+        pgconn.connection.close()
+        self.pool.rendre(pgconn)
+        nouvelle = self.pool.emprunter()
+        self.assertIsNot(nouvelle, pgconn)
+        self.assertEqual(nouvelle.connection.closed, 0)
+    
+    def test_rendre_deux_fois_une_connexion_echoue(self):
+        pgconn = self.pool.emprunter()
+        self.pool.rendre(pgconn)
+        self.assertRaises(Exception, self.pool.rendre, pgconn)
+        self.assertIsNot(self.pool.emprunter(), self.pool.emprunter())
+    
+    def test_pgoutils_emprunte_et_rend_sa_connexion_au_pool(self):
+        with PgOutils(pool = self.pool) as pgoutils:
+            pgconn = pgoutils.pgconn
+            self.assertIn('public', pgoutils.lister_schemas())
+        self.assertIs(self.pool.emprunter(), pgconn)
+    
+    def test_pgoutils_supprime_rend_sa_connexion_au_pool(self):
+        pgoutils = PgOutils(pool = self.pool)
+        pgconn = pgoutils.pgconn
+        del pgoutils
+        self.assertIs(self.pool.emprunter(), pgconn)
+        self.pool.emprunter()
+        self.assertRaises(Exception, self.pool.emprunter)
+    
+    def test_le_delai_d_attente_par_defaut_est_borne(self):
+        pool = PgPool(hote, bdd, port, utilisateur, mdp, min_connexions = 0, max_connexions = 1)
+        try:
+            self.assertIsNotNone(pool.delai_attente)
+            pool.emprunter()
+            self.assertRaises(Exception, pool.emprunter, delai_attente = 0.1)
+        finally:
+            pool.fermer()
+    
+    
 class TestPGOutils(unittest.TestCase):
 
     @classmethod
@@ -156,6 +505,13 @@ class TestPGOutils(unittest.TestCase):
         self.assertFalse(reussite)
         self.assertEqual(nb, -1)
     
+    def test_une_erreur_permanente_nest_pas_retentee_et_la_connexion_reste_utilisable(self):
+        debut = time.monotonic()
+        reussite, nb = self.pgoutils.execution('''SELECT * FROM table_inexistante;''', max_tentative = 5)
+        self.assertFalse(reussite)
+        self.assertLess(time.monotonic() - debut, 0.1)
+        self.assertEqual(self.pgoutils.execution_et_recuperation('SELECT 1;'), [(1,)])
+    
     def test_execution_renvoie_True_en_cas_reussite_requete(self):
         reussite, nb = self.pgoutils.execution('''CREATE TABLE test(id serial);''')
         self.assertTrue(reussite)
@@ -187,6 +543,30 @@ class TestPGOutils(unittest.TestCase):
         for ligne in resultat:
             self.assertEqual(type(ligne), type(tuple()))      
 
+    def test_execution_et_recuperation_iterateur_renvoie_None_en_cas_echec(self):
+        resultat = self.pgoutils.execution_et_recuperation_iterateur('''SELECT * FROM table_inexistante''')
+        self.assertEqual(resultat, None)
+    
+    def test_execution_et_recuperation_iterateur_renvoie_un_iterateur_de_tuples_en_cas_de_reussite(self):
+        resultat = self.pgoutils.execution_et_recuperation_iterateur('''SELECT * FROM pg_tables LIMIT 10;''', itersize = 3)
+        lignes = list(resultat)
+        self.assertEqual(len(lignes), 10)
+        for ligne in lignes:
+            self.assertEqual(type(ligne), type(tuple()))
+    
+    def test_lister_schemas_avec_iterateur_renvoie_les_memes_schemas(self):
+        schemas = self.pgoutils.lister_schemas(iterateur = True)
+        self.assertEqual(list(schemas), self.pgoutils.lister_schemas())
+
+    def test_instrumentation_mesure_les_requetes_par_methode_decoree(self):
+        self.pgoutils.pgconn.instrumentation = Instrumentation()
+        self.pgoutils.vider_cache_catalogue()
+        self.pgoutils.lister_schemas()
+        self.pgoutils.execution('SELECT 1;')
+        statistiques = self.pgoutils.pgconn.instrumentation.statistiques()
+        self.assertEqual(statistiques['lister_schemas']['nb'], 1)
+        self.assertEqual(statistiques['execute_commit']['nb'], 1)
+    
     def test_lister_schemas_renvoie_la_liste_des_schemas(self):
         schemas = self.pgoutils.lister_schemas()
         self.assertEqual(schemas,['pg_toast', 'pg_temp_1', 'pg_toast_temp_1', 'pg_catalog', 'public', 'information_schema'])
@@ -214,6 +594,24 @@ class TestPGOutils(unittest.TestCase):
         self.assertTrue(schema not in schemas)
         self.assertTrue(reussite)
     
+    def test_une_requete_ddl_libre_invalide_le_cache_catalogue(self):
+        self.pgoutils.cache_catalogue.duree_vie = 60
+        self.assertTrue('table_cache' not in self.pgoutils.lister_tables('public'))
+        self.pgoutils.execution('CREATE TABLE public.table_cache (id integer);')
+        self.assertTrue('table_cache' in self.pgoutils.lister_tables('public'))
+        self.pgoutils.execution_multiple('DROP TABLE public.table_cache;', [()])
+        self.assertTrue('table_cache' not in self.pgoutils.lister_tables('public'))
+        self.pgoutils.execution("SELECT 'drop', 1 AS comment;")
+        self.assertEqual(len(self.pgoutils.cache_catalogue), 1)
+    
+    def test_sans_cache_catalogue_les_modifications_d_une_autre_connexion_sont_visibles(self):
+        self.assertTrue('table_cache' not in self.pgoutils.lister_tables('public'))
+        autre = PgConn(hote, bdd, port, utilisateur, mdp)
+        autre.execute_commit('CREATE TABLE public.table_cache (id integer);')
+        self.assertTrue('table_cache' in self.pgoutils.lister_tables('public'))
+        autre.execute_commit('DROP TABLE public.table_cache;')
+        autre.deconnection_postgres()
+    
     def test_creer_schema_si_inexistant_fonctionne_et_renvoie_True(self):
         schema = 'schema_test'
         schemas = self.pgoutils.lister_schemas()
@@ -253,6 +651,48 @@ class TestPGOutils(unittest.TestCase):
         reussite, nb = self.pgoutils.effacer_schemas(schemas)
         self.assertTrue(reussite)
         self.assertEqual(nb, 0)       
+    
+    def test_effacer_schemas_par_lots_renvoie_le_detail_par_schema(self):
+        schemas = ['test_lot' + str(i) for i in range(5)]
+        self.pgoutils.TAILLE_LOT_DDL = 2
+        reussite, nb = self.pgoutils.effacer_et_creer_schemas(schemas)
+        self.assertTrue(reussite)
+        self.assertEqual(self.pgoutils.lister_schemas_commencant_par('test_lot'), schemas)
+        reussite, nb, resultats = self.pgoutils.effacer_schemas(schemas, detail = True)
+        self.assertTrue(reussite)
+        self.assertEqual(nb, 5)
+        self.assertEqual(resultats, {schema: True for schema in schemas})
+        self.assertEqual(self.pgoutils.lister_schemas_commencant_par('test_lot'), [])
+    
+    def test_effacer_tables_commencant_par_supprime_les_tables_par_lots(self):
+        for i in range(3):
+            self.pgoutils.execution('CREATE TABLE public.table_lot{0} (id integer);'.format(i))
+        reussite, nb = self.pgoutils.effacer_tables_commencant_par('public', 'table_lot')
+        self.assertTrue(reussite)
+        self.assertEqual(nb, 3)
+        self.assertEqual(self.pgoutils.lister_tables_commencant_par('public', 'table_lot'), [])
+    
+    def test_copier_schema_distant_copie_les_tables_demandees_et_nettoie(self):
+        self.pgoutils.creer_schema_si_inexistant('source_distante')
+        for i in range(3):
+            self.pgoutils.execution('CREATE TABLE source_distante.t{0} AS SELECT generate_series(1, {1}) AS id;'.format(i, i + 1))
+        reussite, nb, detail = self.pgoutils.copier_schema_distant(hote, bdd, port, utilisateur, mdp, 'source_distante', 'copie_locale', tables = ['t1', 't2'], nb_connexions = 2)
+        self.assertTrue(reussite)
+        self.assertEqual(nb, 2)
+        self.assertEqual(detail, {'t1': True, 't2': True})
+        self.assertEqual(sorted(self.pgoutils.lister_tables('copie_locale')), ['t1', 't2'])
+        self.assertEqual(self.pgoutils.compter('copie_locale', 't2'), 3)
+        self.assertEqual(self.pgoutils.lister_schemas_commencant_par('fdw_tmp'), [])
+        self.pgoutils.effacer_schemas(['source_distante', 'copie_locale'])
+    
+    def test_copier_table_distante_via_copy_en_texte_et_en_binaire(self):
+        self.pgoutils.execution("CREATE TABLE public.source_copy AS SELECT i AS id, md5(i::text) AS texte, i / 3.0 AS valeur FROM generate_series(1, 1000) i;")
+        for format_copy in ['text', 'binary']:
+            reussite, nb = self.pgoutils.copier_table_distante_via_copy(hote, bdd, port, utilisateur, mdp, 'public', 'source_copy', 'public', 'copie_' + format_copy, format_copy)
+            self.assertTrue(reussite)
+            self.assertEqual(nb, 1000)
+            self.assertEqual(self.pgoutils.execution_et_recuperation('SELECT * FROM public.source_copy EXCEPT SELECT * FROM public.copie_' + format_copy + ';'), [])
+        self.pgoutils.effacer_tables('public', ['source_copy', 'copie_text', 'copie_binary'])
 
 
 if __name__ == "__main__":
@@ -0,0 +1,108 @@
+'''
+@author: antoine.herman
+'''
+import unittest
+import struct
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from pg.pgcolonnes import DecodeurCopyBinaire, SIGNATURE_COPY_BINAIRE
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def champ(donnees):
+    if donnees is None:
+        return struct.pack('>i', -1)
+    return struct.pack('>i', len(donnees)) + donnees
+
+def flux_copy_binaire(lignes):
+    flux = SIGNATURE_COPY_BINAIRE + struct.pack('>ii', 0, 0)
+    for ligne in lignes:
+        flux += struct.pack('>h', len(ligne)) + b''.join(champ(valeur) for valeur in ligne)
+    return flux + struct.pack('>h', -1)
+
+def decoder(noms, oids, flux, taille_bloc = 7):
+    decodeur = DecodeurCopyBinaire(noms, oids)
+    for i in range(0, len(flux), taille_bloc):
+        decodeur.write(flux[i:i + taille_bloc])
+    return decodeur.resultat()
+
+
+class TestDecodeurCopyBinaire(unittest.TestCase):
+
+    def test_decodage_des_types_de_taille_fixe(self):
+        lignes = [(struct.pack('>i', i), struct.pack('>q', i * 10**10), struct.pack('>d', i / 2), struct.pack('>b', i % 2))
+                  for i in range(1000)]
+        resultat = decoder(['id', 'grand', 'moitie', 'pair'], [23, 20, 701, 16], flux_copy_binaire(lignes))
+        self.assertEqual(len(resultat), 1000)
+        self.assertEqual(resultat['id'].typecode, 'i')
+        self.assertEqual(list(resultat['id']), list(range(1000)))
+        self.assertEqual(resultat['grand'][999], 999 * 10**10)
+        self.assertEqual(resultat['moitie'][3], 1.5)
+        self.assertIsNone(resultat.nuls('id'))
+        self.assertEqual(list(resultat.lignes())[1], (1, 10**10, 0.5, True))
+
+    def test_masque_des_valeurs_nulles(self):
+        lignes = [(struct.pack('>h', 1), None),
+                  (None, struct.pack('>f', 2.5)),
+                  (struct.pack('>h', 3), struct.pack('>f', 4.0))]
+        resultat = decoder(['a', 'b'], [21, 700], flux_copy_binaire(lignes))
+        self.assertEqual(list(resultat['a']), [1, 0, 3])
+        self.assertEqual(list(resultat.nuls('a')), [0, 1, 0])
+        self.assertEqual(list(resultat.nuls('b')), [1, 0, 0])
+        self.assertEqual(resultat.valeurs('a'), [1, None, 3])
+        self.assertEqual(resultat.valeurs('b'), [None, 2.5, 4.0])
+
+    def test_valeurs_nulles_entre_des_lignes_completes(self):
+        lignes = [(None,)] + [(struct.pack('>i', i),) for i in range(1, 50)] + [(None,), (struct.pack('>i', 51),)]
+        resultat = decoder(['id'], [23], flux_copy_binaire(lignes), taille_bloc = 64)
+        valeurs = resultat.valeurs('id')
+        self.assertEqual(len(resultat.nuls('id')), 52)
+        self.assertEqual([i for i, v in enumerate(valeurs) if v is None], [0, 50])
+        self.assertEqual(valeurs[51], 51)
+
+    def test_dates_et_horodatages(self):
+        lignes = [(struct.pack('>i', 366), struct.pack('>q', 86400 * 10**6 + 1), struct.pack('>q', -10**6)),
+                  (struct.pack('>i', 2**31 - 1), struct.pack('>q', 2**63 - 1), None)]
+        resultat = decoder(['jour', 'horodatage', 'horodatage_tz'], [1082, 1114, 1184], flux_copy_binaire(lignes))
+        self.assertEqual(list(resultat.lignes()), [(date(2001, 1, 1), datetime(2000, 1, 2, 0, 0, 0, 1),
+                                                    datetime(1999, 12, 31, 23, 59, 59, tzinfo = timezone.utc)),
+                                                   (date.max, datetime.max, None)])
+
+    def test_types_de_taille_variable(self):
+        # 12345.678 : chiffres 1|2345|6780 en base 10000, poids 1, échelle 3
+        numeric = struct.pack('>hhHh3h', 3, 1, 0, 3, 1, 2345, 6780)
+        numeric_negatif = struct.pack('>hhHh1h', 1, -1, 0x4000, 2, 500)
+        lignes = [('été'.encode('utf-8'), numeric, b'\x00\x01', struct.pack('>i', 1)),
+                  (None, numeric_negatif, None, struct.pack('>i', 2))]
+        resultat = decoder(['nom', 'montant', 'octets', 'id'], [25, 1700, 17, 23], flux_copy_binaire(lignes), taille_bloc = 3)
+        self.assertEqual(resultat['nom'], ['été', None])
+        self.assertEqual(resultat['montant'], [Decimal('12345.678'), Decimal('-0.05')])
+        self.assertEqual(str(resultat['montant'][1]), '-0.05')
+        self.assertEqual(resultat['octets'], [b'\x00\x01', None])
+        self.assertEqual(list(resultat['id']), [1, 2])
+
+    def test_flux_incomplet_ou_invalide(self):
+        flux = flux_copy_binaire([(struct.pack('>i', 1),)])
+        decodeur = DecodeurCopyBinaire(['id'], [23])
+        decodeur.write(flux[:-2])
+        with self.assertRaises(Exception):
+            decodeur.resultat()
+        with self.assertRaises(Exception):
+            DecodeurCopyBinaire(['id'], [23]).write(b'PGCOPY\n\xff\r\n\x01' + bytes(8))
+
+    @unittest.skipIf(numpy is None, 'module numpy non installé')
+    def test_conversion_numpy(self):
+        lignes = [(struct.pack('>i', 1), struct.pack('>i', 0)),
+                  (None, struct.pack('>i', 1))]
+        resultat = decoder(['id', 'jour'], [23, 1082], flux_copy_binaire(lignes))
+        ids = resultat.en_numpy('id')
+        self.assertEqual(ids.mask.tolist(), [False, True])
+        self.assertEqual(ids[0], 1)
+        self.assertEqual(resultat.en_numpy('jour').tolist(), [date(2000, 1, 1), date(2000, 1, 2)])
+
+
+if __name__ == "__main__":
+    unittest.main()
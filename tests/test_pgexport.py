@@ -5,7 +5,12 @@ import unittest
 import psycopg2
 import os
 from pg.pgbasics import *
-from pg.pgio import PgExport
+from pg.pgio import PgExport, EtatExports
+try:
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+from pg.pgsqlite import SqliteConn
 
 hote = 'localhost'
 bdd = 'test_pg'
@@ -39,6 +44,14 @@ class TestPGExport(unittest.TestCase):
     def tearDown(self):
         if os.path.exists('export_test.csv'):
             os.remove('export_test.csv')
+        if os.path.exists('export_test.sqlite3'):
+            os.remove('export_test.sqlite3')
+        for fichier in ['export_test.json', 'export_test_delta.csv', 'export_test.parquet']:
+            if os.path.exists(fichier):
+                os.remove(fichier)
+        for fichier in ['export_test.html', 'export_test_0001.html', 'export_test_0002.html', 'export_test_0003.html']:
+            if os.path.exists(fichier):
+                os.remove(fichier)
             
     def test_export_table_en_csv(self):
         self.pgexport.exporter_table_vers_csv('public', 'test', 'export_test.csv')
@@ -59,6 +72,90 @@ class TestPGExport(unittest.TestCase):
         self.assertEqual(lignes[2], '2|Doc|Emmett|60\n')
         self.assertEqual(len(lignes), 3)
     
+    def test_export_table_en_csv_avec_iterateur(self):
+        self.pgexport.exporter_table_vers_csv('public', 'test', 'export_test.csv', iterateur = True)
+        with open('export_test.csv', encoding='utf-8') as f:
+            lignes = f.readlines()
+        self.assertEqual(lignes[0], 'id|nom|prenom|age\n')
+        self.assertEqual(lignes[1], '1|McFly|Marty|20\n')
+        self.assertEqual(len(lignes), 6)
+    
+    def test_export_table_en_csv_via_copy_identique_a_export_par_defaut(self):
+        self.pgexport.exporter_table_vers_csv('public', 'test', 'export_test.csv')
+        with open('export_test.csv', 'rb') as f:
+            attendu = f.read()
+        self.pgexport.exporter_table_vers_csv_via_copy('public', 'test', 'export_test.csv')
+        with open('export_test.csv', 'rb') as f:
+            self.assertEqual(f.read(), attendu)
+    
+    def test_export_table_en_csv_via_copy_avec_limit(self):
+        self.pgexport.exporter_table_vers_csv_via_copy('public', 'test', 'export_test.csv', limit = 2)
+        with open('export_test.csv', encoding='utf-8') as f:
+            lignes = f.readlines()
+        self.assertEqual(lignes[0], 'id|nom|prenom|age\n')
+        self.assertEqual(lignes[2], '2|Doc|Emmett|60\n')
+        self.assertEqual(len(lignes), 3)
+
+    def test_export_table_typee_en_csv_via_copy_identique_a_export_par_defaut(self):
+        self.pgexport.execution('''CREATE TABLE public.test_types (id serial, actif BOOLEAN, maj TIMESTAMP, maj_tz TIMESTAMPTZ,
+                                                                   mesure FLOAT8, taux REAL, code CHAR(3), commentaire TEXT);''')
+        self.pgexport.execution_multiple('''INSERT INTO public.test_types (actif, maj, maj_tz, mesure, taux, code, commentaire)
+                                            VALUES (%s,%s,%s,%s,%s,%s,%s);''',
+                                         [(True, '2020-01-01 10:00:00', '2020-01-01 10:00:00.5+02', 1.0, 0.1, 'a', ''),
+                                          (False, '1999-12-31 23:59:59.000123', '2020-06-01 00:00:00-03:30', 0.1 + 0.2, 1e20, 'abc', 'a|"b"\nc'),
+                                          (None, None, None, None, None, None, None),
+                                          (True, '2020-01-01 00:00:00', '2020-01-01 00:00:00+00', 1e16, 1.5e-5, '', ' '),
+                                          (False, '2020-01-01 00:00:00', '2020-01-01 00:00:00+00', 5.10367e20, float('nan'), 'x', None),
+                                          (True, '2020-01-01 00:00:00', '2020-01-01 00:00:00+00', float('-inf'), -0.0, 'x', '0')])
+        try:
+            self.pgexport.exporter_table_vers_csv('public', 'test_types', 'export_test.csv')
+            with open('export_test.csv', 'rb') as f:
+                attendu = f.read()
+            self.pgexport.exporter_table_vers_csv_via_copy('public', 'test_types', 'export_test.csv')
+            with open('export_test.csv', 'rb') as f:
+                self.assertEqual(f.read(), attendu)
+        finally:
+            self.pgexport.execution('DROP TABLE public.test_types;')
+
+    def test_export_table_en_csv_via_copy_refuse_les_types_non_reproductibles(self):
+        self.pgexport.execution('CREATE TABLE public.test_json (id serial, donnees JSONB);')
+        try:
+            with self.assertRaises(Exception):
+                self.pgexport.exporter_table_vers_csv_via_copy('public', 'test_json', 'export_test.csv')
+        finally:
+            self.pgexport.execution('DROP TABLE public.test_json;')
+
+    def test_export_table_en_csv_parallele_identique_a_export_par_defaut(self):
+        self.pgexport.exporter_table_vers_csv('public', 'test', 'export_test.csv')
+        with open('export_test.csv', 'rb') as f:
+            attendu = f.read()
+        fichiers = self.pgexport.exporter_table_vers_csv_parallele('public', 'test', 'export_test.csv', nb_processus = 3, champ_decoupage = 'id')
+        self.assertEqual(fichiers, ['export_test.csv'])
+        self.assertFalse(os.path.exists('export_test.csv.000'))
+        with open('export_test.csv', 'rb') as f:
+            self.assertEqual(f.read(), attendu)
+    
+    def test_export_parallele_refuse_un_pool_trop_petit(self):
+        pool = PgPool(hote, bdd, port, utilisateur, mdp, max_connexions = 4)
+        try:
+            pgexport = PgExport(pool = pool)
+            with self.assertRaises(Exception):
+                pgexport.exporter_table_vers_csv_parallele('public', 'test', 'export_test.csv', nb_processus = 3, champ_decoupage = 'id')
+            self.assertFalse(os.path.exists('export_test.csv'))
+            self.assertEqual(pgexport.exporter_table_vers_csv_parallele('public', 'test', 'export_test.csv', nb_processus = 2, champ_decoupage = 'id'), 
+                             ['export_test.csv'])
+            pgexport.deconnecter()
+        finally:
+            pool.fermer()
+    
+    def test_export_table_en_sqlite_restaure_les_pragmas(self):
+        self.pgexport.exporter_table_vers_sqlite('public', 'test', 'export_test.sqlite3', 'test')
+        sqlite = SqliteConn('export_test.sqlite3')
+        self.assertEqual(sqlite.execute_recupere('SELECT count(*) FROM test;'), [(5,)])
+        self.assertEqual(sqlite.execute_recupere('SELECT nom FROM test WHERE id = 2;'), [('Doc',)])
+        self.assertEqual(sqlite.lire_pragma('journal_mode'), 'delete')
+        sqlite.deconnection_sqlite()
+    
     def test_export_requete_en_csv(self):
         self.pgexport.exporter_requete_vers_csv('SELECT id, prenom, age FROM public.test;', 'export_test.csv')
         self.assertTrue(os.path.exists('export_test.csv'))
@@ -67,6 +164,72 @@ class TestPGExport(unittest.TestCase):
         self.assertEqual(lignes[0], 'id|prenom|age\n')
         self.assertEqual(lignes[1], '1|Marty|20\n')
         self.assertEqual(lignes[4], '4|Georges|45\n')
+    
+    def test_export_requete_en_html_echappe_les_valeurs(self):
+        nb = self.pgexport.exporter_requete_vers_html('''SELECT nom, '<b>' || prenom || ' & co</b>' AS balise FROM public.test;''', 'export_test.html')
+        self.assertEqual(nb, 5)
+        with open('export_test.html', encoding='utf-8') as f:
+            html = f.read()
+        self.assertIn('\t\t<td>&lt;b&gt;Marty &amp; co&lt;/b&gt;</td>\n', html)
+        self.assertNotIn('<b>', html)
+        self.assertEqual(html.count('\t<tr>\n'), 6)
+    
+    def test_export_table_en_html_par_pages(self):
+        nb = self.pgexport.exporter_table_vers_html('public', 'test', 'export_test.html', lignes_par_page = 2)
+        self.assertEqual(nb, 5)
+        self.assertFalse(os.path.exists('export_test_0004.html'))
+        with open('export_test_0003.html', encoding='utf-8') as f:
+            derniere_page = f.read()
+        self.assertIn('<td>Capone</td>', derniere_page)
+        self.assertIn('<a href="export_test_0002.html">Page précédente</a>', derniere_page)
+        self.assertNotIn('Page suivante', derniere_page)
+        with open('export_test.html', encoding='utf-8') as f:
+            index = f.read()
+        self.assertIn('<a href="export_test_0001.html">1</a>', index)
+        self.assertIn('<td>5 - 5</td>', index)
+    
+    def test_export_csv_incremental_n_exporte_que_les_nouvelles_lignes(self):
+        nb = self.pgexport.exporter_table_vers_csv_incremental('public', 'test', 'export_test_delta.csv', 'id', 'export_test.json')
+        self.assertEqual(nb, 5)
+        self.assertEqual(EtatExports('export_test.json').lire('csv:public.test'), 5)
+        nb = self.pgexport.exporter_table_vers_csv_incremental('public', 'test', 'export_test_delta.csv', 'id', 'export_test.json')
+        self.assertEqual(nb, 0)
+        self.pgexport.execution("INSERT INTO public.test (nom, prenom, age) VALUES ('Brown', 'Emmett', 65);")
+        nb = self.pgexport.exporter_table_vers_csv_incremental('public', 'test', 'export_test_delta.csv', 'id', 'export_test.json')
+        self.pgexport.execution("DELETE FROM public.test WHERE id > 5;")
+        self.assertEqual(nb, 1)
+        with open('export_test_delta.csv', encoding='utf-8') as f:
+            lignes = f.readlines()
+        self.assertEqual(lignes, ['id|nom|prenom|age\n', '6|Brown|Emmett|65\n'])
+    
+    def test_export_sqlite_incremental_par_xmin_remplace_les_lignes_modifiees(self):
+        self.pgexport.execution('CREATE TABLE public.test_xmin AS SELECT * FROM public.test;')
+        try:
+            with self.assertRaises(Exception):
+                self.pgexport.exporter_table_vers_sqlite_incremental('public', 'test_xmin', 'export_test.sqlite3', 'test', 'xmin', 'export_test.json', champs_clef = ['id'])
+            nb = self.pgexport.exporter_table_vers_sqlite_incremental('public', 'test_xmin', 'export_test.sqlite3', 'test', 'xmin', 'export_test.json', 
+                                                                      champs_clef = ['id'], autoriser_xmin = True)
+            self.assertEqual(nb, 5)
+            self.pgexport.execution("UPDATE public.test_xmin SET age = 21 WHERE id = 1;")
+            nb = self.pgexport.exporter_table_vers_sqlite_incremental('public', 'test_xmin', 'export_test.sqlite3', 'test', 'xmin', 'export_test.json', 
+                                                                      champs_clef = ['id'], autoriser_xmin = True)
+            self.assertEqual(nb, 1)
+            sqlite = SqliteConn('export_test.sqlite3')
+            self.assertEqual(sqlite.execute_recupere('SELECT count(*) FROM test;'), [(5,)])
+            self.assertEqual(sqlite.execute_recupere('SELECT age FROM test WHERE id = 1;'), [(21,)])
+            sqlite.deconnection_sqlite()
+        finally:
+            self.pgexport.execution('DROP TABLE public.test_xmin;')
+    
+    @unittest.skipIf(pyarrow is None, 'pyarrow non installé')
+    def test_export_requete_en_parquet_par_groupes_de_lignes(self):
+        nb = self.pgexport.exporter_requete_vers_parquet('SELECT id, nom, age, age / 3.0 AS tiers FROM public.test;', 'export_test.parquet', taille_groupe = 2)
+        self.assertEqual(nb, 5)
+        fichier = pyarrow.parquet.ParquetFile('export_test.parquet')
+        self.assertEqual(fichier.metadata.num_row_groups, 3)
+        self.assertEqual(str(fichier.schema_arrow.field('tiers').type), 'double')
+        table = pyarrow.parquet.read_table('export_test.parquet', columns = ['nom'])
+        self.assertEqual(table.column('nom').to_pylist(), ['McFly', 'Doc', 'Tannen', 'Abidbol', 'Capone'])
         
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
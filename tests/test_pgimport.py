@@ -0,0 +1,66 @@
+'''
+@author: antoine.herman
+'''
+import unittest
+import psycopg2
+import os
+from pg.pgbasics import *
+from pg.pgio import PgImport
+from pg.pgsqlite import SqliteConn
+
+hote = 'localhost'
+bdd = 'test_pg'
+utilisateur = 'postgres'
+mdp = 'postgres'
+port = '5432'
+
+class TestPGImport(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        os.system('''psql -h {0} -p {1} -U {2} -c "CREATE DATABASE {3};"'''.format(hote, port, utilisateur, bdd))
+        sqlite = SqliteConn('test.sqlite3')
+        sqlite.execute_commit('''CREATE TABLE "test" (id INTEGER, nom TEXT, prenom TEXT, age INTEGER);''')
+        sqlite.execute_many('''INSERT INTO test VALUES (?,?,?,?);''',
+                            [(1, 'McFly', 'Marty', 20),
+                             (2, 'Doc', 'Emmett', None),
+                             (3, 'Tan\tnen', 'Bi\\ff', 22)])
+        sqlite.deconnection_sqlite()
+
+    @classmethod
+    def tearDownClass(cls):
+        os.system('''psql -h {0} -p {1} -U {2} -c "DROP DATABASE {3};"'''.format(hote, port, utilisateur, bdd))
+        if os.path.exists('test.sqlite3'):
+            os.remove('test.sqlite3')
+
+    def setUp(self):
+        self.pgimport = PgImport(hote, bdd, port, utilisateur, mdp)
+
+    def tearDown(self):
+        self.pgimport.deconnecter()
+
+    def test_import_table_sqlite_via_copy(self):
+        reussite, nb = self.pgimport.importer_table_depuis_sqlite('test.sqlite3', 'test', 'public', 'test_copy')
+        self.assertTrue(reussite)
+        self.assertEqual(nb, 3)
+        resultat = self.pgimport.execution_et_recuperation('SELECT * FROM public.test_copy ORDER BY id;')
+        self.assertEqual(resultat[1], (2, 'Doc', 'Emmett', None))
+        self.assertEqual(resultat[2], (3, 'Tan\tnen', 'Bi\\ff', 22))
+
+    def test_import_table_sqlite_via_values(self):
+        reussite, nb = self.pgimport.importer_table_depuis_sqlite('test.sqlite3', 'test', 'public', 'test_values', methode = 'values')
+        self.assertTrue(reussite)
+        self.assertEqual(nb, 3)
+        self.assertEqual(self.pgimport.compter('public', 'test_values'), 3)
+
+    def test_import_table_sqlite_echoue_sans_lever_d_exception(self):
+        sqlite = SqliteConn('test.sqlite3')
+        sqlite.execute_commit('''CREATE TABLE test_invalide (id INTEGER, nom TEXT);''')
+        sqlite.execute_many('''INSERT INTO test_invalide VALUES (?,?);''', [(1, 'McFly'), ('texte', 'Doc')])
+        sqlite.deconnection_sqlite()
+        reussite, nb = self.pgimport.importer_table_depuis_sqlite('test.sqlite3', 'test_invalide', 'public', 'test_invalide')
+        self.assertEqual((reussite, nb), (False, -1))
+        self.assertEqual(self.pgimport.execution_et_recuperation('SELECT 1;'), [(1,)])
+
+if __name__ == '__main__':
+    unittest.main()
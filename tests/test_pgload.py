@@ -28,12 +28,15 @@ class TestPGLoad(unittest.TestCase):
         pgoutils.deconnecter()
         pgsave = PgSave(hote, bdd, utilisateur, mdp, demande_mdp)
         pgsave.sauvegarder_schemas_format_sql('test.sql', ['public'])
+        pgsave.sauvegarder_schemas_format_dump('test.dump', ['public'])
         os.system('''psql -h {0} -p {1} -U {2} -c "DROP DATABASE {3};"'''.format(hote, port, utilisateur, bdd))
     
     @classmethod
     def tearDownClass(cls):
         if(os.path.exists('test.sql')):
             os.remove('test.sql')
+        if(os.path.exists('test.dump')):
+            os.remove('test.dump')
     
     def test_charger_fichier_dans_nvelle_base(self):
         pgload = PgLoad(hote, bdd, utilisateur, mdp, demande_mdp)
@@ -42,6 +45,37 @@ class TestPGLoad(unittest.TestCase):
         self.assertIn('test', pgoutils.lister_tables('public'))
         os.system('''psql -h {0} -p {1} -U {2} -c "DROP DATABASE {3};"'''.format(hote, port, utilisateur, bdd))
     
+    def test_commande_pg_restore_selective_en_parallele(self):
+        pgload = PgLoad(hote, bdd, utilisateur, mdp, demande_mdp)
+        cmd = pgload._commande_pg_restore('test.dump', 4, schemas = ['public'], tables = ['test'], donnees_seulement = True)
+        self.assertEqual(cmd[cmd.index('-j') + 1], '4')
+        self.assertEqual(cmd[cmd.index('-n') + 1], 'public')
+        self.assertEqual(cmd[cmd.index('-t') + 1], 'test')
+        self.assertIn('-a', cmd)
+        self.assertEqual(cmd[-1], 'test.dump')
+        with self.assertRaises(Exception):
+            pgload.charger_archive('test.dump', donnees_seulement = True, structure_seulement = True)
+    
+    def test_charger_archive_dans_nvelle_base_en_parallele(self):
+        pgload = PgLoad(hote, bdd, utilisateur, mdp, demande_mdp)
+        # à partir de PostgreSQL 15, la restauration du schéma public (déjà présent) sort en erreur non bloquante
+        pgload.charger_archive_dans_nouvelle_base('test.dump', nb_processus = 2, postgis = False)
+        pgoutils = PgOutils(hote, bdd, port, utilisateur, mdp)
+        self.assertEqual(pgoutils.compter('public', 'test'), 5)
+        pgoutils.deconnecter()
+        os.system('''psql -h {0} -p {1} -U {2} -c "DROP DATABASE {3};"'''.format(hote, port, utilisateur, bdd))
+    
+    def test_charger_archive_structure_puis_donnees(self):
+        pgload = PgLoad(hote, bdd, utilisateur, mdp, demande_mdp)
+        pgload.effacer_base()
+        pgload.creer_nouvelle_base()
+        pgload.charger_archive('test.dump', structure_seulement = True)
+        pgoutils = PgOutils(hote, bdd, port, utilisateur, mdp)
+        self.assertEqual(pgoutils.compter('public', 'test'), 0)
+        pgload.charger_archive('test.dump', nb_processus = 2, tables = ['test'], donnees_seulement = True)
+        self.assertEqual(pgoutils.compter('public', 'test'), 5)
+        pgoutils.deconnecter()
+        os.system('''psql -h {0} -p {1} -U {2} -c "DROP DATABASE {3};"'''.format(hote, port, utilisateur, bdd))
 
 
 if __name__ == '__main__':
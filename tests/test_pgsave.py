@@ -1,8 +1,11 @@
 import unittest
 import psycopg2
 import os
+import shutil
+import sys
+import threading
 from pg.pgbasics import *
-from pg.pgio import PgSave
+from pg.pgio import PgSave, ExecutionCommande
 
 hote = 'localhost'
 bdd = 'test_pg'
@@ -39,6 +42,8 @@ class TestPGSave(unittest.TestCase):
             os.remove('test.sql')
         if os.path.exists('test.dump'):
             os.remove('test.dump')
+        if os.path.exists('test_repertoire'):
+            shutil.rmtree('test_repertoire')
     
     def test_commande_pg_dump_accessible(self):
         pgsave = PgSave(hote, bdd, utilisateur, mdp)
@@ -169,7 +174,80 @@ class TestPGSave(unittest.TestCase):
             self.assertIn('password authentication failed', p.stderr)
         else:
             self.assertIn('FATAL', p.stderr)
+
+    def test_commande_pg_dump_format_repertoire_avec_plusieurs_processus(self):
+        pgsave = PgSave(hote, bdd, utilisateur, mdp, demande_mdp)
+        cmd = pgsave._commande_pg_dump_schemas('test_repertoire', ['public'], format_repertoire = True, nb_processus = 3)
+        self.assertIn('-Fd', cmd)
+        self.assertEqual(cmd[cmd.index('-j') + 1], '3')
+        self.assertNotIn('-Fc', cmd)
+    
+    def test_sauvegarde_schema_format_repertoire_fonctionne_avec_parametrage_correct(self):
+        pgsave = PgSave(hote, bdd, utilisateur, mdp, demande_mdp)
+        p = pgsave.sauvegarder_schemas_format_repertoire('test_repertoire', ['public'], nb_processus = 2)
+        self.assertEqual(p.returncode, 0)
+        self.assertTrue(os.path.exists(os.path.join('test_repertoire', 'toc.dat')))
+    
+    def test_sauvegarde_schemas_simultanement_produit_un_fichier_par_schema(self):
+        self.pgoutils.creer_schema_si_inexistant('autre')
+        self.pgoutils.execution('''CREATE TABLE autre.test AS SELECT * FROM public.test;''')
+        pgsave = PgSave(hote, bdd, utilisateur, mdp, demande_mdp)
+        reussite, processus = pgsave.sauvegarder_schemas_simultanement('test_repertoire', ['public', 'autre'], nb_processus = 2)
+        self.pgoutils.effacer_schema('autre')
+        self.assertTrue(reussite)
+        self.assertEqual(sorted(processus), ['autre', 'public'])
+        self.assertTrue(os.path.exists(os.path.join('test_repertoire', 'public.dump')))
+        self.assertTrue(os.path.exists(os.path.join('test_repertoire', 'autre.dump')))
             
+
+
+class TestExecutionCommande(unittest.TestCase):
+    
+    def test_sorties_bornees_et_progression_par_objet(self):
+        code = '''import sys
+mdp = sys.stdin.readline().strip()
+for i in range(500):
+    print('pg_dump: dumping contents of table "public.t%d"' % i, file = sys.stderr)
+print('fin', mdp)'''
+        suivi = []
+        p = ExecutionCommande([sys.executable, '-c', code], 'secret\n', suivi.append, nb_lignes_max = 10).executer()
+        self.assertEqual(p.returncode, 0)
+        self.assertEqual(p.stdout, 'fin secret\n')
+        self.assertEqual(p.stderr.count('\n'), 10)
+        self.assertEqual(len(suivi), 500)
+        self.assertEqual(suivi[-1].nb_objets, 500)
+        self.assertEqual(suivi[-1].ligne, 'pg_dump: dumping contents of table "public.t499"')
+    
+    def test_progression_psql_ne_compte_que_les_creations_et_copies(self):
+        code = '''for ligne in ['SET', 'BEGIN', 'CREATE TABLE', 'ALTER TABLE', 'COPY 12', 'CREATE INDEX', 'SELECT 1', 'COMMIT']:
+    print(ligne)'''
+        suivi = []
+        p = ExecutionCommande([sys.executable, '-c', code], progression = suivi.append).executer()
+        self.assertEqual(p.returncode, 0)
+        self.assertEqual([progression.ligne for progression in suivi], ['CREATE TABLE', 'COPY 12', 'CREATE INDEX'])
+    
+    def test_annulation_interrompt_la_commande(self):
+        code = '''import time
+for i in range(100):
+    print('CREATE TABLE', flush = True)
+    time.sleep(0.1)'''
+        annulation = threading.Event()
+        threading.Timer(0.3, annulation.set).start()
+        p = ExecutionCommande([sys.executable, '-c', code], annulation = annulation).executer()
+        self.assertNotEqual(p.returncode, 0)
+        self.assertLess(p.stdout.count('\n'), 100)
+        p = ExecutionCommande([sys.executable, '-c', code], progression = lambda progression: progression.nb_objets < 3).executer()
+        self.assertNotEqual(p.returncode, 0)
+        self.assertLess(p.stdout.count('\n'), 100)
+    
+    def test_une_annulation_n_affecte_pas_les_operations_suivantes(self):
+        pgsave = PgSave(hote, bdd, utilisateur, mdp)
+        pgsave.verification_commande_pg_dump = lambda: True
+        pgsave.annuler()
+        p = pgsave.executer_commande_pg_dump([sys.executable, '-c', 'print("fin")'])
+        self.assertEqual(p.returncode, 0)
+        self.assertEqual(p.stdout, 'fin\n')
+    
     
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file